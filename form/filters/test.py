@@ -50,13 +50,13 @@ class TestFilter(django_filters.FilterSet):
     )
 
     quarantine_building_id = django_filters.CharFilter(
-        field_name='user__member_x_custom_user__quarantine_room__quarantine_floor__quarantine_building__id',
-        lookup_expr='iexact',
+        field_name='user__member_x_custom_user__quarantine_building__id',
+        lookup_expr='exact',
     )
 
     quarantine_floor_id = django_filters.CharFilter(
-        field_name='user__member_x_custom_user__quarantine_room__quarantine_floor__id',
-        lookup_expr='iexact',
+        field_name='user__member_x_custom_user__quarantine_floor__id',
+        lookup_expr='exact',
     )
 
     quarantine_room_id = django_filters.CharFilter(
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from form.vitals import rebuild_latest_vitals
+
+class Command(BaseCommand):
+    help = 'Recalculate LatestVitals (latest vitals and symptoms of each user) from medical declarations'
+
+    def handle(self, *args, **options):
+        number_of_rows = rebuild_latest_vitals()
+
+        self.stdout.write(f'Rebuilt {number_of_rows} rows of LatestVitals')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from form.positivity import rebuild_test_states
+
+class Command(BaseCommand):
+    help = 'Recalculate TestState (last positive test, number of negative tests since then) of each user from tests'
+
+    def handle(self, *args, **options):
+        number_of_rows = rebuild_test_states()
+
+        self.stdout.write(f'Rebuilt {number_of_rows} rows of TestState')
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form', '0017_auto_20220513_2107'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicaldeclaration',
+            index=models.Index(fields=['created_at', 'id'], name='medical_declaration_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['created_at', 'id'], name='test_cursor_idx'),
+        ),
+    ]
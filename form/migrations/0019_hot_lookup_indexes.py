@@ -0,0 +1,21 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form', '0018_auto_20261018_1444'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicaldeclaration',
+            index=models.Index(fields=['user', 'created_at'], name='medical_decl_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['user', 'result', 'created_at'], name='test_user_result_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0053_member_location'),
+        ('form', '0019_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestVitals',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_vitals_x_user', serialize=False, to='user_account.customuser')),
+                ('heartbeat', models.IntegerField(blank=True, null=True)),
+                ('heartbeat_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('temperature_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('breathing', models.IntegerField(blank=True, null=True)),
+                ('breathing_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('spo2', models.FloatField(blank=True, null=True)),
+                ('spo2_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('blood_pressure_max', models.IntegerField(blank=True, null=True)),
+                ('blood_pressure_max_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('blood_pressure_min', models.IntegerField(blank=True, null=True)),
+                ('blood_pressure_min_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('main_symptoms', models.TextField(blank=True, null=True)),
+                ('extra_symptoms', models.TextField(blank=True, null=True)),
+                ('other_symptoms', models.TextField(blank=True, null=True)),
+                ('symptoms_updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0053_member_location'),
+        ('form', '0020_latestvitals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='test_state_x_user', serialize=False, to='user_account.customuser')),
+                ('last_positive_at', models.DateTimeField(blank=True, null=True)),
+                ('num_quick_negative', models.IntegerField(default=0)),
+                ('num_rt_pcr_negative', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
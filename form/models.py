@@ -110,6 +110,13 @@ def medical_declaration_code_generator():
 
 class MedicalDeclaration(models.Model):
 
+    class Meta:
+        indexes = [
+            # cursor pagination order by (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='medical_declaration_cursor_idx'),
+            models.Index(fields=['user', 'created_at'], name='medical_decl_user_created_idx'),
+        ]
+
     code = models.CharField(
         max_length=32,
         null=False,
@@ -160,11 +167,63 @@ class MedicalDeclaration(models.Model):
         blank=True,
     )
 
+class LatestVitals(models.Model):
+    """
+    Latest value of each vital of a user (from medical declarations, a vital is not null),
+    and symptoms of the latest medical declaration, with the time it is declared.
+    """
+
+    user = models.OneToOneField(
+        to=CustomUser,
+        on_delete=models.CASCADE,
+        related_name='latest_vitals_x_user',
+        primary_key=True,
+    )
+
+    heartbeat = models.IntegerField(null=True, blank=True)
+
+    heartbeat_updated_at = models.DateTimeField(null=True, blank=True)
+
+    temperature = models.FloatField(null=True, blank=True)
+
+    temperature_updated_at = models.DateTimeField(null=True, blank=True)
+
+    breathing = models.IntegerField(null=True, blank=True)
+
+    breathing_updated_at = models.DateTimeField(null=True, blank=True)
+
+    spo2 = models.FloatField(null=True, blank=True)
+
+    spo2_updated_at = models.DateTimeField(null=True, blank=True)
+
+    blood_pressure_max = models.IntegerField(null=True, blank=True)
+
+    blood_pressure_max_updated_at = models.DateTimeField(null=True, blank=True)
+
+    blood_pressure_min = models.IntegerField(null=True, blank=True)
+
+    blood_pressure_min_updated_at = models.DateTimeField(null=True, blank=True)
+
+    main_symptoms = models.TextField(null=True, blank=True)
+
+    extra_symptoms = models.TextField(null=True, blank=True)
+
+    other_symptoms = models.TextField(null=True, blank=True)
+
+    symptoms_updated_at = models.DateTimeField(null=True, blank=True)
+
 def test_code_generator():
     return ''.join(str(randint(0, 9)) for i in range(int(os.environ.get("TEST_CODE_LENGTH", '15'))))
 
 class Test(models.Model):
 
+    class Meta:
+        indexes = [
+            # cursor pagination order by (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='test_cursor_idx'),
+            models.Index(fields=['user', 'result', 'created_at'], name='test_user_result_created_idx'),
+        ]
+
     code = models.CharField(
         max_length=32,
         unique=True,
@@ -221,6 +280,27 @@ class Test(models.Model):
         blank=True,
     )
 
+class TestState(models.Model):
+    """
+    Results of tests of a user since the last positive test (since the first test if there is no positive test),
+    updated when a test is created or updated, to conclude positive_test_now without reading all tests.
+    """
+
+    user = models.OneToOneField(
+        to=CustomUser,
+        on_delete=models.CASCADE,
+        related_name='test_state_x_user',
+        primary_key=True,
+    )
+
+    # created_at of the last positive test
+    last_positive_at = models.DateTimeField(null=True, blank=True)
+
+    # number of negative tests created after last_positive_at, by type
+    num_quick_negative = models.IntegerField(default=0)
+
+    num_rt_pcr_negative = models.IntegerField(default=0)
+
 class Vaccine(models.Model):
 
     name = models.CharField(max_length=128, null=False)
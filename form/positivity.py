@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models import Count, Max, Q, Exists, OuterRef, Subquery
+from .models import Test, TestState
+from utils.enums import TestResult, TestType
+
+def count_negative_tests(query_set):
+    """
+    Return a dict {'num_quick_negative': number, 'num_rt_pcr_negative': number} of negative tests in query_set
+    """
+
+    return query_set.filter(result=TestResult.NEGATIVE).aggregate(
+        num_quick_negative=Count('id', filter=Q(type=TestType.QUICK)),
+        num_rt_pcr_negative=Count('id', filter=Q(type=TestType.RT_PCR)),
+    )
+
+def get_number_of_negative_tests(test_state, type_test_need):
+    """
+    Number of negative tests since the last positive test that can be used to conclude negative
+    (only RT-PCR tests if type_test_need is RT-PCR, all tests else)
+    """
+
+    if not test_state:
+        return 0
+    if type_test_need == TestType.RT_PCR:
+        return test_state.num_rt_pcr_negative
+    return test_state.num_quick_negative + test_state.num_rt_pcr_negative
+
+def rebuild_test_states(user_ids=None):
+    """
+    Recalculate rows of TestState from tests, of all users or of users in user_ids.
+
+    Return number of rows created
+    """
+
+    query_set = Test.objects.filter(user__isnull=False)
+    if user_ids is not None:
+        query_set = query_set.filter(user__in=user_ids)
+
+    dict_of_test_states = dict()
+
+    def get_test_state(user_id):
+        return dict_of_test_states.setdefault(user_id, TestState(user_id=user_id))
+
+    # each user that has a test has a row
+    for user_id in query_set.values_list('user', flat=True).distinct().order_by():
+        get_test_state(user_id)
+
+    positive_tests = query_set.filter(result=TestResult.POSITIVE).values('user').annotate(
+        last_positive_at=Max('created_at'),
+    ).order_by()
+
+    for item in positive_tests:
+        get_test_state(item['user']).last_positive_at = item['last_positive_at']
+
+    # negative tests created after the last positive test of its user
+    last_positive_at = Test.objects.filter(
+        user=OuterRef('user'),
+        result=TestResult.POSITIVE,
+    ).order_by('-created_at').values('created_at')[:1]
+
+    negative_tests = query_set.filter(result=TestResult.NEGATIVE).filter(
+        Q(created_at__gt=Subquery(last_positive_at)) |
+        ~Exists(Test.objects.filter(user=OuterRef('user'), result=TestResult.POSITIVE))
+    ).values('user').annotate(
+        num_quick_negative=Count('id', filter=Q(type=TestType.QUICK)),
+        num_rt_pcr_negative=Count('id', filter=Q(type=TestType.RT_PCR)),
+    ).order_by()
+
+    for item in negative_tests:
+        test_state = get_test_state(item['user'])
+        test_state.num_quick_negative = item['num_quick_negative']
+        test_state.num_rt_pcr_negative = item['num_rt_pcr_negative']
+
+    with transaction.atomic():
+        old_query_set = TestState.objects.all()
+        if user_ids is not None:
+            old_query_set = old_query_set.filter(user__in=user_ids)
+        old_query_set.delete()
+
+        TestState.objects.bulk_create(dict_of_test_states.values(), batch_size=1000)
+
+    return len(dict_of_test_states)
+
+def update_test_state(test, old_result=TestResult.NONE, old_type=None):
+    """
+    Run this function (in the same transaction) after creating a test (old_result is NONE)
+    or after updating result, type of a test (old_result, old_type are values before updating).
+    """
+
+    if not test.user_id:
+        return
+    if old_result == test.result and old_type == test.type:
+        return
+
+    if old_result == TestResult.POSITIVE:
+        # the last positive test may be changed
+        rebuild_test_states([test.user_id])
+        return
+
+    # lock row of this user, tests of a user can be created or updated at the same time
+    test_state, _ = TestState.objects.select_for_update().get_or_create(user_id=test.user_id)
+
+    is_after_last_positive = test_state.last_positive_at is None or test.created_at > test_state.last_positive_at
+
+    if old_result == TestResult.NEGATIVE and is_after_last_positive:
+        if old_type == TestType.RT_PCR:
+            test_state.num_rt_pcr_negative -= 1
+        else:
+            test_state.num_quick_negative -= 1
+
+    if test.result == TestResult.NEGATIVE and is_after_last_positive:
+        if test.type == TestType.RT_PCR:
+            test_state.num_rt_pcr_negative += 1
+        else:
+            test_state.num_quick_negative += 1
+    elif test.result == TestResult.POSITIVE and is_after_last_positive:
+        test_state.last_positive_at = test.created_at
+        # negative tests created after this test (none if this is a new test)
+        numbers = count_negative_tests(Test.objects.filter(user_id=test.user_id, created_at__gt=test.created_at))
+        test_state.num_quick_negative = numbers['num_quick_negative']
+        test_state.num_rt_pcr_negative = numbers['num_rt_pcr_negative']
+
+    test_state.save()
@@ -1,6 +1,7 @@
 from django.db.models import Q
 from ..models import MedicalDeclaration
 from user_account.models import CustomUser
+from quarantine_ward.models import QuarantineWard, QuarantineBuilding, QuarantineFloor, QuarantineRoom
 from form.models import Symptom
 from utils import validators, messages, exceptions
 from utils.enums import SymptomType, HealthDeclarationConclude
@@ -168,6 +169,73 @@ class MedicalDeclarationValidator(validators.AbstractRequestValidate):
                 return False
         return False
 
+    def is_quarantine_ward_id_exist(self):
+        if hasattr(self, '_quarantine_ward_id'):
+            try:
+                self._quarantine_ward = validators.ModelInstanceExistenceValidator.valid(
+                    model_cls=QuarantineWard,
+                    query_expr=Q(id=self._quarantine_ward_id),
+                )
+                return True
+            except Exception as exception:
+                return False
+        return True
+
+    def is_quarantine_building_id_exist(self):
+        if hasattr(self, '_quarantine_building_id'):
+            try:
+                self._quarantine_building = validators.ModelInstanceExistenceValidator.valid(
+                    model_cls=QuarantineBuilding,
+                    query_expr=Q(id=self._quarantine_building_id),
+                )
+                return True
+            except Exception as exception:
+                return False
+        return True
+
+    def is_quarantine_floor_id_exist(self):
+        if hasattr(self, '_quarantine_floor_id'):
+            try:
+                self._quarantine_floor = validators.ModelInstanceExistenceValidator.valid(
+                    model_cls=QuarantineFloor,
+                    query_expr=Q(id=self._quarantine_floor_id),
+                )
+                return True
+            except Exception as exception:
+                return False
+        return True
+
+    def is_quarantine_room_id_exist(self):
+        if hasattr(self, '_quarantine_room_id'):
+            try:
+                self._quarantine_room = validators.ModelInstanceExistenceValidator.valid(
+                    model_cls=QuarantineRoom,
+                    query_expr=Q(id=self._quarantine_room_id),
+                )
+                return True
+            except Exception as exception:
+                return False
+        return True
+
+    def check_quarantine_ward_room_relationship(self):
+        if hasattr(self, '_quarantine_room'):
+            if not hasattr(self, '_quarantine_floor'):
+                self._quarantine_floor = self._quarantine_room.quarantine_floor
+            elif self._quarantine_floor != self._quarantine_room.quarantine_floor:
+                raise exceptions.ValidationException({'quarantine_ward_room_relationship': messages.INVALID})
+
+        if hasattr(self, '_quarantine_floor'):
+            if not hasattr(self, '_quarantine_building'):
+                self._quarantine_building = self._quarantine_floor.quarantine_building
+            elif self._quarantine_building != self._quarantine_floor.quarantine_building:
+                raise exceptions.ValidationException({'quarantine_ward_room_relationship': messages.INVALID})
+
+        if hasattr(self, '_quarantine_building'):
+            if not hasattr(self, '_quarantine_ward'):
+                self._quarantine_ward = self._quarantine_building.quarantine_ward
+            elif self._quarantine_ward != self._quarantine_building.quarantine_ward:
+                raise exceptions.ValidationException({'quarantine_ward_room_relationship': messages.INVALID})
+
     def set_conclude_when_create_medical_declaration(self):
         self._conclude = HealthDeclarationConclude.NORMAL
 
@@ -239,6 +307,24 @@ class MedicalDeclarationValidator(validators.AbstractRequestValidate):
         if hasattr(self, '_user_code') and not self.is_user_code_exist():
             raise exceptions.ValidationException({'main': messages.USER_NOT_FOUND})
 
+    def extra_validate_to_get_health_info_of_users(self):
+        if hasattr(self, '_user_codes'):
+            self._user_codes = split_input_list(self._user_codes)
+        elif not any(hasattr(self, f'_{key}') for key in [
+            'quarantine_ward_id', 'quarantine_building_id',
+            'quarantine_floor_id', 'quarantine_room_id',
+        ]):
+            raise exceptions.ValidationException({'main': messages.EMPTY})
+        if not self.is_quarantine_ward_id_exist():
+            raise exceptions.NotFoundException({'quarantine_ward_id': messages.NOT_EXIST})
+        if not self.is_quarantine_building_id_exist():
+            raise exceptions.NotFoundException({'quarantine_building_id': messages.NOT_EXIST})
+        if not self.is_quarantine_floor_id_exist():
+            raise exceptions.NotFoundException({'quarantine_floor_id': messages.NOT_EXIST})
+        if not self.is_quarantine_room_id_exist():
+            raise exceptions.NotFoundException({'quarantine_room_id': messages.NOT_EXIST})
+        self.check_quarantine_ward_room_relationship()
+
     def extra_validate_to_filter_medical_declaration(self):
         if hasattr(self, '_user_code') and not self.is_user_code_exist():
             raise exceptions.ValidationException({'main': messages.USER_NOT_FOUND})
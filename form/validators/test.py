@@ -217,9 +217,14 @@ class TestValidator(validators.AbstractRequestValidate):
     def extra_validate_to_create_many_test(self):
         if hasattr(self, '_user_codes'):
             self._user_codes = split_input_list(self._user_codes)
+            # Lay tat ca user trong mot query
+            users = CustomUser.objects.filter(code__in=self._user_codes).select_related(
+                'member_x_custom_user', 'manager_x_custom_user', 'staff_x_custom_user',
+            )
+            dict_of_users = {user.code: user for user in users}
             self._users = []
             for code in self._user_codes:
-                user = self.get_user_by_code(code)
+                user = dict_of_users.get(code)
                 if not user:
                     raise exceptions.NotFoundException({'main': f'{code}: ' + messages.NOT_EXIST})
                 self._users += [user]
@@ -3,16 +3,19 @@ import datetime
 import pytz
 import openpyxl, csv, codecs
 from random import randint
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from utils.views import paginate_data
+from utils.views import paginate_data, paginate_data_by_cursor, export_data
 from rest_framework import permissions
 from rest_framework.parsers import MultiPartParser
 from rest_framework.decorators import action
 from drf_yasg.utils import swagger_auto_schema
-from .models import BackgroundDisease, MedicalDeclaration, Symptom, Test, Vaccine, VaccineDose, Pandemic
+from .models import BackgroundDisease, MedicalDeclaration, LatestVitals, Symptom, Test, TestState, Vaccine, VaccineDose, Pandemic
+from .positivity import update_test_state, get_number_of_negative_tests
+from .vitals import update_latest_vitals, get_health_info
 from .validators.medical_declaration import MedicalDeclarationValidator
 from .validators.test import TestValidator
 from .validators.vaccine import VaccineValidator, VaccineDoseValidator
@@ -36,12 +39,15 @@ from .swagger_params import (
     get_pandemic_swagger_params,
     update_pandemic_swagger_params,
 )
+from user_account.models import CustomUser, Member, Manager, Staff
+from user_account.counters import update_number_of_vaccine_doses
+from user_account.import_jobs import create_import_job
 from user_account.serializers import (
-    BaseBaseCustomUserSerializer,
+    BaseBaseCustomUserSerializer, ImportJobSerializer,
 )
 from notification.views import create_and_send_noti_to_list_user
 from utils import exceptions, messages
-from utils.enums import SymptomType, TestResult, TestType, HealthStatus, MemberLabel, CustomUserStatus
+from utils.enums import SymptomType, TestResult, TestType, HealthStatus, MemberLabel, CustomUserStatus, ImportJobType
 from utils.views import AbstractView, query_debugger
 
 # Create your views here.
@@ -463,7 +469,9 @@ class MedicalDeclarationAPI(AbstractView):
                 medical_declaration.code = self.custom_medical_declaration_code_generator(medical_declaration.user.code)
 
             medical_declaration.created_by = request.user
-            medical_declaration.save()
+            with transaction.atomic():
+                medical_declaration.save()
+                update_latest_vitals(medical_declaration)
 
             if hasattr(for_user, 'member_x_custom_user'):
                 for_member = for_user.member_x_custom_user
@@ -572,89 +580,116 @@ class MedicalDeclarationAPI(AbstractView):
 
             user = validator.get_field('user')
 
+            latest_vitals = LatestVitals.objects.filter(user=user).first()
+
             response_dict = {
                 'user': BaseBaseCustomUserSerializer(user, many=False).data,
-                'heartbeat': None,
-                'temperature': None,
-                'breathing': None,
-                'spo2': None,
-                'blood_pressure_max': None,
-                'blood_pressure_min': None,
-                'main_symptoms': None,
-                'extra_symptoms': None,
-                'other_symptoms': None,
+                **get_health_info(latest_vitals),
             }
 
-            last_medical_declaration = MedicalDeclaration.objects.filter(user=user).order_by('created_at').last()
-            if last_medical_declaration:
-                main_symptoms = {
-                    'data': last_medical_declaration.main_symptoms,
-                    'updated_at': last_medical_declaration.created_at,
-                }
-                extra_symptoms = {
-                    'data': last_medical_declaration.extra_symptoms,
-                    'updated_at': last_medical_declaration.created_at,
-                }
-                other_symptoms = {
-                    'data': last_medical_declaration.other_symptoms,
-                    'updated_at': last_medical_declaration.created_at,
-                }
-                response_dict['main_symptoms'] = main_symptoms
-                response_dict['extra_symptoms'] = extra_symptoms
-                response_dict['other_symptoms'] = other_symptoms
-            
-            heartbeat_medical_declaration = MedicalDeclaration.objects.filter(user=user, heartbeat__isnull=False).order_by('created_at').last()
-            if heartbeat_medical_declaration:
-                heartbeat = {
-                    'data': heartbeat_medical_declaration.heartbeat,
-                    'updated_at': heartbeat_medical_declaration.created_at,
-                }
-                response_dict['heartbeat'] = heartbeat
+            return self.response_handler.handle(data=response_dict)
+        except Exception as exception:
+            return self.exception_handler.handle(exception)
 
-            temperature_medical_declaration = MedicalDeclaration.objects.filter(user=user, temperature__isnull=False).order_by('created_at').last()
-            if temperature_medical_declaration:
-                temperature = {
-                    'data': temperature_medical_declaration.temperature,
-                    'updated_at': temperature_medical_declaration.created_at,
-                }
-                response_dict['temperature'] = temperature
+    @csrf_exempt
+    @query_debugger
+    @action(methods=['POST'], url_path='get_health_info_of_users', detail=False)
+    def get_health_info_of_users(self, request):
+        """Get health info of all quarantining members in a quarantine ward / building / floor / room, or of a list of users
 
-            breathing_medical_declaration = MedicalDeclaration.objects.filter(user=user, breathing__isnull=False).order_by('created_at').last()
-            if breathing_medical_declaration:
-                breathing = {
-                    'data': breathing_medical_declaration.breathing,
-                    'updated_at': breathing_medical_declaration.created_at,
-                }
-                response_dict['breathing'] = breathing
+        Args:
+            - quarantine_ward_id: String
+            - quarantine_building_id: String
+            - quarantine_floor_id: String
+            - quarantine_room_id: String
+            - user_codes: String <code>,<code>
+            - page: int
+            - page_size: int
+        """
 
-            spo2_medical_declaration = MedicalDeclaration.objects.filter(user=user, spo2__isnull=False).order_by('created_at').last()
-            if spo2_medical_declaration:
-                spo2 = {
-                    'data': spo2_medical_declaration.spo2,
-                    'updated_at': spo2_medical_declaration.created_at,
-                }
-                response_dict['spo2'] = spo2
+        accept_fields = [
+            'quarantine_ward_id', 'quarantine_building_id',
+            'quarantine_floor_id', 'quarantine_room_id',
+            'user_codes', 'page', 'page_size',
+        ]
 
-            blood_pressure_max_medical_declaration = MedicalDeclaration.objects.filter(user=user, blood_pressure_max__isnull=False).order_by('created_at').last()
-            if blood_pressure_max_medical_declaration:
-                blood_pressure_max = {
-                    'data': blood_pressure_max_medical_declaration.blood_pressure_max,
-                    'updated_at': blood_pressure_max_medical_declaration.created_at,
-                }
-                response_dict['blood_pressure_max'] = blood_pressure_max
+        try:
+            request_extractor = self.request_handler.handle(request)
+            receive_fields = request_extractor.data
+            accepted_fields = dict()
+
+            for key in receive_fields.keys():
+                if key in accept_fields:
+                    accepted_fields[key] = receive_fields[key]
 
-            blood_pressure_min_medical_declaration = MedicalDeclaration.objects.filter(user=user, blood_pressure_min__isnull=False).order_by('created_at').last()
-            if blood_pressure_min_medical_declaration:
-                blood_pressure_min = {
-                    'data': blood_pressure_min_medical_declaration.blood_pressure_min,
-                    'updated_at': blood_pressure_min_medical_declaration.created_at,
+            validator = MedicalDeclarationValidator(**accepted_fields)
+            validator.extra_validate_to_get_health_info_of_users()
+
+            query_set = CustomUser.objects.all()
+
+            if validator.has_field('user_codes'):
+                query_set = query_set.filter(code__in=validator.get_field('user_codes'))
+            else:
+                query_set = query_set.filter(role__name='MEMBER', status=CustomUserStatus.AVAILABLE)
+
+            if validator.has_field('quarantine_room'):
+                query_set = query_set.filter(member_x_custom_user__quarantine_room=validator.get_field('quarantine_room'))
+            elif validator.has_field('quarantine_floor'):
+                query_set = query_set.filter(member_x_custom_user__quarantine_floor=validator.get_field('quarantine_floor'))
+            elif validator.has_field('quarantine_building'):
+                query_set = query_set.filter(member_x_custom_user__quarantine_building=validator.get_field('quarantine_building'))
+
+            # Check ward of sender
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER']:
+                if validator.has_field('quarantine_ward') and validator.get_field('quarantine_ward') != request.user.quarantine_ward:
+                    raise exceptions.AuthenticationException({'quarantine_ward_id': messages.NO_PERMISSION})
+                query_set = query_set.filter(quarantine_ward=request.user.quarantine_ward)
+            elif validator.has_field('quarantine_ward'):
+                query_set = query_set.filter(quarantine_ward=validator.get_field('quarantine_ward'))
+
+            # latest vitals of each user in the same query
+            query_set = query_set.select_related('role', 'latest_vitals_x_user').order_by('id')
+
+            paginated_data = paginate_data(request, query_set)
+
+            paginated_data['content'] = [
+                {
+                    'user': BaseBaseCustomUserSerializer(user, many=False).data,
+                    **get_health_info(getattr(user, 'latest_vitals_x_user', None)),
                 }
-                response_dict['blood_pressure_min'] = blood_pressure_min
+                for user in paginated_data['content']
+            ]
 
-            return self.response_handler.handle(data=response_dict)
+            return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
+    def get_filtered_medical_declarations(self, request, accepted_fields):
+        """Validate filter fields of filter_medical_declaration, return filtered query set of MedicalDeclaration"""
+
+        validator = MedicalDeclarationValidator(**accepted_fields)
+
+        validator.is_valid_fields([
+            'created_at_max', 'created_at_min',
+        ])
+        validator.extra_validate_to_filter_medical_declaration()
+
+        query_set = MedicalDeclaration.objects.all()
+
+        list_to_filter_medical_declaration = [key for key in accepted_fields.keys()]
+        list_to_filter_medical_declaration = set(list_to_filter_medical_declaration) - \
+        {'page', 'page_size'}
+
+        dict_to_filter_medical_declaration = validator.get_data(list_to_filter_medical_declaration)
+
+        dict_to_filter_medical_declaration.setdefault('order_by', '-created_at')
+
+        filter = MedicalDeclarationFilter(dict_to_filter_medical_declaration, queryset=query_set)
+
+        query_set = filter.qs
+
+        return query_set
+
     @csrf_exempt
     @query_debugger
     @action(methods=['POST'], url_path='filter', detail=False)
@@ -667,6 +702,7 @@ class MedicalDeclarationAPI(AbstractView):
             - created_at_min: String vd:'2000-01-26T01:23:45.123456Z'
             - page: int
             - page_size: int
+            - cursor: String ('' for first page, nextCursor for next page, order by created_at instead of page)
             - search: String
         """
 
@@ -684,34 +720,76 @@ class MedicalDeclarationAPI(AbstractView):
                 if key in accept_fields:
                     accepted_fields[key] = receive_fields[key]
 
-            validator = MedicalDeclarationValidator(**accepted_fields)
+            query_set = self.get_filtered_medical_declarations(request, accepted_fields)
 
-            validator.is_valid_fields([
-                'created_at_max', 'created_at_min',
-            ])
-            validator.extra_validate_to_filter_medical_declaration()
+            query_set = query_set.select_related('user__member_x_custom_user', 'user__manager_x_custom_user', 'user__staff_x_custom_user')
 
-            query_set = MedicalDeclaration.objects.all()
+            if 'cursor' in request.data:
+                paginated_data = paginate_data_by_cursor(request, query_set, FilterMedicalDeclarationSerializer)
+            else:
+                paginated_data = paginate_data(request, query_set, FilterMedicalDeclarationSerializer)
 
-            list_to_filter_medical_declaration = [key for key in accepted_fields.keys()]
-            list_to_filter_medical_declaration = set(list_to_filter_medical_declaration) - \
-            {'page', 'page_size'}
+            return self.response_handler.handle(data=paginated_data)
+        except Exception as exception:
+            return self.exception_handler.handle(exception)
+
+    # columns of exported file of medical declarations: (header, field of MedicalDeclaration)
+    export_medical_declaration_columns = [
+        ('Mã khai báo', 'code'),
+        ('Mã người dùng', 'user__code'),
+        ('Họ và tên', 'user__full_name'),
+        ('Số điện thoại', 'user__phone_number'),
+        ('Nhịp tim', 'heartbeat'),
+        ('Nhiệt độ', 'temperature'),
+        ('Nhịp thở', 'breathing'),
+        ('SPO2', 'spo2'),
+        ('Huyết áp tối thiểu', 'blood_pressure_min'),
+        ('Huyết áp tối đa', 'blood_pressure_max'),
+        ('Triệu chứng chính', 'main_symptoms'),
+        ('Triệu chứng phụ', 'extra_symptoms'),
+        ('Triệu chứng khác', 'other_symptoms'),
+        ('Kết luận', 'conclude'),
+        ('Thời gian khai báo', 'created_at'),
+    ]
 
-            dict_to_filter_medical_declaration = validator.get_data(list_to_filter_medical_declaration)
+    @csrf_exempt
+    @query_debugger
+    @action(methods=['POST'], url_path='export', detail=False)
+    def export_medical_declaration(self, request):
+        """Export medical declarations as a file, rows are streamed
 
-            dict_to_filter_medical_declaration.setdefault('order_by', '-created_at')
+        Args:
+            - file_type: String ['csv', 'xlsx'], default 'csv'
+            - same filter fields as filter_medical_declaration (except page, page_size, cursor)
+        """
 
-            filter = MedicalDeclarationFilter(dict_to_filter_medical_declaration, queryset=query_set)
+        accept_fields = [
+            'user_code', 'search',
+            'created_at_max', 'created_at_min',
+            'file_type',
+        ]
 
-            query_set = filter.qs
+        try:
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
+                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
 
-            query_set = query_set.select_related('user__member_x_custom_user', 'user__manager_x_custom_user', 'user__staff_x_custom_user')
+            request_extractor = self.request_handler.handle(request)
+            receive_fields = request_extractor.data
+            accepted_fields = dict()
 
-            serializer = FilterMedicalDeclarationSerializer(query_set, many=True)
+            for key in receive_fields.keys():
+                if key in accept_fields:
+                    accepted_fields[key] = receive_fields[key]
 
-            paginated_data = paginate_data(request, serializer.data)
+            file_type = accepted_fields.pop('file_type', 'csv')
 
-            return self.response_handler.handle(data=paginated_data)
+            query_set = self.get_filtered_medical_declarations(request, accepted_fields)
+
+            # Check ward of sender
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER']:
+                query_set = query_set.filter(user__quarantine_ward=request.user.quarantine_ward)
+
+            return export_data(query_set, self.export_medical_declaration_columns, 'medical_declarations', file_type)
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
@@ -730,8 +808,24 @@ class TestAPI(AbstractView):
 
         return first_part + second_part + third_part
 
+    def set_test_codes(self, tests):
+        """Set unique codes for tests, check existed codes of all tests in one query"""
+        used_codes = set()
+        remaining_tests = tests
+        while remaining_tests:
+            for test in remaining_tests:
+                test.code = self.custom_test_code_generator(test.user.code)
+                while test.code in used_codes:
+                    test.code = self.custom_test_code_generator(test.user.code)
+                used_codes.add(test.code)
+
+            existed_codes = set(Test.objects.filter(
+                code__in=[test.code for test in remaining_tests],
+            ).values_list('code', flat=True))
+            remaining_tests = [test for test in remaining_tests if test.code in existed_codes]
+
     def calculate_new_conclude_from_test(self, test, old_positive_test_now):
-        """test must be the last test has result of this member"""
+        """test must be the last test has result of this member, test state of this member must be updated"""
         if test.result == TestResult.POSITIVE:
             return True
         elif test.result == TestResult.NEGATIVE:
@@ -764,26 +858,9 @@ class TestAPI(AbstractView):
                         number_test_need = int(os.environ.get('NUM_TEST_POS_TO_NEG_VAC', 1))
                         type_test_need = os.environ.get('TEST_TYPE_POS_TO_NEG_VAC', TestType.QUICK)
 
-                # check there tests
-                tests_to_check = Test.objects.filter(user=this_user)
-                if type_test_need == TestType.RT_PCR:
-                    tests_to_check = tests_to_check.filter(type=type_test_need)
-                tests_to_check = tests_to_check.filter(~Q(result=TestResult.NONE))
-                positive_tests_of_this_user = Test.objects.filter(user=this_user, result=TestResult.POSITIVE)
-                if positive_tests_of_this_user.count() >= 1:
-                    last_positive_test_of_this_user = positive_tests_of_this_user.order_by('-created_at')[:1].get()
-                    tests_to_check = tests_to_check.filter(created_at__gt=last_positive_test_of_this_user.created_at)
-                
-                tests_to_check = tests_to_check.order_by('-created_at')[:number_test_need]
-                tests_to_check = list(tests_to_check)
-                if len(tests_to_check) < number_test_need:
-                    return True
-                is_positive = False
-                for test in tests_to_check:
-                    if test.result == TestResult.POSITIVE:
-                        is_positive = True
-                        break
-                return is_positive
+                # check number of negative tests since the last positive test
+                test_state = TestState.objects.filter(user=this_user).first()
+                return get_number_of_negative_tests(test_state, type_test_need) < number_test_need
         else:
             return old_positive_test_now
 
@@ -841,7 +918,9 @@ class TestAPI(AbstractView):
             while (validator.is_code_exist(test.code)):
                 test.code = self.custom_test_code_generator(test.user.code)
             test.created_by = request.user
-            test.save()
+            with transaction.atomic():
+                test.save()
+                update_test_state(test)
 
             # Update user
             user = test.user
@@ -992,41 +1071,44 @@ class TestAPI(AbstractView):
             tests = []
             for user in users:
                 test = Test(user=user, type=type, created_by=request.user, updated_by=request.user)
-                test.code = self.custom_test_code_generator(user.code)
-                while (validator.is_code_exist(test.code)):
-                    test.code = self.custom_test_code_generator(user.code)
                 tests += [test]
-
-            Test.objects.bulk_create(tests)
-
-            # Update user
-            for test in tests:
-                user = test.user
-                if hasattr(user, 'member_x_custom_user'):
-                    this_member = user.member_x_custom_user
-                    this_member.last_tested = test.created_at
-                    this_member.save()
-                if hasattr(user, 'manager_x_custom_user'):
-                    this_manager = user.manager_x_custom_user
-                    this_manager.last_tested = test.created_at
-                    this_manager.save()
-                if hasattr(user, 'staff_x_custom_user'):
-                    this_staff = user.staff_x_custom_user
-                    this_staff.last_tested = test.created_at
-                    this_staff.save()
+            self.set_test_codes(tests)
+
+            with transaction.atomic():
+                Test.objects.bulk_create(tests)
+
+                # Update user
+                dict_of_members = dict()
+                dict_of_managers = dict()
+                dict_of_staffs = dict()
+                for test in tests:
+                    user = test.user
+                    if hasattr(user, 'member_x_custom_user'):
+                        this_member = user.member_x_custom_user
+                        this_member.last_tested = test.created_at
+                        dict_of_members[this_member.id] = this_member
+                    if hasattr(user, 'manager_x_custom_user'):
+                        this_manager = user.manager_x_custom_user
+                        this_manager.last_tested = test.created_at
+                        dict_of_managers[this_manager.id] = this_manager
+                    if hasattr(user, 'staff_x_custom_user'):
+                        this_staff = user.staff_x_custom_user
+                        this_staff.last_tested = test.created_at
+                        dict_of_staffs[this_staff.id] = this_staff
+
+                Member.objects.bulk_update(dict_of_members.values(), ['last_tested'])
+                Manager.objects.bulk_update(dict_of_managers.values(), ['last_tested'])
+                Staff.objects.bulk_update(dict_of_staffs.values(), ['last_tested'])
 
             return self.response_handler.handle(message=messages.SUCCESS)
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
-    @csrf_exempt
-    @query_debugger
-    @action(methods=['POST'], url_path='create_by_file', detail=False)
-    def create_test_by_file(self, request):
-        """Create a test by file (csv, xlsx)
-        
-        Args:
-            + file: .csv, .xlsx
+    def import_tests_from_file(self, file_name, created_by, on_progress=None):
+        """
+        Create tests from rows of an imported file (csv, xlsx), xlsx file is opened in read only mode.
+        on_progress(num_processed, test_ids, error) is called after every IMPORT_JOB_PROGRESS_ROWS rows.
+        Return (test_ids, error)
         """
 
         test_fields = [
@@ -1050,189 +1132,212 @@ class TestAPI(AbstractView):
             "Dương tính": 'POSITIVE',
         }
 
-        try:
-            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
-                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
+        extension = os.path.splitext(str(file_name))[1]
+        iter_rows = None
+        wb = None
+        error = dict()
+        test_ids = list()
+        is_csv_file = False
+        list_user_positive = list()
+        list_user_negative = list()
+        num_processed = 0
+        progress_rows = int(os.environ.get('IMPORT_JOB_PROGRESS_ROWS', 100))
+
+        if (extension == ".xlsx"):
+            wb = openpyxl.load_workbook(file_name, read_only=True)
+            ws = wb["Sheet1"]
+            iter_rows = ws.iter_rows(min_row=2, min_col=2, max_col=5, values_only=True)
+        elif (extension == ".csv"):
+            iter_rows = csv.DictReader(codecs.iterdecode(file_name, encoding='utf-8'))
+            is_csv_file = True
+
+        for row_index, row in enumerate(iter_rows):
+            try:
+                dict_test_data = dict()
+                check_data = None
+
+                if is_csv_file: 
+                    row = list(row.values())[1:]
+                else:
+                    row = list(row)
+                check_data = row[0]
+                if check_data in [None, '']:
+                    continue
+                num_processed += 1
+
+                for index, value in enumerate(row):
+                    if index == 1:
+                        value = str(value)
+                        value = status_switcher[value]
+                    elif index == 2:
+                        value = str(value)
+                        value = type_switcher[value]
+                    elif index == 3:
+                        value = str(value)
+                        value = result_switcher[value]
+                    dict_test_data[test_fields[index]] = value
+                    
+                validator = TestValidator(**dict_test_data)
+                validator.is_valid_fields([
+                    'status', 'type', 'result',
+                ])
+                
+                validator.extra_validate_to_create_test()
 
-            file_name = request.FILES.get('file', False)
-            if file_name:
-                extension = os.path.splitext(str(file_name))[1]
-                iter_rows = None
-                error = dict()
-                test_ids = list()
-                is_csv_file = False
-                list_user_positive = list()
-                list_user_negative = list()
-
-                if (extension == ".xlsx"):
-                    wb = openpyxl.load_workbook(file_name)
-                    ws = wb["Sheet1"]
-                    iter_rows = ws.iter_rows(min_row=2, min_col=2, max_col=5)
-                elif (extension == ".csv"):
-                    iter_rows = csv.DictReader(codecs.iterdecode(file_name, encoding='utf-8'))
-                    is_csv_file = True
-
-                for row_index, row in enumerate(iter_rows):
-                    try:
-                        dict_test_data = dict()
-                        check_data = None
-
-                        if is_csv_file: 
-                            row = list(row.values())[1:]
-                            check_data = row[0]
-                        else:
-                            check_data = row[0].value
-                        if check_data in [None, '']:
-                            continue
-
-                        for index, data in enumerate(row):
-                            value = data.value if not is_csv_file else data
-                            if index == 1:
-                                value = str(value)
-                                value = status_switcher[value]
-                            elif index == 2:
-                                value = str(value)
-                                value = type_switcher[value]
-                            elif index == 3:
-                                value = str(value)
-                                value = result_switcher[value]
-                            dict_test_data[test_fields[index]] = value
-                            
-                        validator = TestValidator(**dict_test_data)
-                        validator.is_valid_fields([
-                            'status', 'type', 'result',
-                        ])
-                        
-                        validator.extra_validate_to_create_test()
+                list_to_create_test = [key for key in test_fields]
+                list_to_create_test = set(list_to_create_test) - {'phone_number'}
+                list_to_create_test = list(list_to_create_test) + ['user']
 
-                        list_to_create_test = [key for key in test_fields]
-                        list_to_create_test = set(list_to_create_test) - {'phone_number'}
-                        list_to_create_test = list(list_to_create_test) + ['user']
+                dict_to_create_test = validator.get_data(list_to_create_test)
 
-                        dict_to_create_test = validator.get_data(list_to_create_test)
+                test = Test(**dict_to_create_test)
 
-                        test = Test(**dict_to_create_test)
+                test.code = self.custom_test_code_generator(test.user.code)
+                while (validator.is_code_exist(test.code)):
+                    test.code = self.custom_test_code_generator(test.user.code)
+                test.created_by = created_by
+                with transaction.atomic():
+                    test.save()
+                    update_test_state(test)
 
-                        test.code = self.custom_test_code_generator(test.user.code)
-                        while (validator.is_code_exist(test.code)):
-                            test.code = self.custom_test_code_generator(test.user.code)
-                        test.created_by = request.user
-                        test.save()
+                # Update user
+                user = test.user
+                if hasattr(user, 'member_x_custom_user'):
+                    this_member = user.member_x_custom_user
+                    this_member.last_tested = test.created_at
 
-                        # Update user
-                        user = test.user
-                        if hasattr(user, 'member_x_custom_user'):
-                            this_member = user.member_x_custom_user
-                            this_member.last_tested = test.created_at
+                    if test.result != TestResult.NONE:
+                        old_positive_test_now = this_member.positive_test_now
+                        new_positive_test_now = self.calculate_new_conclude_from_test(test, old_positive_test_now)
+                        this_member.positive_test_now = new_positive_test_now
 
-                            if test.result != TestResult.NONE:
-                                old_positive_test_now = this_member.positive_test_now
-                                new_positive_test_now = self.calculate_new_conclude_from_test(test, old_positive_test_now)
-                                this_member.positive_test_now = new_positive_test_now
+                        if old_positive_test_now != True and new_positive_test_now == True:
+                            this_member.label = MemberLabel.F0
+
+                            if this_member.custom_user.status == CustomUserStatus.AVAILABLE:
+                                if this_member.quarantined_finish_expected_at == None:
+                                    quarantine_ward = this_member.custom_user.quarantine_ward
+                                    if quarantine_ward.pandemic:
+                                        if this_member.number_of_vaccine_doses < 2:
+                                            remain_qt = quarantine_ward.pandemic.remain_qt_pos_not_vac
+                                        else:
+                                            remain_qt = quarantine_ward.pandemic.remain_qt_pos_vac
+                                    else:
+                                        if this_member.number_of_vaccine_doses < 2:
+                                            remain_qt = int(os.environ.get('REMAIN_QT_POS_NOT_VAC', 14))
+                                        else:
+                                            remain_qt = int(os.environ.get('REMAIN_QT_POS_VAC', 10))
+                                    this_member.quarantined_finish_expected_at = timezone.now() + datetime.timedelta(days=remain_qt)
+                                
+                                # affect other member in this room
+                                this_room = this_member.quarantine_room
+                                if this_room:
+                                    members_in_this_room = this_room.member_x_quarantine_room.all()
+                                    for member in list(members_in_this_room):
+                                        if member.label != MemberLabel.F0:
+                                            member.label = MemberLabel.F1
+                                            member.quarantined_finish_expected_at = None
+                                            member.save()
 
-                                if old_positive_test_now != True and new_positive_test_now == True:
-                                    this_member.label = MemberLabel.F0
+                        elif old_positive_test_now == True and new_positive_test_now == False:
+                            this_member.positive_tested_before = True
 
-                                    if this_member.custom_user.status == CustomUserStatus.AVAILABLE:
-                                        if this_member.quarantined_finish_expected_at == None:
-                                            quarantine_ward = this_member.custom_user.quarantine_ward
-                                            if quarantine_ward.pandemic:
-                                                if this_member.number_of_vaccine_doses < 2:
-                                                    remain_qt = quarantine_ward.pandemic.remain_qt_pos_not_vac
-                                                else:
-                                                    remain_qt = quarantine_ward.pandemic.remain_qt_pos_vac
-                                            else:
-                                                if this_member.number_of_vaccine_doses < 2:
-                                                    remain_qt = int(os.environ.get('REMAIN_QT_POS_NOT_VAC', 14))
+                            if this_member.custom_user.status == CustomUserStatus.AVAILABLE:
+                                # affect other member in this room
+                                this_room = this_member.quarantine_room
+                                if this_room:
+                                    other_members_in_this_room = this_room.member_x_quarantine_room.all().exclude(id=this_member.id)
+                                    number_of_other_positive_member_in_this_room = other_members_in_this_room.filter(positive_test_now=True).count()
+                                    if number_of_other_positive_member_in_this_room == 0:
+                                        quarantine_ward = this_room.quarantine_floor.quarantine_building.quarantine_ward
+                                        for member in list(other_members_in_this_room):
+                                            if member.label != MemberLabel.F0:
+                                                if quarantine_ward.pandemic:
+                                                    if member.number_of_vaccine_doses < 2:
+                                                        remain_qt = quarantine_ward.pandemic.remain_qt_cc_pos_not_vac
+                                                    else:
+                                                        remain_qt = quarantine_ward.pandemic.remain_qt_cc_pos_vac
                                                 else:
-                                                    remain_qt = int(os.environ.get('REMAIN_QT_POS_VAC', 10))
-                                            this_member.quarantined_finish_expected_at = timezone.now() + datetime.timedelta(days=remain_qt)
-                                        
-                                        # affect other member in this room
-                                        this_room = this_member.quarantine_room
-                                        if this_room:
-                                            members_in_this_room = this_room.member_x_quarantine_room.all()
-                                            for member in list(members_in_this_room):
-                                                if member.label != MemberLabel.F0:
-                                                    member.label = MemberLabel.F1
-                                                    member.quarantined_finish_expected_at = None
+                                                    if member.number_of_vaccine_doses < 2:
+                                                        remain_qt = int(os.environ.get('REMAIN_QT_CC_POS_NOT_VAC', 14))
+                                                    else:
+                                                        remain_qt = int(os.environ.get('REMAIN_QT_CC_POS_VAC', 10))
+                                                old_quarantined_finish_expected_at = member.quarantined_finish_expected_at
+                                                new_quarantined_finish_expected_at = timezone.now() + datetime.timedelta(days=remain_qt)
+                                                if not old_quarantined_finish_expected_at or old_quarantined_finish_expected_at < new_quarantined_finish_expected_at:
+                                                    member.quarantined_finish_expected_at = new_quarantined_finish_expected_at
                                                     member.save()
 
-                                elif old_positive_test_now == True and new_positive_test_now == False:
-                                    this_member.positive_tested_before = True
-
-                                    if this_member.custom_user.status == CustomUserStatus.AVAILABLE:
-                                        # affect other member in this room
-                                        this_room = this_member.quarantine_room
-                                        if this_room:
-                                            other_members_in_this_room = this_room.member_x_quarantine_room.all().exclude(id=this_member.id)
-                                            number_of_other_positive_member_in_this_room = other_members_in_this_room.filter(positive_test_now=True).count()
-                                            if number_of_other_positive_member_in_this_room == 0:
-                                                quarantine_ward = this_room.quarantine_floor.quarantine_building.quarantine_ward
-                                                for member in list(other_members_in_this_room):
-                                                    if member.label != MemberLabel.F0:
-                                                        if quarantine_ward.pandemic:
-                                                            if member.number_of_vaccine_doses < 2:
-                                                                remain_qt = quarantine_ward.pandemic.remain_qt_cc_pos_not_vac
-                                                            else:
-                                                                remain_qt = quarantine_ward.pandemic.remain_qt_cc_pos_vac
-                                                        else:
-                                                            if member.number_of_vaccine_doses < 2:
-                                                                remain_qt = int(os.environ.get('REMAIN_QT_CC_POS_NOT_VAC', 14))
-                                                            else:
-                                                                remain_qt = int(os.environ.get('REMAIN_QT_CC_POS_VAC', 10))
-                                                        old_quarantined_finish_expected_at = member.quarantined_finish_expected_at
-                                                        new_quarantined_finish_expected_at = timezone.now() + datetime.timedelta(days=remain_qt)
-                                                        if not old_quarantined_finish_expected_at or old_quarantined_finish_expected_at < new_quarantined_finish_expected_at:
-                                                            member.quarantined_finish_expected_at = new_quarantined_finish_expected_at
-                                                            member.save()
-
-                                this_member.last_tested_had_result = test.created_at
-                            this_member.save()
-                        if hasattr(user, 'manager_x_custom_user'):
-                            this_manager = user.manager_x_custom_user
-                            this_manager.last_tested = test.created_at
-                            if test.result != TestResult.NONE:
-                                new_positive_test_now = self.calculate_new_conclude_from_test(test, this_manager.positive_test_now)
-                                this_manager.positive_test_now = new_positive_test_now
-                                this_manager.last_tested_had_result = test.created_at
-                            this_manager.save()
-                        if hasattr(user, 'staff_x_custom_user'):
-                            this_staff = user.staff_x_custom_user
-                            this_staff.last_tested = test.created_at
-                            if test.result != TestResult.NONE:
-                                new_positive_test_now = self.calculate_new_conclude_from_test(test, this_staff.positive_test_now)
-                                this_staff.positive_test_now = new_positive_test_now
-                                this_staff.last_tested_had_result = test.created_at
-                            this_staff.save()
-
-                        if test.result != TestResult.NONE:
-                            if test.result == TestResult.POSITIVE:
-                                list_user_positive += [test.user]
-                            else:
-                                list_user_negative += [test.user]
+                        this_member.last_tested_had_result = test.created_at
+                    this_member.save()
+                if hasattr(user, 'manager_x_custom_user'):
+                    this_manager = user.manager_x_custom_user
+                    this_manager.last_tested = test.created_at
+                    if test.result != TestResult.NONE:
+                        new_positive_test_now = self.calculate_new_conclude_from_test(test, this_manager.positive_test_now)
+                        this_manager.positive_test_now = new_positive_test_now
+                        this_manager.last_tested_had_result = test.created_at
+                    this_manager.save()
+                if hasattr(user, 'staff_x_custom_user'):
+                    this_staff = user.staff_x_custom_user
+                    this_staff.last_tested = test.created_at
+                    if test.result != TestResult.NONE:
+                        new_positive_test_now = self.calculate_new_conclude_from_test(test, this_staff.positive_test_now)
+                        this_staff.positive_test_now = new_positive_test_now
+                        this_staff.last_tested_had_result = test.created_at
+                    this_staff.save()
 
-                        test_ids += [test.id]
-                    except Exception as e:
-                        error[str(row_index + 1)] = str(e)
-                        pass
+                if test.result != TestResult.NONE:
+                    if test.result == TestResult.POSITIVE:
+                        list_user_positive += [test.user]
+                    else:
+                        list_user_negative += [test.user]
+
+                test_ids += [test.id]
+                last_test = test
+            except Exception as e:
+                error[str(row_index + 1)] = str(e)
+                pass
+
+            if on_progress and num_processed % progress_rows == 0:
+                on_progress(num_processed, test_ids, error)
+
+        if wb:
+            wb.close()
+
+        # Send notification to users
+        if not test_ids:
+            return test_ids, error
+        vntz = pytz.timezone('Asia/Saigon')
+        created_at = last_test.created_at.astimezone(vntz)
+        time_string = f'{created_at.hour} giờ {created_at.minute} phút {created_at.second} giây, ngày {created_at.day} tháng {created_at.month} năm {created_at.year}'
+        title = 'Kết quả xét nghiệm'
+        description_positive = 'Phiếu xét nghiệm lúc ' + time_string + ' có kết quả ' + 'DƯƠNG TÍNH'
+        description_negative = 'Phiếu xét nghiệm lúc ' + time_string + ' có kết quả ' + 'ÂM TÍNH'
+        create_and_send_noti_to_list_user(title=title, description=description_positive, receive_user_list=list_user_positive, created_by=None)
+        create_and_send_noti_to_list_user(title=title, description=description_negative, receive_user_list=list_user_negative, created_by=None)
+
+        return test_ids, error
 
-                # Send notification to users
-                vntz = pytz.timezone('Asia/Saigon')
-                created_at = test.created_at.astimezone(vntz)
-                time_string = f'{created_at.hour} giờ {created_at.minute} phút {created_at.second} giây, ngày {created_at.day} tháng {created_at.month} năm {created_at.year}'
-                title = 'Kết quả xét nghiệm'
-                description_positive = 'Phiếu xét nghiệm lúc ' + time_string + ' có kết quả ' + 'DƯƠNG TÍNH'
-                description_negative = 'Phiếu xét nghiệm lúc ' + time_string + ' có kết quả ' + 'ÂM TÍNH'
-                create_and_send_noti_to_list_user(title=title, description=description_positive, receive_user_list=list_user_positive, created_by=None)
-                create_and_send_noti_to_list_user(title=title, description=description_negative, receive_user_list=list_user_negative, created_by=None)
-                
-                test_data = Test.objects.filter(id__in=test_ids)
-                test_serializer = FilterTestSerializer(test_data, many=True)
-                response_data = dict()
-                response_data["test_success"] = test_serializer.data
-                response_data["test_fail"] = error
-                
+    @csrf_exempt
+    @query_debugger
+    @action(methods=['POST'], url_path='create_by_file', detail=False)
+    def create_test_by_file(self, request):
+        """Create tests by file (csv, xlsx) in background, return the import job
+        
+        Args:
+            + file: .csv, .xlsx
+        """
+
+        try:
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
+                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
+
+            file_name = request.FILES.get('file', False)
+            if file_name:
+                # file is processed by worker.py, result is polled with import_job/get
+                import_job = create_import_job(ImportJobType.TEST, file_name, request.user)
+                response_data = ImportJobSerializer(import_job, many=False).data
             else:
                 raise exceptions.InvalidArgumentException({'main': messages.FILE_IMPORT_EMPTY})
 
@@ -1329,6 +1434,8 @@ class TestAPI(AbstractView):
             validator.extra_validate_to_update_test()
 
             test = validator.get_field('test')
+            old_result = test.result
+            old_type = test.type
 
             list_to_update_test = [key for key in accepted_fields.keys()]
             list_to_update_test = set(list_to_update_test) - {'code'}
@@ -1340,7 +1447,9 @@ class TestAPI(AbstractView):
                 setattr(test, attr, value)
 
             test.updated_by = request.user
-            test.save()
+            with transaction.atomic():
+                test.save()
+                update_test_state(test, old_result, old_type)
 
             # Update user
             if test.result != TestResult.NONE:
@@ -1444,6 +1553,43 @@ class TestAPI(AbstractView):
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
+    def get_filtered_tests(self, request, accepted_fields):
+        """Validate filter fields of filter_test, return filtered query set of Test"""
+
+        validator = TestValidator(**accepted_fields)
+
+        validator.is_valid_fields([
+            'status', 'result', 'type',
+            'created_at_max', 'created_at_min',
+            'updated_at_max', 'updated_at_min',
+        ])
+        validator.extra_validate_to_filter_test()
+
+        query_set = Test.objects.all()
+
+        list_to_filter_test = [key for key in accepted_fields.keys()]
+        list_to_filter_test = set(list_to_filter_test) - \
+        {'page', 'page_size'}
+
+        dict_to_filter_test = validator.get_data(list_to_filter_test)
+
+        # Check ward of sender
+        if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER']:
+            if hasattr(validator, '_quarantine_ward'):
+                # Sender want filter with ward, building, floor or room
+                if validator.get_field('quarantine_ward') != request.user.quarantine_ward:
+                    raise exceptions.AuthenticationException({'quarantine_ward_id': messages.NO_PERMISSION})
+            else:
+                dict_to_filter_test['quarantine_ward_id'] = request.user.quarantine_ward.id
+
+        dict_to_filter_test.setdefault('order_by', '-created_at')
+
+        filter = TestFilter(dict_to_filter_test, queryset=query_set)
+
+        query_set = filter.qs
+
+        return query_set
+
     @csrf_exempt
     @query_debugger
     @action(methods=['POST'], url_path='filter', detail=False)
@@ -1465,6 +1611,7 @@ class TestAPI(AbstractView):
             - quarantine_room_id: String
             - page: int
             - page_size: int
+            - cursor: String ('' for first page, nextCursor for next page, order by created_at instead of page)
             - search: String
         """
 
@@ -1487,45 +1634,70 @@ class TestAPI(AbstractView):
                 if key in accept_fields:
                     accepted_fields[key] = receive_fields[key]
 
-            validator = TestValidator(**accepted_fields)
+            query_set = self.get_filtered_tests(request, accepted_fields)
 
-            validator.is_valid_fields([
-                'status', 'result', 'type',
-                'created_at_max', 'created_at_min',
-                'updated_at_max', 'updated_at_min',
-            ])
-            validator.extra_validate_to_filter_test()
+            query_set = query_set.select_related('user__member_x_custom_user', 'user__manager_x_custom_user', 'user__staff_x_custom_user')
 
-            query_set = Test.objects.all()
+            if 'cursor' in request.data:
+                paginated_data = paginate_data_by_cursor(request, query_set, FilterTestSerializer)
+            else:
+                paginated_data = paginate_data(request, query_set, FilterTestSerializer)
 
-            list_to_filter_test = [key for key in accepted_fields.keys()]
-            list_to_filter_test = set(list_to_filter_test) - \
-            {'page', 'page_size'}
+            return self.response_handler.handle(data=paginated_data)
+        except Exception as exception:
+            return self.exception_handler.handle(exception)
 
-            dict_to_filter_test = validator.get_data(list_to_filter_test)
+    # columns of exported file of tests: (header, field of Test)
+    export_test_columns = [
+        ('Mã phiếu xét nghiệm', 'code'),
+        ('Mã người dùng', 'user__code'),
+        ('Họ và tên', 'user__full_name'),
+        ('Số điện thoại', 'user__phone_number'),
+        ('Trạng thái', 'status'),
+        ('Kỹ thuật xét nghiệm', 'type'),
+        ('Kết quả', 'result'),
+        ('Thời gian tạo', 'created_at'),
+        ('Thời gian cập nhật', 'updated_at'),
+    ]
 
-            # Check ward of sender
-            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER']:
-                if hasattr(validator, '_quarantine_ward'):
-                    # Sender want filter with ward, building, floor or room
-                    if validator.get_field('quarantine_ward') != request.user.quarantine_ward:
-                        raise exceptions.AuthenticationException({'quarantine_ward_id': messages.NO_PERMISSION})
-                else:
-                    dict_to_filter_test['quarantine_ward_id'] = request.user.quarantine_ward.id
+    @csrf_exempt
+    @query_debugger
+    @action(methods=['POST'], url_path='export', detail=False)
+    def export_test(self, request):
+        """Export tests as a file, rows are streamed
 
-            dict_to_filter_test.setdefault('order_by', '-created_at')
+        Args:
+            - file_type: String ['csv', 'xlsx'], default 'csv'
+            - same filter fields as filter_test (except page, page_size, cursor)
+        """
 
-            filter = TestFilter(dict_to_filter_test, queryset=query_set)
+        accept_fields = [
+            'user_code', 'status',
+            'result', 'type',
+            'created_at_max', 'created_at_min',
+            'updated_at_max', 'updated_at_min',
+            'quarantine_ward_id', 'quarantine_building_id',
+            'quarantine_floor_id', 'quarantine_room_id',
+            'search', 'file_type',
+        ]
 
-            query_set = filter.qs
+        try:
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
+                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
 
-            query_set = query_set.select_related('user__member_x_custom_user', 'user__manager_x_custom_user', 'user__staff_x_custom_user')
+            request_extractor = self.request_handler.handle(request)
+            receive_fields = request_extractor.data
+            accepted_fields = dict()
 
-            serializer = FilterTestSerializer(query_set, many=True)
+            for key in receive_fields.keys():
+                if key in accept_fields:
+                    accepted_fields[key] = receive_fields[key]
 
-            paginated_data = paginate_data(request, serializer.data)
+            file_type = accepted_fields.pop('file_type', 'csv')
 
-            return self.response_handler.handle(data=paginated_data)
+            query_set = self.get_filtered_tests(request, accepted_fields)
+
+            return export_data(query_set, self.export_test_columns, 'tests', file_type)
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
@@ -1798,24 +1970,11 @@ class VaccineDoseAPI(AbstractView):
             dict_to_create_vaccine_dose = validator.get_data(list_to_create_vaccine_dose)
 
             vaccine_dose = VaccineDose(**dict_to_create_vaccine_dose)
-            vaccine_dose.save()
 
-            # Update member/manager/staff.number_of_vaccine_doses
-
-            if hasattr(custom_user, 'member_x_custom_user'):
-                member = custom_user.member_x_custom_user
-                member.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
-                member.save()
-
-            if hasattr(custom_user, 'manager_x_custom_user'):
-                manager = custom_user.manager_x_custom_user
-                manager.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
-                manager.save()
-            
-            if hasattr(custom_user, 'staff_x_custom_user'):
-                staff = custom_user.staff_x_custom_user
-                staff.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
-                staff.save()
+            # Update member/manager/staff.number_of_vaccine_doses in the same transaction
+            with transaction.atomic():
+                vaccine_dose.save()
+                update_number_of_vaccine_doses(custom_user, 1)
 
             serializer = VaccineDoseSerializer(vaccine_dose, many=False)
             
@@ -1923,24 +2082,10 @@ class VaccineDoseAPI(AbstractView):
 
             custom_user = vaccine_dose.custom_user
 
-            vaccine_dose.delete()
-
-            # Update member/manager/staff.number_of_vaccine_doses
-
-            if hasattr(custom_user, 'member_x_custom_user'):
-                member = custom_user.member_x_custom_user
-                member.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
-                member.save()
-
-            if hasattr(custom_user, 'manager_x_custom_user'):
-                manager = custom_user.manager_x_custom_user
-                manager.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
-                manager.save()
-            
-            if hasattr(custom_user, 'staff_x_custom_user'):
-                staff = custom_user.staff_x_custom_user
-                staff.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
-                staff.save()
+            # Update member/manager/staff.number_of_vaccine_doses in the same transaction
+            with transaction.atomic():
+                vaccine_dose.delete()
+                update_number_of_vaccine_doses(custom_user, -1)
             
             return self.response_handler.handle(data=messages.SUCCESS)
         except Exception as exception:
@@ -1999,9 +2144,7 @@ class VaccineDoseAPI(AbstractView):
 
             query_set = query_set.select_related()
 
-            serializer = FilterVaccineDoseSerializer(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            paginated_data = paginate_data(request, query_set, FilterVaccineDoseSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
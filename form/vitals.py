@@ -0,0 +1,106 @@
+from django.db import transaction
+from .models import MedicalDeclaration, LatestVitals
+
+VITAL_FIELDS = [
+    'heartbeat', 'temperature', 'breathing', 'spo2',
+    'blood_pressure_max', 'blood_pressure_min',
+]
+
+SYMPTOM_FIELDS = ['main_symptoms', 'extra_symptoms', 'other_symptoms']
+
+def update_latest_vitals(medical_declaration):
+    """
+    Run this function (in the same transaction) after creating a medical declaration.
+    Vitals which are not null and symptoms of this medical declaration become the latest ones of its user.
+    """
+
+    if not medical_declaration.user_id:
+        return
+
+    # lock row of this user, medical declarations of a user can be created at the same time
+    latest_vitals, _ = LatestVitals.objects.select_for_update().get_or_create(user_id=medical_declaration.user_id)
+    created_at = medical_declaration.created_at
+
+    updated_fields = []
+    for field in VITAL_FIELDS:
+        value = getattr(medical_declaration, field)
+        updated_at = getattr(latest_vitals, f'{field}_updated_at')
+        if value is not None and (updated_at is None or updated_at <= created_at):
+            setattr(latest_vitals, field, value)
+            setattr(latest_vitals, f'{field}_updated_at', created_at)
+            updated_fields += [field, f'{field}_updated_at']
+
+    if latest_vitals.symptoms_updated_at is None or latest_vitals.symptoms_updated_at <= created_at:
+        for field in SYMPTOM_FIELDS:
+            setattr(latest_vitals, field, getattr(medical_declaration, field))
+        latest_vitals.symptoms_updated_at = created_at
+        updated_fields += SYMPTOM_FIELDS + ['symptoms_updated_at']
+
+    if updated_fields:
+        latest_vitals.save(update_fields=updated_fields)
+
+def get_health_info(latest_vitals):
+    """
+    Return a dict {vital or symptoms: {'data': value, 'updated_at': time} or None}
+    """
+
+    health_info = {field: None for field in VITAL_FIELDS + SYMPTOM_FIELDS}
+    if not latest_vitals:
+        return health_info
+
+    for field in VITAL_FIELDS:
+        updated_at = getattr(latest_vitals, f'{field}_updated_at')
+        if updated_at is not None:
+            health_info[field] = {
+                'data': getattr(latest_vitals, field),
+                'updated_at': updated_at,
+            }
+
+    if latest_vitals.symptoms_updated_at is not None:
+        for field in SYMPTOM_FIELDS:
+            health_info[field] = {
+                'data': getattr(latest_vitals, field),
+                'updated_at': latest_vitals.symptoms_updated_at,
+            }
+
+    return health_info
+
+def rebuild_latest_vitals():
+    """
+    Recalculate all rows of LatestVitals from medical declarations,
+    one DISTINCT ON (user) query for each vital and one for symptoms.
+
+    Return number of rows created
+    """
+
+    dict_of_latest_vitals = dict()
+
+    def get_latest_vitals(user_id):
+        return dict_of_latest_vitals.setdefault(user_id, LatestVitals(user_id=user_id))
+
+    for field in VITAL_FIELDS:
+        query_set = MedicalDeclaration.objects.filter(
+            user__isnull=False,
+            **{f'{field}__isnull': False},
+        ).order_by('user', '-created_at').distinct('user').values('user', field, 'created_at')
+
+        for item in query_set.iterator():
+            latest_vitals = get_latest_vitals(item['user'])
+            setattr(latest_vitals, field, item[field])
+            setattr(latest_vitals, f'{field}_updated_at', item['created_at'])
+
+    query_set = MedicalDeclaration.objects.filter(
+        user__isnull=False,
+    ).order_by('user', '-created_at').distinct('user').values('user', *SYMPTOM_FIELDS, 'created_at')
+
+    for item in query_set.iterator():
+        latest_vitals = get_latest_vitals(item['user'])
+        for field in SYMPTOM_FIELDS:
+            setattr(latest_vitals, field, item[field])
+        latest_vitals.symptoms_updated_at = item['created_at']
+
+    with transaction.atomic():
+        LatestVitals.objects.all().delete()
+        LatestVitals.objects.bulk_create(dict_of_latest_vitals.values(), batch_size=1000)
+
+    return len(dict_of_latest_vitals)
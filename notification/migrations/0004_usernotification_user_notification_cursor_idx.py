@@ -0,0 +1,17 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0003_alter_usernotification_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usernotification',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='user_notification_cursor_idx'),
+        ),
+    ]
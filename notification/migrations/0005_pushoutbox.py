@@ -0,0 +1,33 @@
+# Generated by Django 3.2.7 on 2026-10-18 08:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0004_usernotification_user_notification_cursor_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('SENT', 'Sent'), ('DEAD', 'Dead')], default='WAITING', max_length=32)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='push_outbox_x_notification', to='notification.notification')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pushoutbox',
+            index=models.Index(condition=models.Q(('status', 'WAITING')), fields=['next_attempt_at'], name='push_outbox_due_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from user_account.models import CustomUser
-from utils.enums import NotificationType
+from utils.enums import NotificationType, PushOutboxStatus
 
 # Create your models here.
 
@@ -35,6 +37,10 @@ class UserNotification(models.Model):
 
     class Meta:
         unique_together = [['user', 'notification', ], ]
+        indexes = [
+            # cursor pagination of a user order by (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='user_notification_cursor_idx'),
+        ]
         
     user = models.ForeignKey(
         to=CustomUser,
@@ -61,3 +67,42 @@ class UserNotification(models.Model):
         null=True,
         blank=True,
     )
+
+class PushOutbox(models.Model):
+    """
+    A push of a notification, written in the same transaction as the notification,
+    sent to OneSignal by push_dispatcher.py
+    """
+
+    class Meta:
+        indexes = [
+            # waiting pushes that are due, sent and dead pushes are not indexed
+            models.Index(fields=['next_attempt_at'], condition=Q(status=PushOutboxStatus.WAITING), name='push_outbox_due_idx'),
+        ]
+
+    notification = models.ForeignKey(
+        to=Notification,
+        on_delete=models.CASCADE,
+        related_name='push_outbox_x_notification',
+        null=False,
+    )
+
+    # OneSignal payload without app_id
+    payload = models.JSONField(null=False)
+
+    status = models.CharField(
+        max_length=32,
+        choices=PushOutboxStatus.choices,
+        default=PushOutboxStatus.WAITING,
+        null=False,
+    )
+
+    attempts = models.IntegerField(null=False, default=0)
+
+    next_attempt_at = models.DateTimeField(null=False, default=timezone.now)
+
+    last_error = models.TextField(null=True, blank=True)
+
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, auto_now=False)
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import datetime
+import logging
+import requests
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from .models import PushOutbox
+from utils.enums import PushOutboxStatus
+
+logger = logging.getLogger(__name__)
+
+def enqueue_push(notification, payload):
+    """
+    Run this function in the transaction that creates notification (and its user notifications),
+    the push is sent by push_dispatcher.py only if this transaction is committed.
+    """
+
+    payload = {key: value for key, value in payload.items() if key != 'app_id'}
+    return PushOutbox.objects.create(notification=notification, payload=payload)
+
+def claim_pushes(batch_size, lease_seconds):
+    """
+    Take due waiting pushes, rows taken by other dispatchers are skipped.
+    next_attempt_at is moved to the end of the lease, so pushes of a dispatcher that dies are taken again after the lease.
+
+    Return list of PushOutbox
+    """
+
+    time_now = timezone.now()
+    with transaction.atomic():
+        pushes = list(PushOutbox.objects.select_for_update(skip_locked=True).filter(
+            status=PushOutboxStatus.WAITING,
+            next_attempt_at__lte=time_now,
+        ).order_by('next_attempt_at', 'id')[:batch_size])
+
+        for push in pushes:
+            push.attempts += 1
+            push.next_attempt_at = time_now + datetime.timedelta(seconds=lease_seconds)
+        PushOutbox.objects.bulk_update(pushes, ['attempts', 'next_attempt_at'])
+    return pushes
+
+def group_pushes(pushes, max_external_user_ids):
+    """
+    Pushes with the same content sent to external user ids are merged into one request,
+    with at most max_external_user_ids ids in each request,
+    ids of a push with more than max_external_user_ids ids are split into several requests.
+
+    Return list of (payload, list of PushOutbox)
+    """
+
+    groups = dict()
+    for push in pushes:
+        if 'include_external_user_ids' in push.payload:
+            key = json.dumps({key: value for key, value in push.payload.items() if key != 'include_external_user_ids'}, sort_keys=True)
+        else:
+            key = f'push_{push.id}'
+        groups.setdefault(key, []).append(push)
+
+    return_list = []
+    for group in groups.values():
+        batch = []
+        external_user_ids = []
+        for push in group:
+            push_external_user_ids = push.payload.get('include_external_user_ids', [])
+            for start in range(0, max(len(push_external_user_ids), 1), max_external_user_ids):
+                part_external_user_ids = push_external_user_ids[start:start + max_external_user_ids]
+                if batch and len(external_user_ids) + len(part_external_user_ids) > max_external_user_ids:
+                    return_list += [({**batch[0].payload, 'include_external_user_ids': external_user_ids}, batch)]
+                    batch = []
+                    external_user_ids = []
+                batch += [push]
+                external_user_ids = external_user_ids + part_external_user_ids
+        if 'include_external_user_ids' in batch[0].payload:
+            return_list += [({**batch[0].payload, 'include_external_user_ids': external_user_ids}, batch)]
+        else:
+            return_list += [(batch[0].payload, batch)]
+    return return_list
+
+def send_push(payload, timeout_seconds):
+    """Send a payload to the push endpoint (ONE_SIGNAL_NOTIFICATION_URL, can be a local stub server), raise an exception if it fails"""
+
+    header = {
+        'Content-Type': 'application/json; charset=utf-8',
+        'Authorization': 'Bearer ' + str(settings.ONE_SIGNAL_REST_API_KEY),
+    }
+    payload = {
+        'app_id': settings.ONE_SIGNAL_APP_ID,
+        **payload,
+    }
+    response = requests.post(settings.ONE_SIGNAL_NOTIFICATION_URL, headers=header, data=json.dumps(payload), timeout=timeout_seconds)
+    response.raise_for_status()
+
+def dispatch_pushes():
+    """
+    Send one batch of due pushes.
+    A failed push is tried again after PUSH_RETRY_SECONDS * 2^(attempts - 1) seconds,
+    after PUSH_MAX_ATTEMPTS attempts it is dead and not tried any more.
+    A push split into several requests is sent when all of its requests are sent,
+    if some of them fail, only external user ids of failed requests are tried again.
+
+    Return number of claimed pushes
+    """
+
+    batch_size = int(os.environ.get('PUSH_BATCH_SIZE', 100))
+    lease_seconds = int(os.environ.get('PUSH_LEASE_SECONDS', 300))
+    timeout_seconds = int(os.environ.get('PUSH_TIMEOUT_SECONDS', 10))
+    retry_seconds = int(os.environ.get('PUSH_RETRY_SECONDS', 30))
+    max_retry_seconds = int(os.environ.get('PUSH_MAX_RETRY_SECONDS', 3600))
+    max_attempts = int(os.environ.get('PUSH_MAX_ATTEMPTS', 8))
+    max_external_user_ids = int(os.environ.get('PUSH_MAX_EXTERNAL_USER_IDS', 2000))
+
+    pushes = claim_pushes(batch_size, lease_seconds)
+    requests_of_pushes = group_pushes(pushes, max_external_user_ids)
+
+    dict_of_num_request = dict()
+    for payload, batch in requests_of_pushes:
+        for push in batch:
+            dict_of_num_request[push.id] = dict_of_num_request.get(push.id, 0) + 1
+    dict_of_error = dict()
+    dict_of_failed_external_user_ids = dict()
+
+    for payload, batch in requests_of_pushes:
+        try:
+            send_push(payload, timeout_seconds)
+        except Exception as exception:
+            logger.warning('Push of outbox %s failed: %s', [push.id for push in batch], exception)
+            external_user_ids = set(payload.get('include_external_user_ids', []))
+            for push in batch:
+                dict_of_error[push.id] = str(exception)
+                dict_of_failed_external_user_ids.setdefault(push.id, []).extend([
+                    external_user_id for external_user_id in push.payload.get('include_external_user_ids', [])
+                    if external_user_id in external_user_ids
+                ])
+
+        # pushes whose requests are all done are saved now
+        time_now = timezone.now()
+        done_pushes = []
+        for push in batch:
+            dict_of_num_request[push.id] -= 1
+            if dict_of_num_request[push.id]:
+                continue
+            if push.id not in dict_of_error:
+                push.status = PushOutboxStatus.SENT
+                push.sent_at = time_now
+                push.last_error = None
+            else:
+                push.last_error = dict_of_error[push.id]
+                if 'include_external_user_ids' in push.payload:
+                    push.payload = {**push.payload, 'include_external_user_ids': dict_of_failed_external_user_ids[push.id]}
+                if push.attempts >= max_attempts:
+                    push.status = PushOutboxStatus.DEAD
+                else:
+                    delay = min(retry_seconds * 2 ** (push.attempts - 1), max_retry_seconds)
+                    push.next_attempt_at = time_now + datetime.timedelta(seconds=delay)
+            done_pushes += [push]
+        PushOutbox.objects.bulk_update(done_pushes, ['status', 'sent_at', 'last_error', 'next_attempt_at', 'payload'])
+
+    return len(pushes)
+
+def delete_sent_pushes(retention_days, batch_size=1000):
+    """
+    Delete pushes sent more than retention_days days ago, batch by batch (short transactions),
+    waiting and dead pushes are kept.
+
+    Return number of deleted pushes
+    """
+
+    time_to_keep = timezone.now() - datetime.timedelta(days=retention_days)
+    num_deleted = 0
+    while True:
+        ids = list(PushOutbox.objects.filter(
+            status=PushOutboxStatus.SENT,
+            sent_at__lt=time_to_keep,
+        ).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return num_deleted
+        num_deleted += PushOutbox.objects.filter(id__in=ids).delete()[0]
+
+def run_push_dispatcher():
+    """
+    Send due pushes batch by batch, wait PUSH_POLL_SECONDS when there is no due push.
+    Every PUSH_CLEANUP_SECONDS, pushes sent more than PUSH_RETENTION_DAYS days ago are deleted.
+    An error (database restarted, ...) is logged and the dispatcher keeps running.
+    """
+
+    poll_seconds = int(os.environ.get('PUSH_POLL_SECONDS', 2))
+    retention_days = int(os.environ.get('PUSH_RETENTION_DAYS', 7))
+    cleanup_seconds = int(os.environ.get('PUSH_CLEANUP_SECONDS', 3600))
+    last_cleanup = None
+    while True:
+        try:
+            if last_cleanup is None or time.monotonic() - last_cleanup >= cleanup_seconds:
+                delete_sent_pushes(retention_days)
+                last_cleanup = time.monotonic()
+            if not dispatch_pushes():
+                time.sleep(poll_seconds)
+        except Exception as exception:
+            logger.exception('Push dispatcher failed: %s', exception)
+            # connections broken by the error are closed, a new one is opened by the next query
+            close_old_connections()
+            time.sleep(poll_seconds)
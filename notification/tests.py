@@ -1,3 +1,82 @@
+import datetime
+from unittest import mock
 from django.test import TestCase
+from django.utils import timezone
+from . import outbox
+from .models import Notification, PushOutbox
+from .outbox import group_pushes, dispatch_pushes, delete_sent_pushes, run_push_dispatcher
+from utils.enums import PushOutboxStatus
 
 # Create your tests here.
+
+class PushOutboxTest(TestCase):
+
+    def setUp(self):
+        self.notification = Notification.objects.create(title='Thông báo', description='Nội dung')
+
+    def create_push(self, external_user_ids, **kwargs):
+        return PushOutbox.objects.create(
+            notification=self.notification,
+            payload={'headings': {'en': 'Thông báo'}, 'include_external_user_ids': external_user_ids},
+            **kwargs,
+        )
+
+    def test_push_with_many_external_user_ids_is_split(self):
+        push = self.create_push([str(index) for index in range(5)])
+        small_push = self.create_push(['5'])
+
+        requests = group_pushes([push, small_push], max_external_user_ids=2)
+
+        self.assertEqual(
+            [(payload['include_external_user_ids'], [push.id for push in batch]) for payload, batch in requests],
+            [(['0', '1'], [push.id]), (['2', '3'], [push.id]), (['4', '5'], [push.id, small_push.id])],
+        )
+
+    @mock.patch.dict('os.environ', {'PUSH_MAX_EXTERNAL_USER_IDS': '2'})
+    def test_only_failed_part_of_split_push_is_tried_again(self):
+        push = self.create_push(['0', '1', '2', '3'])
+
+        def send_push(payload, timeout_seconds):
+            if '2' in payload['include_external_user_ids']:
+                raise Exception('Service unavailable')
+
+        with mock.patch.object(outbox, 'send_push', side_effect=send_push), self.assertLogs(outbox.logger, 'WARNING'):
+            self.assertEqual(dispatch_pushes(), 1)
+
+        push.refresh_from_db()
+        self.assertEqual(push.status, PushOutboxStatus.WAITING)
+        self.assertEqual(push.last_error, 'Service unavailable')
+        self.assertEqual(push.payload['include_external_user_ids'], ['2', '3'])
+
+        PushOutbox.objects.filter(id=push.id).update(next_attempt_at=timezone.now())
+        with mock.patch.object(outbox, 'send_push') as send_push:
+            dispatch_pushes()
+        send_push.assert_called_once()
+        push.refresh_from_db()
+        self.assertEqual(push.status, PushOutboxStatus.SENT)
+
+    def test_only_old_sent_pushes_are_deleted(self):
+        time_now = timezone.now()
+        old_sent_push = self.create_push(['0'], status=PushOutboxStatus.SENT, sent_at=time_now - datetime.timedelta(days=8))
+        new_sent_push = self.create_push(['1'], status=PushOutboxStatus.SENT, sent_at=time_now)
+        dead_push = self.create_push(['2'], status=PushOutboxStatus.DEAD)
+        waiting_push = self.create_push(['3'])
+
+        self.assertEqual(delete_sent_pushes(retention_days=7, batch_size=1), 1)
+        self.assertFalse(PushOutbox.objects.filter(id=old_sent_push.id).exists())
+        self.assertEqual(
+            set(PushOutbox.objects.values_list('id', flat=True)),
+            {new_sent_push.id, dead_push.id, waiting_push.id},
+        )
+
+    @mock.patch.dict('os.environ', {'PUSH_POLL_SECONDS': '0'})
+    def test_dispatcher_keeps_running_after_error(self):
+        # the dispatcher is stopped by an exception that is not an Exception
+        with mock.patch.object(outbox, 'dispatch_pushes', side_effect=[Exception('Connection closed'), 1, KeyboardInterrupt]) as dispatch, \
+            mock.patch.object(outbox, 'close_old_connections') as close_old_connections, \
+            self.assertLogs(outbox.logger, 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                run_push_dispatcher()
+
+        self.assertEqual(dispatch.call_count, 3)
+        close_old_connections.assert_called_once()
@@ -1,13 +1,12 @@
-import requests
-import json
-from django.conf import settings
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import action
 from rest_framework import permissions
-from utils.views import AbstractView, paginate_data, query_debugger
+from utils.views import AbstractView, paginate_data, paginate_data_by_cursor, query_debugger
 from utils.enums import RoleName
 from utils import exceptions
 from .models import Notification, UserNotification, CustomUser
+from .outbox import enqueue_push
 from .validators.notification import NotificationValidator
 from .validators.user_notification import UserNotificationValidator
 from .serializers import NotificationSerializer, UserNotificationSerializer, UserNotificationSerializerForFilter, NotificationFullSerializer
@@ -26,21 +25,17 @@ def create_and_send_noti_to_list_user(title, description, created_by, receive_us
             created_by=created_by,
         )]
     if list_user_notification:
-        notification.save()
-        UserNotification.objects.bulk_create(list_user_notification)
-
-        header = {
-            'Content-Type': 'application/json; charset=utf-8',
-            'Authorization': 'Bearer ' + settings.ONE_SIGNAL_REST_API_KEY,
-        }
         payload = {
-            'app_id': settings.ONE_SIGNAL_APP_ID,
             'headings': {"en": notification.title},
             'contents': {"en": notification.description},
             'include_external_user_ids': [user.code for user in receive_user_list],
             'channel_for_external_user_ids': 'push',
         }
-        requests.post(settings.ONE_SIGNAL_NOTIFICATION_URL, headers=header, data=json.dumps(payload))
+        with transaction.atomic():
+            notification.save()
+            UserNotification.objects.bulk_create(list_user_notification)
+            # sent by push_dispatcher.py after commit
+            enqueue_push(notification, payload)
 
 class NotificationAPI (AbstractView):
     
@@ -168,133 +163,128 @@ class NotificationAPI (AbstractView):
             'type', 'role',
         ]
 
-        header = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": "Bearer " + settings.ONE_SIGNAL_REST_API_KEY,
-        }
-
         payload = {
-            "app_id": settings.ONE_SIGNAL_APP_ID,
             "headings": "",
             "contents": "",
         }
 
         try:
-            user = request.user
+            with transaction.atomic():
+                user = request.user
 
-            request_extractor = self.request_handler.handle(request)
-            receive_fields = request_extractor.data
-            accepted_fields_for_notification = dict()
-            accepted_fields_for_user_notification = dict()
+                request_extractor = self.request_handler.handle(request)
+                receive_fields = request_extractor.data
+                accepted_fields_for_notification = dict()
+                accepted_fields_for_user_notification = dict()
 
-            for key in receive_fields:
-                if key in accept_fields_for_notification:
-                    accepted_fields_for_notification[key] = receive_fields[key]
-                elif key in accept_fields_for_user_notification:
-                    accepted_fields_for_user_notification[key] = receive_fields[key]
+                for key in receive_fields:
+                    if key in accept_fields_for_notification:
+                        accepted_fields_for_notification[key] = receive_fields[key]
+                    elif key in accept_fields_for_user_notification:
+                        accepted_fields_for_user_notification[key] = receive_fields[key]
 
-            validator = NotificationValidator(**accepted_fields_for_notification)
+                validator = NotificationValidator(**accepted_fields_for_notification)
             
-            validator.is_missing_fields(require_fields_for_notification)
-            validator.is_valid_fields(accepted_fields_for_notification)
-            list_to_create = accepted_fields_for_notification.keys()
-            dict_to_create = validator.get_data(list_to_create)
-            notification = Notification(**dict_to_create)
-            notification.created_by = user
-            notification.save()
+                validator.is_missing_fields(require_fields_for_notification)
+                validator.is_valid_fields(accepted_fields_for_notification)
+                list_to_create = accepted_fields_for_notification.keys()
+                dict_to_create = validator.get_data(list_to_create)
+                notification = Notification(**dict_to_create)
+                notification.created_by = user
+                notification.save()
             
-            if 'receiver_type' in accepted_fields_for_user_notification:
-                accepted_fields_for_user_notification['type'] = accepted_fields_for_user_notification.pop('receiver_type')
-            validator = UserNotificationValidator(**accepted_fields_for_user_notification)
+                if 'receiver_type' in accepted_fields_for_user_notification:
+                    accepted_fields_for_user_notification['type'] = accepted_fields_for_user_notification.pop('receiver_type')
+                validator = UserNotificationValidator(**accepted_fields_for_user_notification)
             
-            validator.is_missing_fields(require_fields_for_user_notification)
-            get_notification = notification
-            get_type = validator.is_validate_type()
-            get_role = validator.is_validate_role()
-
-            payload["headings"] = {"en": get_notification.title}
-            payload["contents"] = {"en": get_notification.description}
-            if notification.image != None:
-                payload["big_picture"] = notification.image
-            if get_type == 0:
-                if user.role.name == RoleName.MEMBER:
-                    raise exceptions.AuthenticationException()
-                all_users = CustomUser.objects.filter(role__id=get_role) if get_role > 0 else CustomUser.objects.all()
-                list_user_notification = []
-                for user_item in all_users:
-                    validator.is_user_notification_exist_with_args(user_item, get_notification)
-                    list_user_notification += [UserNotification(
-                        notification=get_notification,
-                        user=user_item,
-                        created_by=user,
-                    )]
-                user_notification = UserNotification.objects.bulk_create(list_user_notification)
-
-                if get_role == 0:
-                    payload.update({"included_segments": ["Subscribed Users"]})
-                else:
-                    payload.update({
-                        "filters": [
-                            {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
-                        ]
-                    })
-
-            elif get_type == 1:
-                if user.role.name == RoleName.MEMBER:
-                    raise exceptions.AuthenticationException()
-                validator.is_missing_fields(['quarantine_ward'])
-                get_quarantine_ward = validator.is_validate_quarantine_ward()
-                all_users = CustomUser.objects.filter(
-                    quarantine_ward=get_quarantine_ward,
-                    role__id=get_role
-                ) if get_role > 0 else CustomUser.objects.filter(quarantine_ward=get_quarantine_ward)
-
-                list_user_notification = []
-                for user_item in all_users:
-                    validator.is_user_notification_exist_with_args(user_item, get_notification)
-                    list_user_notification += [UserNotification(
-                        notification=get_notification,
-                        user=user_item,
-                        created_by=user,
-                    )]
-                user_notification = UserNotification.objects.bulk_create(list_user_notification)
-                if get_role == 0:
-                    payload.update({
-                        "filters": [
-                            {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)}
-                        ]
-                    })
-                else:
-                    payload.update({
-                        "filters": [
-                            {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)},
-                            {"operator": "AND"},
-                            {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
-                        ]
-                    })
+                validator.is_missing_fields(require_fields_for_user_notification)
+                get_notification = notification
+                get_type = validator.is_validate_type()
+                get_role = validator.is_validate_role()
+
+                payload["headings"] = {"en": get_notification.title}
+                payload["contents"] = {"en": get_notification.description}
+                if notification.image != None:
+                    payload["big_picture"] = notification.image
+                if get_type == 0:
+                    if user.role.name == RoleName.MEMBER:
+                        raise exceptions.AuthenticationException()
+                    all_users = CustomUser.objects.filter(role__id=get_role) if get_role > 0 else CustomUser.objects.all()
+                    list_user_notification = []
+                    for user_item in all_users:
+                        validator.is_user_notification_exist_with_args(user_item, get_notification)
+                        list_user_notification += [UserNotification(
+                            notification=get_notification,
+                            user=user_item,
+                            created_by=user,
+                        )]
+                    user_notification = UserNotification.objects.bulk_create(list_user_notification)
+
+                    if get_role == 0:
+                        payload.update({"included_segments": ["Subscribed Users"]})
+                    else:
+                        payload.update({
+                            "filters": [
+                                {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
+                            ]
+                        })
+
+                elif get_type == 1:
+                    if user.role.name == RoleName.MEMBER:
+                        raise exceptions.AuthenticationException()
+                    validator.is_missing_fields(['quarantine_ward'])
+                    get_quarantine_ward = validator.is_validate_quarantine_ward()
+                    all_users = CustomUser.objects.filter(
+                        quarantine_ward=get_quarantine_ward,
+                        role__id=get_role
+                    ) if get_role > 0 else CustomUser.objects.filter(quarantine_ward=get_quarantine_ward)
+
+                    list_user_notification = []
+                    for user_item in all_users:
+                        validator.is_user_notification_exist_with_args(user_item, get_notification)
+                        list_user_notification += [UserNotification(
+                            notification=get_notification,
+                            user=user_item,
+                            created_by=user,
+                        )]
+                    user_notification = UserNotification.objects.bulk_create(list_user_notification)
+                    if get_role == 0:
+                        payload.update({
+                            "filters": [
+                                {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)}
+                            ]
+                        })
+                    else:
+                        payload.update({
+                            "filters": [
+                                {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)},
+                                {"operator": "AND"},
+                                {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
+                            ]
+                        })
 
-            else:
-                validator.is_missing_fields(['users'])
-                list_user_code = validator.is_validate_user_list()
-                all_users = CustomUser.objects.filter(code__in=list_user_code)
-                list_user_notification = []
-                for user_item in all_users:
-                    validator.is_user_notification_exist_with_args(user_item, get_notification)
-                    list_user_notification += [UserNotification(
-                        notification=get_notification,
-                        user=user_item,
-                        created_by=user,
-                    )]
-                user_notification = UserNotification.objects.bulk_create(list_user_notification)
-
-                payload.update(
-                    {
-                        "include_external_user_ids": list_user_code,
-                        "channel_for_external_user_ids": "push",
-                    }
-                )
-
-            req = requests.post(settings.ONE_SIGNAL_NOTIFICATION_URL, headers=header, data=json.dumps(payload))
+                else:
+                    validator.is_missing_fields(['users'])
+                    list_user_code = validator.is_validate_user_list()
+                    all_users = CustomUser.objects.filter(code__in=list_user_code)
+                    list_user_notification = []
+                    for user_item in all_users:
+                        validator.is_user_notification_exist_with_args(user_item, get_notification)
+                        list_user_notification += [UserNotification(
+                            notification=get_notification,
+                            user=user_item,
+                            created_by=user,
+                        )]
+                    user_notification = UserNotification.objects.bulk_create(list_user_notification)
+
+                    payload.update(
+                        {
+                            "include_external_user_ids": list_user_code,
+                            "channel_for_external_user_ids": "push",
+                        }
+                    )
+
+                enqueue_push(get_notification, payload)
 
             serializer = NotificationFullSerializer(notification, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -439,9 +429,7 @@ class NotificationAPI (AbstractView):
 
             query_set = query_set.select_related()
 
-            serializer = NotificationSerializer(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            paginated_data = paginate_data(request, query_set, NotificationSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -519,121 +507,116 @@ class UserNotificationAPI (AbstractView):
             'notification', 'type', 'role',
         ]
 
-        header = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": "Bearer " + settings.ONE_SIGNAL_REST_API_KEY,
-        }
-
         payload = {
-            "app_id": settings.ONE_SIGNAL_APP_ID,
             "headings": "",
             "contents": "",
         }
 
         try:
-            user = request.user
+            with transaction.atomic():
+                user = request.user
 
-            request_extractor = self.request_handler.handle(request)
-            receive_fields = request_extractor.data
-            accepted_fields = dict()
+                request_extractor = self.request_handler.handle(request)
+                receive_fields = request_extractor.data
+                accepted_fields = dict()
 
-            for key in receive_fields:
-                if key in accept_fields:
-                    accepted_fields[key] = receive_fields[key]
+                for key in receive_fields:
+                    if key in accept_fields:
+                        accepted_fields[key] = receive_fields[key]
 
-            validator = UserNotificationValidator(**accepted_fields)
+                validator = UserNotificationValidator(**accepted_fields)
             
-            validator.is_missing_fields(require_fields)
-            get_notification = validator.is_validate_notification()
-            get_type = validator.is_validate_type()
-            get_role = validator.is_validate_role()
-
-            payload["headings"] = {"en": get_notification.title}
-            payload["contents"] = {"en": get_notification.description}
-            if get_notification.image != None:
-                payload["big_picture"] = get_notification.image
-            if get_type == 0:
-                if user.role.name == RoleName.MEMBER:
-                    raise exceptions.AuthenticationException()
-                all_users = CustomUser.objects.filter(role__id=get_role) if get_role > 0 else CustomUser.objects.all()
-                list_user_notification = []
-                for user_item in all_users:
-                    validator.is_user_notification_exist_with_args(user_item, get_notification)
-                    list_user_notification += [UserNotification(
-                        notification=get_notification,
-                        user=user_item,
-                        created_by=user,
-                    )]
-                user_notification = UserNotification.objects.bulk_create(list_user_notification)
-                serializer = UserNotificationSerializer(user_notification, many=True)
-                if get_role == 0:
-                    payload.update({"included_segments": ["Subscribed Users"]})
-                else:
-                    payload.update({
-                        "filters": [
-                            {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
-                        ]
-                    })
-
-            elif get_type == 1:
-                if user.role.name == RoleName.MEMBER:
-                    raise exceptions.AuthenticationException()
-                validator.is_missing_fields(['quarantine_ward'])
-                get_quarantine_ward = validator.is_validate_quarantine_ward()
-                all_users = CustomUser.objects.filter(
-                    quarantine_ward=get_quarantine_ward,
-                    role__id=get_role
-                ) if get_role > 0 else CustomUser.objects.filter(quarantine_ward=get_quarantine_ward)
-
-                list_user_notification = []
-                for user_item in all_users:
-                    validator.is_user_notification_exist_with_args(user_item, get_notification)
-                    list_user_notification += [UserNotification(
-                        notification=get_notification,
-                        user=user_item,
-                        created_by=user,
-                    )]
-                user_notification = UserNotification.objects.bulk_create(list_user_notification)
-                serializer = UserNotificationSerializer(user_notification, many=True)
-                if get_role == 0:
-                    payload.update({
-                        "filters": [
-                            {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)}
-                        ]
-                    })
+                validator.is_missing_fields(require_fields)
+                get_notification = validator.is_validate_notification()
+                get_type = validator.is_validate_type()
+                get_role = validator.is_validate_role()
+
+                payload["headings"] = {"en": get_notification.title}
+                payload["contents"] = {"en": get_notification.description}
+                if get_notification.image != None:
+                    payload["big_picture"] = get_notification.image
+                if get_type == 0:
+                    if user.role.name == RoleName.MEMBER:
+                        raise exceptions.AuthenticationException()
+                    all_users = CustomUser.objects.filter(role__id=get_role) if get_role > 0 else CustomUser.objects.all()
+                    list_user_notification = []
+                    for user_item in all_users:
+                        validator.is_user_notification_exist_with_args(user_item, get_notification)
+                        list_user_notification += [UserNotification(
+                            notification=get_notification,
+                            user=user_item,
+                            created_by=user,
+                        )]
+                    user_notification = UserNotification.objects.bulk_create(list_user_notification)
+                    serializer = UserNotificationSerializer(user_notification, many=True)
+                    if get_role == 0:
+                        payload.update({"included_segments": ["Subscribed Users"]})
+                    else:
+                        payload.update({
+                            "filters": [
+                                {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
+                            ]
+                        })
+
+                elif get_type == 1:
+                    if user.role.name == RoleName.MEMBER:
+                        raise exceptions.AuthenticationException()
+                    validator.is_missing_fields(['quarantine_ward'])
+                    get_quarantine_ward = validator.is_validate_quarantine_ward()
+                    all_users = CustomUser.objects.filter(
+                        quarantine_ward=get_quarantine_ward,
+                        role__id=get_role
+                    ) if get_role > 0 else CustomUser.objects.filter(quarantine_ward=get_quarantine_ward)
+
+                    list_user_notification = []
+                    for user_item in all_users:
+                        validator.is_user_notification_exist_with_args(user_item, get_notification)
+                        list_user_notification += [UserNotification(
+                            notification=get_notification,
+                            user=user_item,
+                            created_by=user,
+                        )]
+                    user_notification = UserNotification.objects.bulk_create(list_user_notification)
+                    serializer = UserNotificationSerializer(user_notification, many=True)
+                    if get_role == 0:
+                        payload.update({
+                            "filters": [
+                                {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)}
+                            ]
+                        })
+                    else:
+                        payload.update({
+                            "filters": [
+                                {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)},
+                                {"operator": "AND"},
+                                {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
+                            ]
+                        })
+
                 else:
-                    payload.update({
-                        "filters": [
-                            {"field": "tag", "key": "quarantine_ward_id", "relation": "=", "value": str(get_quarantine_ward.id)},
-                            {"operator": "AND"},
-                            {"field": "tag", "key": "role", "relation": "=", "value": str(get_role)}
-                        ]
-                    })
+                    validator.is_missing_fields(['users'])
+                    list_user_code = validator.is_validate_user_list()
+                    all_users = CustomUser.objects.filter(code__in=list_user_code)
+                    list_user_notification = []
+                    for user_item in all_users:
+                        validator.is_user_notification_exist_with_args(user_item, get_notification)
+                        list_user_notification += [UserNotification(
+                            notification=get_notification,
+                            user=user_item,
+                            created_by=user,
+                        )]
+                    user_notification = UserNotification.objects.bulk_create(list_user_notification)
+                    serializer = UserNotificationSerializer(user_notification, many=True)
+
+                    payload.update(
+                        {
+                            "include_external_user_ids": list_user_code,
+                            "channel_for_external_user_ids": "push",
+                        }
+                    )
+
+                enqueue_push(get_notification, payload)
 
-            else:
-                validator.is_missing_fields(['users'])
-                list_user_code = validator.is_validate_user_list()
-                all_users = CustomUser.objects.filter(code__in=list_user_code)
-                list_user_notification = []
-                for user_item in all_users:
-                    validator.is_user_notification_exist_with_args(user_item, get_notification)
-                    list_user_notification += [UserNotification(
-                        notification=get_notification,
-                        user=user_item,
-                        created_by=user,
-                    )]
-                user_notification = UserNotification.objects.bulk_create(list_user_notification)
-                serializer = UserNotificationSerializer(user_notification, many=True)
-
-                payload.update(
-                    {
-                        "include_external_user_ids": list_user_code,
-                        "channel_for_external_user_ids": "push",
-                    }
-                )
-
-            req = requests.post(settings.ONE_SIGNAL_NOTIFICATION_URL, headers=header, data=json.dumps(payload))
-            
             return self.response_handler.handle(data=serializer.data)
         except Exception as exception:
             return self.exception_handler.handle(exception)
@@ -737,6 +720,7 @@ class UserNotificationAPI (AbstractView):
             - created_at_min: String vd:'2000-01-26T01:23:45.123456Z'
             - page: int
             - page_size: int
+            - cursor: String ('' for first page, nextCursor for next page, order by created_at instead of page)
             - user (id)
         """
 
@@ -774,9 +758,10 @@ class UserNotificationAPI (AbstractView):
 
             query_set = query_set.select_related()
 
-            serializer = UserNotificationSerializerForFilter(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            if 'cursor' in request.data:
+                paginated_data = paginate_data_by_cursor(request, query_set, UserNotificationSerializerForFilter)
+            else:
+                paginated_data = paginate_data(request, query_set, UserNotificationSerializerForFilter)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -0,0 +1,13 @@
+#========================================
+# Push Notifications Dispatcher
+#========================================
+
+import os
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "qlkcl.settings")
+
+import django
+django.setup()
+
+from notification.outbox import run_push_dispatcher
+
+run_push_dispatcher()
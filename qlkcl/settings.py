@@ -194,6 +194,9 @@ else:
         }
     }
 
+# Test databases are created from models, see utils/test_runner.py
+TEST_RUNNER = 'utils.test_runner.TestRunner'
+
 # Change user model
 AUTH_USER_MODEL = 'user_account.CustomUser'
 
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quarantine_ward', '0006_auto_20220424_1159'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WardDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('num_in', models.IntegerField(default=0)),
+                ('num_complete', models.IntegerField(default=0)),
+                ('num_hospitalize', models.IntegerField(default=0)),
+                ('quarantine_ward', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ward_daily_stats_x_quarantine_ward', to='quarantine_ward.quarantineward')),
+            ],
+            options={
+                'unique_together': {('quarantine_ward', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+def forwards_func(apps, schema_editor):
+    # fill num_current_member of rooms, floors, buildings, quarantine wards that exist before this migration
+    db_alias = schema_editor.connection.alias
+    member_path = 'member_x_quarantine_room'
+    room_path = f'quarantine_room_x_quarantine_floor__{member_path}'
+    floor_path = f'quarantine_floor_x_quarantine_building__{room_path}'
+    building_path = f'quarantine_building_x_quarantine_ward__{floor_path}'
+    for model_name, path in [
+        ('QuarantineRoom', member_path),
+        ('QuarantineFloor', room_path),
+        ('QuarantineBuilding', floor_path),
+        ('QuarantineWard', building_path),
+    ]:
+        model = apps.get_model('quarantine_ward', model_name)
+        dict_of_ids = dict()
+        for row in model.objects.using(db_alias).annotate(count=Count(path)).filter(count__gt=0).values('id', 'count'):
+            dict_of_ids.setdefault(row['count'], []).append(row['id'])
+        for count, ids in dict_of_ids.items():
+            model.objects.using(db_alias).filter(id__in=ids).update(num_current_member=count)
+
+def reverse_func(apps, schema_editor):
+    ...
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quarantine_ward', '0007_warddailystats'),
+        ('user_account', '0048_alter_member_label'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quarantinebuilding',
+            name='num_current_member',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quarantinefloor',
+            name='num_current_member',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quarantineroom',
+            name='num_current_member',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quarantineward',
+            name='num_current_member',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+    ]
@@ -3,10 +3,13 @@ from address.models import Country, City, District, Ward
 from user_account.models import CustomUser
 from form.models import Pandemic
 from utils.enums import QuarantineWardStatus, QuarantineWardType
+from utils.models import AbstractCounterModel
 
 # Create your models here.
 
-class QuarantineWard(models.Model):
+class QuarantineWard(AbstractCounterModel):
+
+    counter_fields = ['num_current_member']
 
     email = models.EmailField(
         verbose_name='email address',
@@ -113,7 +116,12 @@ class QuarantineWard(models.Model):
         blank=True,
     )
 
-class QuarantineBuilding(models.Model):
+    # number of members in all rooms of this quarantine ward, maintained by user_account.counters
+    num_current_member = models.IntegerField(default=0, null=False)
+
+class QuarantineBuilding(AbstractCounterModel):
+
+    counter_fields = ['num_current_member']
 
     class Meta:
         unique_together = [['name', 'quarantine_ward', ], ]
@@ -127,7 +135,12 @@ class QuarantineBuilding(models.Model):
         null=False,
     )
 
-class QuarantineFloor(models.Model):
+    # number of members in all rooms of this building, maintained by user_account.counters
+    num_current_member = models.IntegerField(default=0, null=False)
+
+class QuarantineFloor(AbstractCounterModel):
+
+    counter_fields = ['num_current_member']
 
     class Meta:
         unique_together = [['name', 'quarantine_building', ], ]
@@ -141,7 +154,12 @@ class QuarantineFloor(models.Model):
         null=False,
     )
 
-class QuarantineRoom(models.Model):
+    # number of members in all rooms of this floor, maintained by user_account.counters
+    num_current_member = models.IntegerField(default=0, null=False)
+
+class QuarantineRoom(AbstractCounterModel):
+
+    counter_fields = ['num_current_member']
 
     class Meta:
         unique_together = [['name', 'quarantine_floor', ], ]
@@ -157,5 +175,32 @@ class QuarantineRoom(models.Model):
         null=False,
     )
 
+    # number of members in this room, maintained by user_account.counters
+    num_current_member = models.IntegerField(default=0, null=False)
+
     def __str__(self) -> str:
         return self.name
+
+class WardDailyStats(models.Model):
+    """
+    Number of members in / complete / hospitalize of a quarantine ward in a day (Asia/Saigon),
+    maintained when members are accepted, finished, hospitalized or change quarantine ward.
+    """
+
+    class Meta:
+        unique_together = [['quarantine_ward', 'day', ], ]
+
+    quarantine_ward = models.ForeignKey(
+        to=QuarantineWard,
+        on_delete=models.CASCADE,
+        related_name='ward_daily_stats_x_quarantine_ward',
+        null=False,
+    )
+
+    day = models.DateField(null=False)
+
+    num_in = models.IntegerField(default=0, null=False)
+
+    num_complete = models.IntegerField(default=0, null=False)
+
+    num_hospitalize = models.IntegerField(default=0, null=False)
@@ -0,0 +1,348 @@
+import datetime
+from django.db.models import Count, Sum, Min, Q, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import QuarantineWard, QuarantineBuilding, QuarantineFloor, QuarantineRoom
+from user_account.models import Staff
+from utils.enums import MemberLabel, Gender, CustomUserStatus
+
+class RoomOccupancy:
+    """
+    Occupancy of a room (members in this room) at the moment it is loaded,
+    can be updated in memory when a member is set to this room.
+    """
+
+    def __init__(self, room, num_current_member=0, num_positive=0, num_not_positive=0,
+            label_counts=None, gender_counts=None, sum_of_vaccine_doses=0, oldest_quarantined_at=None):
+        self.room = room
+        self.num_current_member = num_current_member
+        self.num_positive = num_positive
+        self.num_not_positive = num_not_positive
+        self.label_counts = label_counts or dict()
+        self.gender_counts = gender_counts or dict()
+        self.sum_of_vaccine_doses = sum_of_vaccine_doses or 0
+        self.oldest_quarantined_at = oldest_quarantined_at
+
+    def is_full(self):
+        return self.num_current_member >= self.room.capacity
+
+    def is_empty(self):
+        return self.num_current_member == 0
+
+    def is_close(self, num_day_to_close_room, time_now=None):
+        # All members in this room must have quarantined at >= 'num_day_to_close_room' day ago.
+        if not self.oldest_quarantined_at:
+            return False
+        if not time_now:
+            time_now = timezone.now()
+        return self.oldest_quarantined_at < time_now - datetime.timedelta(days=num_day_to_close_room)
+
+    def count_members_same_label(self, label):
+        if not label:
+            return 0
+        return self.label_counts.get(label, 0)
+
+    def count_average_number_of_vaccine_doses(self):
+        if not self.num_current_member or not self.sum_of_vaccine_doses:
+            # Nobody in room or 0
+            return 0
+        return self.sum_of_vaccine_doses / self.num_current_member
+
+    def count_members_same_gender(self, gender):
+        if not gender:
+            return 0
+        return self.gender_counts.get(gender, 0)
+
+    def count_available_slot(self):
+        return self.room.capacity - self.num_current_member
+
+    def add_member(self, label, gender, positive_test_now, number_of_vaccine_doses, quarantined_at):
+        """
+        Update this occupancy after a member is set to this room
+        """
+
+        self.num_current_member += 1
+        if positive_test_now == True:
+            self.num_positive += 1
+        else:
+            self.num_not_positive += 1
+        if label:
+            self.label_counts[label] = self.label_counts.get(label, 0) + 1
+        if gender:
+            self.gender_counts[gender] = self.gender_counts.get(gender, 0) + 1
+        self.sum_of_vaccine_doses += number_of_vaccine_doses or 0
+        if quarantined_at and (not self.oldest_quarantined_at or quarantined_at < self.oldest_quarantined_at):
+            self.oldest_quarantined_at = quarantined_at
+
+def get_room_occupancies(quarantine_ward, not_quarantine_room_ids=None):
+    """
+    Load occupancy of all rooms in quarantine_ward (except not_quarantine_room_ids) in one query.
+
+    Return a list of RoomOccupancy, ordered by room id
+    """
+
+    member_path = 'member_x_quarantine_room'
+
+    # num_current_member is the counter column of room
+    annotations = {
+        'num_positive': Count(member_path, filter=Q(**{f'{member_path}__positive_test_now': True})),
+        'num_not_positive': Count(member_path, filter=(
+            Q(**{f'{member_path}__positive_test_now': False}) |
+            Q(**{f'{member_path}__positive_test_now__isnull': True})
+        )),
+        'sum_of_vaccine_doses': Sum(f'{member_path}__number_of_vaccine_doses'),
+        'oldest_quarantined_at': Min(f'{member_path}__quarantined_at'),
+    }
+    for label in MemberLabel.values:
+        annotations[f'num_label_{label}'] = Count(member_path, filter=Q(**{f'{member_path}__label': label}))
+    for gender in Gender.values:
+        annotations[f'num_gender_{gender}'] = Count(member_path, filter=Q(**{f'{member_path}__custom_user__gender': gender}))
+
+    rooms = QuarantineRoom.objects.filter(quarantine_floor__quarantine_building__quarantine_ward=quarantine_ward)
+    if not_quarantine_room_ids:
+        rooms = rooms.exclude(id__in=not_quarantine_room_ids)
+    rooms = rooms.annotate(**annotations).order_by('id')
+
+    return [
+        RoomOccupancy(
+            room=room,
+            num_current_member=room.num_current_member,
+            num_positive=room.num_positive,
+            num_not_positive=room.num_not_positive,
+            label_counts={label: getattr(room, f'num_label_{label}') for label in MemberLabel.values},
+            gender_counts={gender: getattr(room, f'num_gender_{gender}') for gender in Gender.values},
+            sum_of_vaccine_doses=room.sum_of_vaccine_doses,
+            oldest_quarantined_at=room.oldest_quarantined_at,
+        ) for room in rooms
+    ]
+
+def choose_suitable_room(room_occupancies, gender, label, positive_test_now, number_of_vaccine_doses, num_day_to_close_room, time_now=None):
+    """
+    Choose the most suitable room in room_occupancies for a member.
+
+    Return a dict {'room_occupancy': RoomOccupancy or None, 'warning': String or None}
+    """
+
+    return_dict = dict()
+    return_dict['room_occupancy'] = None
+    return_dict['warning'] = None
+
+    if not time_now:
+        time_now = timezone.now()
+
+    occupancies = [occupancy for occupancy in room_occupancies if not occupancy.is_full()]
+    if len(occupancies) == 0:
+        return_dict['warning'] = 'All rooms in this quarantine ward are full'
+        return return_dict
+
+    # check this room has positive / not positive member
+    if positive_test_now in [False, None]:
+        remain_occupancies = [occupancy for occupancy in occupancies if occupancy.num_positive == 0]
+    else:
+        remain_occupancies = [occupancy for occupancy in occupancies if occupancy.num_not_positive == 0]
+    if len(remain_occupancies) > 0:
+        occupancies = remain_occupancies
+    else:
+        return_dict['warning'] = 'All rooms in this quarantine ward are full or dont meet with this user positive_test_now'
+        return return_dict
+
+    tieu_chi = ['close_room', 'label', 'vaccine', 'gender', 'less_slot']
+    # close_room: All members in this room must have quarantined at >= 'num_day_to_close_room' day ago.
+    # label: This room must have at most number of members that is same label as this member.
+    # vaccine: This room must have minimum average abs(this.number_of_vaccine_doses - another_member.number_of_vaccine_doses)
+    # gender: This room must have at most number of members that is same gender as this member.
+    # less_slot: This room must have at less number of available slot.
+
+    # tieu_chi close_room
+    if positive_test_now in [False, None]:
+        remain_occupancies = [occupancy for occupancy in occupancies if not occupancy.is_close(num_day_to_close_room, time_now)]
+        if len(remain_occupancies) > 0:
+            occupancies = remain_occupancies
+        else:
+            return_dict['warning'] = 'All rooms are not accept any more member'
+            return return_dict
+
+    empty_occupancies = [occupancy for occupancy in occupancies if occupancy.is_empty()]
+    occupancies = [occupancy for occupancy in occupancies if not occupancy.is_empty()]
+
+    if occupancies:
+        # tieu_chi label
+        count_each_room = [occupancy.count_members_same_label(label) for occupancy in occupancies]
+        max_same_label_in_room = max(count_each_room)
+        occupancies = [occupancies[i] for i in range(len(occupancies)) if count_each_room[i] == max_same_label_in_room]
+
+        # tieu_chi vaccine
+        difference_each_room = [abs(occupancy.count_average_number_of_vaccine_doses() - number_of_vaccine_doses) for occupancy in occupancies]
+        min_difference_each_room = min(difference_each_room)
+        occupancies = [occupancies[i] for i in range(len(occupancies)) if difference_each_room[i] == min_difference_each_room]
+
+        # tieu_chi gender
+        count_each_room = [occupancy.count_members_same_gender(gender) for occupancy in occupancies]
+        max_same_gender_in_room = max(count_each_room)
+        occupancies = [occupancies[i] for i in range(len(occupancies)) if count_each_room[i] == max_same_gender_in_room]
+
+    occupancies += empty_occupancies
+
+    # tieu_chi less_slot
+    count_each_room = [occupancy.count_available_slot() for occupancy in occupancies]
+    min_available_slot = min(count_each_room)
+    occupancies = [occupancies[i] for i in range(len(occupancies)) if count_each_room[i] == min_available_slot]
+
+    return_dict['room_occupancy'] = occupancies[0]
+    return return_dict
+
+def allocate_rooms(room_occupancies, members_info, num_day_to_close_room, time_now=None):
+    """
+    Choose rooms for many members of the same quarantine ward in one pass,
+    each chosen room occupancy is updated before choosing room for the next member.
+
+    members_info: list of dict with keys [
+        gender, label, positive_test_now, number_of_vaccine_doses, quarantined_at
+    ]
+
+    Return a list of dict {'room_occupancy': RoomOccupancy or None, 'warning': String or None}, same order as members_info
+    """
+
+    if not time_now:
+        time_now = timezone.now()
+
+    return_list = []
+    for member_info in members_info:
+        suitable_room_occupancy_dict = choose_suitable_room(
+            room_occupancies,
+            gender=member_info['gender'],
+            label=member_info['label'],
+            positive_test_now=member_info['positive_test_now'],
+            number_of_vaccine_doses=member_info['number_of_vaccine_doses'],
+            num_day_to_close_room=num_day_to_close_room,
+            time_now=time_now,
+        )
+        room_occupancy = suitable_room_occupancy_dict['room_occupancy']
+        if room_occupancy:
+            room_occupancy.add_member(
+                label=member_info['label'],
+                gender=member_info['gender'],
+                positive_test_now=member_info['positive_test_now'],
+                number_of_vaccine_doses=member_info['number_of_vaccine_doses'],
+                quarantined_at=member_info['quarantined_at'],
+            )
+        return_list += [suitable_room_occupancy_dict]
+
+    return return_list
+
+def get_care_staff_loads(quarantine_ward):
+    """
+    Load all available staffs of quarantine_ward with number of members they care, in one query.
+
+    Return a list of dict {'care_staff': CustomUser, 'care_area': String, 'num_care_member': int}, ordered by staff id
+    """
+
+    query_set = Staff.objects.filter(
+        custom_user__status=CustomUserStatus.AVAILABLE,
+        custom_user__quarantine_ward=quarantine_ward,
+    ).select_related('custom_user').order_by('id')
+
+    return [{
+        'care_staff': staff.custom_user,
+        'care_area': staff.care_area or '',
+        'num_care_member': staff.num_care_member,
+    } for staff in query_set]
+
+def choose_care_staff(care_staff_loads, quarantine_floor):
+    """
+    Choose the staff caring least members, prefer staffs whose care_area contains quarantine_floor,
+    the chosen staff load is increased by 1.
+
+    Return CustomUser or None
+    """
+
+    floor_id = str(quarantine_floor.id)
+    loads = [load for load in care_staff_loads if floor_id in load['care_area'].lower()]
+    if len(loads) == 0:
+        loads = care_staff_loads
+    if len(loads) == 0:
+        return None
+
+    chosen_load = min(loads, key=lambda load: load['num_care_member'])
+    chosen_load['num_care_member'] += 1
+    return chosen_load['care_staff']
+
+def lock_rooms(room_ids):
+    """
+    Must be called in a transaction.
+    Lock rows of these rooms (in id order, to avoid deadlock) until the end of the transaction,
+    other admissions to these rooms wait, admissions to other rooms of the same quarantine ward do not.
+
+    Return a list of QuarantineRoom, num_current_member is read after locking
+    """
+
+    return list(QuarantineRoom.objects.select_for_update().filter(id__in=room_ids).order_by('id'))
+
+def reserve_room(room, old_room=None, number_of_members=1):
+    """
+    Must be called in a transaction, right before saving members to this room (from old_room).
+    Lock rows of this room and old_room (in id order, the member save updates both), then check again that this room has enough available slots.
+
+    Return True if this room has enough available slots
+    """
+
+    room_ids = {room.id}
+    if old_room:
+        room_ids.add(old_room.id)
+    locked_rooms = {locked_room.id: locked_room for locked_room in lock_rooms(room_ids)}
+    if room.id not in locked_rooms:
+        return False
+    return locked_rooms[room.id].num_current_member + number_of_members <= locked_rooms[room.id].capacity
+
+# path from QuarantineRoom to each model
+room_path_of_model = {
+    QuarantineWard: 'quarantine_floor__quarantine_building__quarantine_ward',
+    QuarantineBuilding: 'quarantine_floor__quarantine_building',
+    QuarantineFloor: 'quarantine_floor',
+}
+
+def total_capacity_subquery(model):
+    """
+    Subquery of sum of capacity of all rooms in each row of model (QuarantineWard, QuarantineBuilding or QuarantineFloor),
+    None if this row has no room
+    """
+
+    path = room_path_of_model[model]
+    return Subquery(
+        QuarantineRoom.objects.filter(**{path: OuterRef('pk')}).order_by().values(path).annotate(
+            total_capacity=Sum('capacity'),
+        ).values('total_capacity')
+    )
+
+def annotate_total_capacity(query_set):
+    """
+    Annotate total_capacity (0 if no room) to a query set of QuarantineWard, QuarantineBuilding or QuarantineFloor,
+    num_current_member is a counter column already
+    """
+
+    return query_set.annotate(total_capacity=Coalesce(total_capacity_subquery(query_set.model), 0))
+
+def filter_by_is_full(query_set, is_full):
+    """
+    Filter full (num_current_member >= capacity) or not full rooms / floors / buildings / quarantine wards in database,
+    query set of QuarantineWard, QuarantineBuilding, QuarantineFloor must be annotated by annotate_total_capacity
+    """
+
+    if query_set.model == QuarantineRoom:
+        capacity = F('capacity')
+    else:
+        capacity = F('total_capacity')
+
+    if is_full:
+        return query_set.filter(num_current_member__gte=capacity)
+    else:
+        return query_set.filter(num_current_member__lt=capacity)
+
+def get_total_capacity(instance):
+    """
+    Read annotation total_capacity if instance is from annotate_total_capacity, or query it
+    """
+
+    if hasattr(instance, 'total_capacity'):
+        return instance.total_capacity
+    return QuarantineRoom.objects.filter(**{room_path_of_model[type(instance)]: instance}).aggregate(Sum('capacity'))['capacity__sum']
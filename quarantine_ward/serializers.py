@@ -1,6 +1,5 @@
 from rest_framework import serializers
-from django.db.models import Sum
-from user_account.models import CustomUser, Member
+from user_account.models import CustomUser
 from address.serializers import (
     BaseCountrySerializer, BaseCitySerializer,
     BaseDistrictSerializer, BaseWardSerializer,
@@ -10,6 +9,7 @@ from .models import (
     QuarantineWard, QuarantineBuilding,
     QuarantineFloor, QuarantineRoom,
 )
+from .occupancy import get_total_capacity
 
 class PandemicSerializer(serializers.ModelSerializer):
 
@@ -49,11 +49,6 @@ class BaseQuarantineWardSerializer(serializers.ModelSerializer):
 
 class QuarantineRoomSerializer(serializers.ModelSerializer):
 
-    num_current_member = serializers.IntegerField(
-        source='member_x_quarantine_room.count',
-        read_only=True,
-    )
-
     class Meta:
         model = QuarantineRoom
         fields = '__all__'
@@ -67,15 +62,7 @@ class QuarantineFloorSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data =  super().to_representation(instance)
 
-        data['num_current_member'] = Member.objects.filter(
-            quarantine_room__quarantine_floor__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__id=data['id']
-        ).aggregate(Sum('capacity'))
-
-        data['total_capacity'] = next(iter(total_capacity.values()))
+        data['total_capacity'] = get_total_capacity(instance)
         return data
 
 
@@ -88,15 +75,7 @@ class QuarantineBuildingSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data =  super().to_representation(instance)
 
-        data['num_current_member'] = Member.objects.filter(
-            quarantine_room__quarantine_floor__quarantine_building__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__quarantine_building__id=data['id']
-        ).aggregate(Sum('capacity'))
-
-        data['total_capacity'] = next(iter(total_capacity.values()))
+        data['total_capacity'] = get_total_capacity(instance)
         return data
 
 class QuarantineWardSerializer(serializers.ModelSerializer):
@@ -115,15 +94,7 @@ class QuarantineWardSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        data['num_current_member'] = Member.objects.filter(
-            quarantine_room__quarantine_floor__quarantine_building__quarantine_ward__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__quarantine_building__quarantine_ward__id=data['id']
-        ).aggregate(Sum('capacity'))
-
-        data['total_capacity'] = next(iter(total_capacity.values()))
+        data['total_capacity'] = get_total_capacity(instance)
         return data
 
 class QuarantineWardWithBuildingSerializer(serializers.ModelSerializer):
@@ -141,34 +112,6 @@ class QuarantineWardForRegisterSerializer(serializers.ModelSerializer):
         model = QuarantineWard
         fields = ['id', 'full_name', 'pandemic', 'latitude', 'longitude']
 
-    def to_representation(self, instance):
-        data =  super().to_representation(instance)
-
-        num_current_member = Member.objects.filter(
-            quarantine_room__quarantine_floor__quarantine_building__quarantine_ward__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__quarantine_building__quarantine_ward__id=data['id']
-        ).aggregate(Sum('capacity'))
-
-        total_capacity = next(iter(total_capacity.values()))
-        if total_capacity == None:
-            total_capacity = 0
-
-        if self.context == 'set_full':
-            if num_current_member >= total_capacity:
-                return data
-            else:
-                return None
-        elif self.context == 'set_not_full':
-            if num_current_member < total_capacity:
-                return data
-            else:
-                return None
-
-        return data
-
 class FilterQuarantineWardSerializer(serializers.ModelSerializer):
 
     main_manager = BaseCustomUserSerializer(many=False)
@@ -188,26 +131,13 @@ class FilterQuarantineWardSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data =  super().to_representation(instance)
 
-        data['num_current_member'] = Member.objects.filter(
-            quarantine_room__quarantine_floor__quarantine_building__quarantine_ward__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__quarantine_building__quarantine_ward__id=data['id']
-        ).aggregate(Sum('capacity'))
+        data['num_current_member'] = instance.num_current_member
 
-        data['total_capacity'] = next(iter(total_capacity.values()))
+        data['total_capacity'] = get_total_capacity(instance)
         if data['total_capacity'] == None:
             data['total_capacity'] = 0
 
-        if self.context == 'set_full':
-            if data['num_current_member'] >= data['total_capacity']:
-                return data
-        elif self.context == 'set_not_full':
-            if data['num_current_member'] < data['total_capacity']:
-                return data
-        else:
-            return data
+        return data
 
 class FilterQuarantineBuildingSerializer(serializers.ModelSerializer):
 
@@ -220,29 +150,12 @@ class FilterQuarantineBuildingSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data =  super().to_representation(instance)
 
-        data['num_current_member'] = Member.objects.filter(
-            quarantine_room__quarantine_floor__quarantine_building__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__quarantine_building__id=data['id']
-        ).aggregate(Sum('capacity'))
+        data['num_current_member'] = instance.num_current_member
 
-        data['total_capacity'] = next(iter(total_capacity.values()))
+        data['total_capacity'] = get_total_capacity(instance)
         if data['total_capacity'] == None:
             data['total_capacity'] = 0
 
-        if self.context == 'set_full':
-            if data['num_current_member'] >= data['total_capacity']:
-                return data
-            else:
-                return None
-        elif self.context == 'set_not_full':
-            if data['num_current_member'] < data['total_capacity']:
-                return data
-            else:
-                return None
-                
         return data
 
 class FilterQuarantineFloorSerializer(serializers.ModelSerializer):
@@ -256,55 +169,18 @@ class FilterQuarantineFloorSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data =  super().to_representation(instance)
 
-        data['num_current_member'] = Member.objects.filter(
-            quarantine_room__quarantine_floor__id=data['id']
-        ).count()
-
-        total_capacity = QuarantineRoom.objects.filter(
-            quarantine_floor__id=data['id']
-        ).aggregate(Sum('capacity'))
+        data['num_current_member'] = instance.num_current_member
 
-        data['total_capacity'] = next(iter(total_capacity.values()))
+        data['total_capacity'] = get_total_capacity(instance)
         if data['total_capacity'] == None:
             data['total_capacity'] = 0
 
-        if self.context == 'set_full':
-            if data['num_current_member'] >= data['total_capacity']:
-                return data
-            else:
-                return None
-        elif self.context == 'set_not_full':
-            if data['num_current_member'] < data['total_capacity']:
-                return data
-            else:
-                return None
-                
         return data
 
 class FilterQuarantineRoomSerializer(serializers.ModelSerializer):
 
     quarantine_floor = BaseQuarantineFloorSerializer(many=False)
-    num_current_member = serializers.IntegerField(
-        source='member_x_quarantine_room.count',
-        read_only=True,
-    )
 
     class Meta:
         model = QuarantineRoom
         fields = ['id', 'name', 'capacity', 'quarantine_floor', 'num_current_member']
-    
-    def to_representation(self, instance):
-        data =  super().to_representation(instance)
-
-        if self.context == 'set_full':
-            if data['num_current_member'] >= data['capacity']:
-                return data
-            else:
-                return None
-        elif self.context == 'set_not_full':
-            if data['num_current_member'] < data['capacity']:
-                return data
-            else:
-                return None
-                
-        return data
@@ -1,5 +1,4 @@
 from ..models import QuarantineFloor, QuarantineRoom
-from user_account.models import Member
 from utils import validators, messages, exceptions
 from django.db.models import Q
 from utils.tools import date_string_to_timestamp
@@ -68,8 +67,7 @@ class QuarantineRoomValidator(validators.AbstractRequestValidate):
     
     def check_capacity(self, quarantine_room):
         if hasattr(self, '_capacity'):
-            num_current_member = Member.objects.filter(quarantine_room=quarantine_room).count()
-            if (self._capacity < num_current_member):
+            if (self._capacity < quarantine_room.num_current_member):
                 raise exceptions.InvalidArgumentException(message={'capacity': messages.UPDATED_CAPACITY_SMALLER_THAN_MEMBER})
     
     def filter_validate(self):
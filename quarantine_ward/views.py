@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import permissions
 from rest_framework.decorators import action, permission_classes
@@ -31,6 +32,8 @@ from .validators.quarantine_ward import QuarantineWardValidator
 from .validators.quarantine_building import QuarantineBuildingValidator
 from .validators.quarantine_floor import QuarantineFloorValidator
 from .validators.quarantine_room import QuarantineRoomValidator
+from .occupancy import annotate_total_capacity, filter_by_is_full
+from user_account.counters import remove_num_current_member_of_rooms, clear_location_of_members_in_rooms, move_rooms
 
 class QuarantineWardAPI (AbstractView):
     
@@ -311,13 +314,6 @@ class QuarantineWardAPI (AbstractView):
             ])
             validator.filter_validate()
 
-            context = ''
-            if validator.has_field('is_full'):
-                if validator.get_field('is_full') == True:
-                    context = 'set_full'
-                else:
-                    context = 'set_not_full'
-
             query_set = QuarantineWard.objects.all()
 
             list_to_filter = [key for key in accepted_fields.keys()]
@@ -332,10 +328,11 @@ class QuarantineWardAPI (AbstractView):
             query_set = filter.qs
 
             query_set = query_set.select_related('main_manager', 'pandemic', 'city', 'country', 'district', 'ward')
+            query_set = annotate_total_capacity(query_set)
+            if validator.has_field('is_full'):
+                query_set = filter_by_is_full(query_set, validator.get_field('is_full') == True)
 
-            serializer = FilterQuarantineWardSerializer(query_set, many=True, context=context)
-            _data = [i for i in serializer.data if i]
-            paginated_data = paginate_data(request, _data)
+            paginated_data = paginate_data(request, query_set, FilterQuarantineWardSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -365,18 +362,13 @@ class QuarantineWardAPI (AbstractView):
 
             validator = QuarantineWardValidator(**accepted_fields)
             validator.filter_validate()
-            context = ''
-            if validator.has_field('is_full'):
-                if validator.get_field('is_full') == True:
-                    context = 'set_full'
-                else:
-                    context = 'set_not_full'
-
             list_quarantine_ward = QuarantineWard.objects.filter(trash=False)
             list_quarantine_ward = list_quarantine_ward.select_related('pandemic')
-            serializer = QuarantineWardForRegisterSerializer(list_quarantine_ward, many=True, context=context)
-            _data = [i for i in serializer.data if i]
-            return self.response_handler.handle(data=_data)
+            if validator.has_field('is_full'):
+                list_quarantine_ward = annotate_total_capacity(list_quarantine_ward)
+                list_quarantine_ward = filter_by_is_full(list_quarantine_ward, validator.get_field('is_full') == True)
+            serializer = QuarantineWardForRegisterSerializer(list_quarantine_ward, many=True)
+            return self.response_handler.handle(data=serializer.data)
         except Exception as exception:
             return self.exception_handler.handle(exception)
     
@@ -507,8 +499,16 @@ class QuarantineBuildingAPI (AbstractView):
             quarantine_building = validator.get_field('quarantine_building')
             list_to_update = accepted_fields.keys() - {'id'}
             dict_to_update = validator.get_data(list_to_update)
-            quarantine_building.__dict__.update(**dict_to_update)
-            quarantine_building.save()
+            quarantine_ward = dict_to_update.pop('quarantine_ward', None)
+            with transaction.atomic():
+                if quarantine_ward and quarantine_ward.id != quarantine_building.quarantine_ward_id:
+                    move_rooms(
+                        QuarantineRoom.objects.filter(quarantine_floor__quarantine_building=quarantine_building),
+                        quarantine_ward=quarantine_ward,
+                    )
+                    quarantine_building.quarantine_ward = quarantine_ward
+                quarantine_building.__dict__.update(**dict_to_update)
+                quarantine_building.save()
 
             serializer = QuarantineBuildingSerializer(quarantine_building, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -551,7 +551,13 @@ class QuarantineBuildingAPI (AbstractView):
             validator.is_valid_fields(accepted_fields)
 
             quarantine_building = validator.get_field('quarantine_building')
-            quarantine_building.delete()
+            with transaction.atomic():
+                quarantine_rooms = QuarantineRoom.objects.filter(
+                    quarantine_floor__quarantine_building=quarantine_building,
+                )
+                remove_num_current_member_of_rooms(quarantine_rooms)
+                clear_location_of_members_in_rooms(quarantine_rooms)
+                quarantine_building.delete()
 
             serializer = QuarantineBuildingSerializer(quarantine_building, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -597,13 +603,6 @@ class QuarantineBuildingAPI (AbstractView):
             validator.is_missing_fields(required_fields)
             validator.filter_validate()
 
-            context = ''
-            if validator.has_field('is_full'):
-                if validator.get_field('is_full') == True:
-                    context = 'set_full'
-                else:
-                    context = 'set_not_full'
-
             query_set = QuarantineBuilding.objects.all()
             
             list_to_filter = [key for key in accepted_fields.keys()]
@@ -618,10 +617,11 @@ class QuarantineBuildingAPI (AbstractView):
             query_set = filter.qs
 
             query_set = query_set.select_related('quarantine_ward__main_manager')
+            query_set = annotate_total_capacity(query_set)
+            if validator.has_field('is_full'):
+                query_set = filter_by_is_full(query_set, validator.get_field('is_full') == True)
 
-            serializer = FilterQuarantineBuildingSerializer(query_set, many=True, context=context)
-            _data = [i for i in serializer.data if i]
-            paginated_data = paginate_data(request, _data)
+            paginated_data = paginate_data(request, query_set, FilterQuarantineBuildingSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -797,8 +797,17 @@ class QuarantineFloorAPI (AbstractView):
             quarantine_floor = validator.get_field('quarantine_floor')
             list_to_update = accepted_fields.keys() -{'id'}
             dict_to_update = validator.get_data(list_to_update)
-            quarantine_floor.__dict__.update(**dict_to_update)
-            quarantine_floor.save()
+            quarantine_building = dict_to_update.pop('quarantine_building', None)
+            with transaction.atomic():
+                if quarantine_building and quarantine_building.id != quarantine_floor.quarantine_building_id:
+                    move_rooms(
+                        QuarantineRoom.objects.filter(quarantine_floor=quarantine_floor),
+                        quarantine_building=quarantine_building,
+                        quarantine_ward=quarantine_building.quarantine_ward,
+                    )
+                    quarantine_floor.quarantine_building = quarantine_building
+                quarantine_floor.__dict__.update(**dict_to_update)
+                quarantine_floor.save()
 
             serializer = QuarantineFloorSerializer(quarantine_floor, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -841,7 +850,13 @@ class QuarantineFloorAPI (AbstractView):
             validator.is_valid_fields(accepted_fields)
 
             quarantine_floor = validator.get_field('quarantine_floor')
-            quarantine_floor.delete()
+            with transaction.atomic():
+                quarantine_rooms = QuarantineRoom.objects.filter(
+                    quarantine_floor=quarantine_floor,
+                )
+                remove_num_current_member_of_rooms(quarantine_rooms)
+                clear_location_of_members_in_rooms(quarantine_rooms)
+                quarantine_floor.delete()
 
             serializer = QuarantineFloorSerializer(quarantine_floor, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -885,13 +900,6 @@ class QuarantineFloorAPI (AbstractView):
             validator.filter_validate()
             quarantine_building_id_list = validator.is_validate_quarantine_building_id_list()
 
-            context = ''
-            if validator.has_field('is_full'):
-                if validator.get_field('is_full') == True:
-                    context = 'set_full'
-                else:
-                    context = 'set_not_full'
-
             query_set = QuarantineFloor.objects.filter(quarantine_building__in=quarantine_building_id_list)
 
             list_to_filter = [key for key in accepted_fields.keys()]
@@ -906,10 +914,11 @@ class QuarantineFloorAPI (AbstractView):
             query_set = filter.qs
 
             query_set = query_set.select_related('quarantine_building')
+            query_set = annotate_total_capacity(query_set)
+            if validator.has_field('is_full'):
+                query_set = filter_by_is_full(query_set, validator.get_field('is_full') == True)
 
-            serializer = FilterQuarantineFloorSerializer(query_set, many=True, context=context)
-            _data = [i for i in serializer.data if i]
-            paginated_data = paginate_data(request, _data)
+            paginated_data = paginate_data(request, query_set, FilterQuarantineFloorSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -1072,8 +1081,18 @@ class QuarantineRoomAPI(AbstractView):
             validator.check_capacity(quarantine_room)
             list_to_update = accepted_fields.keys() - {'id'}
             dict_to_update = validator.get_data(list_to_update)
-            quarantine_room.__dict__.update(**dict_to_update)
-            quarantine_room.save()
+            quarantine_floor = dict_to_update.pop('quarantine_floor', None)
+            with transaction.atomic():
+                if quarantine_floor and quarantine_floor.id != quarantine_room.quarantine_floor_id:
+                    move_rooms(
+                        [quarantine_room],
+                        quarantine_floor=quarantine_floor,
+                        quarantine_building=quarantine_floor.quarantine_building,
+                        quarantine_ward=quarantine_floor.quarantine_building.quarantine_ward,
+                    )
+                    quarantine_room.quarantine_floor = quarantine_floor
+                quarantine_room.__dict__.update(**dict_to_update)
+                quarantine_room.save()
 
             serializer = QuarantineRoomSerializer(quarantine_room, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -1116,7 +1135,10 @@ class QuarantineRoomAPI(AbstractView):
             validator.is_valid_fields(accepted_fields)
 
             quarantine_room = validator.get_field('quarantine_room')
-            quarantine_room.delete()
+            with transaction.atomic():
+                remove_num_current_member_of_rooms([quarantine_room])
+                clear_location_of_members_in_rooms([quarantine_room])
+                quarantine_room.delete()
 
             serializer = QuarantineRoomSerializer(quarantine_room, many=False)
             return self.response_handler.handle(data=serializer.data)
@@ -1159,13 +1181,6 @@ class QuarantineRoomAPI(AbstractView):
             validator.is_missing_fields(required_fields)
             validator.filter_validate()
 
-            context = ''
-            if validator.has_field('is_full'):
-                if validator.get_field('is_full') == True:
-                    context = 'set_full'
-                else:
-                    context = 'set_not_full'
-
             query_set = QuarantineRoom.objects.all()
 
             list_to_filter = [key for key in accepted_fields.keys()]
@@ -1180,10 +1195,10 @@ class QuarantineRoomAPI(AbstractView):
             query_set = filter.qs
 
             query_set = query_set.select_related('quarantine_floor')
+            if validator.has_field('is_full'):
+                query_set = filter_by_is_full(query_set, validator.get_field('is_full') == True)
 
-            serializer = FilterQuarantineRoomSerializer(query_set, many=True, context=context)
-            _data = [i for i in serializer.data if i]
-            paginated_data = paginate_data(request, _data)
+            paginated_data = paginate_data(request, query_set, FilterQuarantineRoomSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
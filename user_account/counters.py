@@ -0,0 +1,267 @@
+from django.db import transaction
+from django.db.models import Count, F, DEFERRED
+from .models import Member, Manager, Staff
+from quarantine_ward.models import (
+    QuarantineWard, QuarantineBuilding,
+    QuarantineFloor, QuarantineRoom,
+)
+
+def add_to_counter(model, field, dict_of_delta, key='id'):
+    """
+    Add (can be negative) delta to column 'field' of rows of model, one UPDATE for each different delta.
+    Rows are locked in order of key first, so transactions adding to the same rows cannot deadlock.
+    dict_of_delta: {value of key: delta}
+    """
+
+    dict_of_keys = dict()
+    for key_value, delta in dict_of_delta.items():
+        if key_value and delta:
+            dict_of_keys.setdefault(delta, []).append(key_value)
+    if not dict_of_keys:
+        return
+
+    all_key_values = [key_value for key_values in dict_of_keys.values() for key_value in key_values]
+    with transaction.atomic():
+        list(model.objects.select_for_update().filter(**{f'{key}__in': all_key_values}).order_by(key).values_list(key, flat=True))
+        for delta, key_values in dict_of_keys.items():
+            model.objects.filter(**{f'{key}__in': key_values}).update(**{field: F(field) + delta})
+
+def update_num_current_member_of_parents(dict_of_floor_delta, dict_of_building_delta, dict_of_ward_delta):
+    """
+    Add delta to num_current_member of floors, buildings, quarantine wards,
+    rows are locked in the same order (floors, buildings, quarantine wards, each by id) by every caller.
+    """
+
+    with transaction.atomic():
+        add_to_counter(QuarantineFloor, 'num_current_member', dict_of_floor_delta)
+        add_to_counter(QuarantineBuilding, 'num_current_member', dict_of_building_delta)
+        add_to_counter(QuarantineWard, 'num_current_member', dict_of_ward_delta)
+
+def update_num_current_member_of_rooms(dict_of_delta):
+    """
+    Add delta to num_current_member of rooms, and of their floors, buildings, quarantine wards, in the same transaction.
+    Rows are locked in the same order by every caller (rooms, floors, buildings, quarantine wards, each by id),
+    so transactions updating the same counters wait for each other instead of deadlocking.
+    dict_of_delta: {quarantine_room_id: delta}
+    """
+
+    dict_of_delta = {room_id: delta for room_id, delta in dict_of_delta.items() if room_id and delta}
+    if not dict_of_delta:
+        return
+
+    dict_of_floor_delta = dict()
+    dict_of_building_delta = dict()
+    dict_of_ward_delta = dict()
+
+    rooms = QuarantineRoom.objects.filter(id__in=dict_of_delta.keys()).values(
+        'id', 'quarantine_floor',
+        'quarantine_floor__quarantine_building',
+        'quarantine_floor__quarantine_building__quarantine_ward',
+    )
+    for room in rooms:
+        delta = dict_of_delta[room['id']]
+        floor_id = room['quarantine_floor']
+        building_id = room['quarantine_floor__quarantine_building']
+        ward_id = room['quarantine_floor__quarantine_building__quarantine_ward']
+        dict_of_floor_delta[floor_id] = dict_of_floor_delta.get(floor_id, 0) + delta
+        dict_of_building_delta[building_id] = dict_of_building_delta.get(building_id, 0) + delta
+        dict_of_ward_delta[ward_id] = dict_of_ward_delta.get(ward_id, 0) + delta
+
+    with transaction.atomic():
+        add_to_counter(QuarantineRoom, 'num_current_member', dict_of_delta)
+        update_num_current_member_of_parents(dict_of_floor_delta, dict_of_building_delta, dict_of_ward_delta)
+
+def update_counters_of_members(members, fields=None):
+    """
+    Run this function (in the same transaction) after saving members,
+    update num_current_member of rooms (and their floors, buildings, quarantine wards) and num_care_member of staffs
+    from the values loaded from database to the values saved.
+    fields: saved fields (update_fields), None mean all fields
+    """
+
+    dict_of_room_delta = dict()
+    dict_of_care_staff_delta = dict()
+
+    for member in members:
+        if fields is None or 'quarantine_room' in fields:
+            old_room_id = getattr(member, '_loaded_quarantine_room_id', None)
+            new_room_id = member.quarantine_room_id
+            if old_room_id is not DEFERRED and old_room_id != new_room_id:
+                dict_of_room_delta[old_room_id] = dict_of_room_delta.get(old_room_id, 0) - 1
+                dict_of_room_delta[new_room_id] = dict_of_room_delta.get(new_room_id, 0) + 1
+            member._loaded_quarantine_room_id = new_room_id
+
+        if fields is None or 'care_staff' in fields:
+            old_care_staff_id = getattr(member, '_loaded_care_staff_id', None)
+            new_care_staff_id = member.care_staff_id
+            if old_care_staff_id is not DEFERRED and old_care_staff_id != new_care_staff_id:
+                dict_of_care_staff_delta[old_care_staff_id] = dict_of_care_staff_delta.get(old_care_staff_id, 0) - 1
+                dict_of_care_staff_delta[new_care_staff_id] = dict_of_care_staff_delta.get(new_care_staff_id, 0) + 1
+            member._loaded_care_staff_id = new_care_staff_id
+
+    update_num_current_member_of_rooms(dict_of_room_delta)
+    add_to_counter(Staff, 'num_care_member', dict_of_care_staff_delta, key='custom_user_id')
+
+def set_location_of_members(members):
+    """
+    Set quarantine_floor, quarantine_building, quarantine_ward of members (in memory) from their quarantine_room.
+    Run this function before saving members whose quarantine_room is changed.
+    """
+
+    room_ids = {member.quarantine_room_id for member in members if member.quarantine_room_id}
+
+    dict_of_location = dict()
+    if room_ids:
+        rooms = QuarantineRoom.objects.filter(id__in=room_ids).values(
+            'id', 'quarantine_floor',
+            'quarantine_floor__quarantine_building',
+            'quarantine_floor__quarantine_building__quarantine_ward',
+        )
+        dict_of_location = {room['id']: room for room in rooms}
+
+    for member in members:
+        location = dict_of_location.get(member.quarantine_room_id)
+        if location:
+            member.quarantine_floor_id = location['quarantine_floor']
+            member.quarantine_building_id = location['quarantine_floor__quarantine_building']
+            member.quarantine_ward_id = location['quarantine_floor__quarantine_building__quarantine_ward']
+        else:
+            member.quarantine_floor_id = None
+            member.quarantine_building_id = None
+            member.quarantine_ward_id = None
+
+def clear_location_of_members_in_rooms(rooms):
+    """
+    Run this function (in the same transaction) before deleting rooms (or their floor, building),
+    members in these rooms have no floor, building, quarantine ward any more.
+    """
+
+    Member.objects.filter(quarantine_room__in=rooms).update(
+        quarantine_floor=None,
+        quarantine_building=None,
+        quarantine_ward=None,
+    )
+
+def remove_num_current_member_of_rooms(rooms):
+    """
+    Run this function (in the same transaction) before deleting rooms (or their floor, building),
+    members in these rooms are not counted in floors, buildings, quarantine wards any more.
+    """
+
+    update_num_current_member_of_rooms({room.id: -room.num_current_member for room in rooms})
+
+def move_rooms(rooms, quarantine_floor=None, quarantine_building=None, quarantine_ward=None):
+    """
+    Run this function (in the same transaction) before saving rooms with a new quarantine_floor
+    (or their floor with a new quarantine_building, their building with a new quarantine_ward).
+    quarantine_floor, quarantine_building, quarantine_ward: new location of these rooms, None mean it is not changed.
+    Members in these rooms get the new location, and num_current_member of their old floors, buildings, quarantine wards
+    is moved to the new ones.
+    Rows are locked in the same order as admissions and roll-ups (rooms, then floors, buildings, quarantine wards, each by id),
+    including the row that is saved after this function, so it cannot deadlock with them.
+    """
+
+    rooms = list(QuarantineRoom.objects.select_for_update(of=('self',)).filter(
+        id__in=[room.id for room in rooms],
+    ).order_by('id').values(
+        'id', 'quarantine_floor',
+        'quarantine_floor__quarantine_building',
+        'quarantine_floor__quarantine_building__quarantine_ward',
+    ))
+    if not rooms:
+        return
+
+    dict_of_location = dict()
+    for room in rooms:
+        dict_of_location[room['id']] = (
+            quarantine_floor.id if quarantine_floor else room['quarantine_floor'],
+            quarantine_building.id if quarantine_building else room['quarantine_floor__quarantine_building'],
+            quarantine_ward.id if quarantine_ward else room['quarantine_floor__quarantine_building__quarantine_ward'],
+        )
+
+    dict_of_floor_delta = dict()
+    dict_of_building_delta = dict()
+    dict_of_ward_delta = dict()
+
+    old_locations = Member.objects.filter(quarantine_room__in=dict_of_location.keys()).values(
+        'quarantine_room', 'quarantine_floor', 'quarantine_building', 'quarantine_ward',
+    ).annotate(number_of_members=Count('id')).order_by()
+    for old_location in old_locations:
+        number_of_members = old_location['number_of_members']
+        floor_id, building_id, ward_id = dict_of_location[old_location['quarantine_room']]
+        for dict_of_delta, old_id, new_id in [
+            (dict_of_floor_delta, old_location['quarantine_floor'], floor_id),
+            (dict_of_building_delta, old_location['quarantine_building'], building_id),
+            (dict_of_ward_delta, old_location['quarantine_ward'], ward_id),
+        ]:
+            if old_id != new_id:
+                dict_of_delta[old_id] = dict_of_delta.get(old_id, 0) - number_of_members
+                dict_of_delta[new_id] = dict_of_delta.get(new_id, 0) + number_of_members
+
+    # lock old and new parents, and the parent saved after this function
+    for model, ids in [
+        (QuarantineFloor, {location[0] for location in dict_of_location.values()} | dict_of_floor_delta.keys()),
+        (QuarantineBuilding, {location[1] for location in dict_of_location.values()} | dict_of_building_delta.keys()),
+        (QuarantineWard, {location[2] for location in dict_of_location.values()} | dict_of_ward_delta.keys()),
+    ]:
+        list(model.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id', flat=True))
+
+    dict_of_room_ids = dict()
+    for room_id, location in dict_of_location.items():
+        dict_of_room_ids.setdefault(location, []).append(room_id)
+    for (floor_id, building_id, ward_id), room_ids in dict_of_room_ids.items():
+        Member.objects.filter(quarantine_room__in=room_ids).update(
+            quarantine_floor=floor_id,
+            quarantine_building=building_id,
+            quarantine_ward=ward_id,
+        )
+
+    update_num_current_member_of_parents(dict_of_floor_delta, dict_of_building_delta, dict_of_ward_delta)
+
+def update_number_of_vaccine_doses(custom_user, delta):
+    """
+    Add delta to number_of_vaccine_doses of this user (member, manager or staff)
+    """
+
+    for model in [Member, Manager, Staff]:
+        add_to_counter(model, 'number_of_vaccine_doses', {custom_user.id: delta}, key='custom_user_id')
+
+def reconcile_counters(dry_run=False):
+    """
+    Recalculate all counters from database, repair counters that are different (if not dry_run),
+    each wrong counter is repaired by adding the difference, not by writing the recalculated value.
+
+    Return a dict {counter name: number of rows with wrong value}
+    """
+
+    member_path = 'member_x_quarantine_room'
+    room_path = f'quarantine_room_x_quarantine_floor__{member_path}'
+    floor_path = f'quarantine_floor_x_quarantine_building__{room_path}'
+    building_path = f'quarantine_building_x_quarantine_ward__{floor_path}'
+
+    counters = [
+        ('quarantine_room.num_current_member', QuarantineRoom, 'num_current_member', Count(member_path)),
+        ('quarantine_floor.num_current_member', QuarantineFloor, 'num_current_member', Count(room_path)),
+        ('quarantine_building.num_current_member', QuarantineBuilding, 'num_current_member', Count(floor_path)),
+        ('quarantine_ward.num_current_member', QuarantineWard, 'num_current_member', Count(building_path)),
+        ('staff.num_care_member', Staff, 'num_care_member', Count('custom_user__member_x_care_staff')),
+        ('member.number_of_vaccine_doses', Member, 'number_of_vaccine_doses', Count('custom_user__vaccine_dose_x_custom_user')),
+        ('manager.number_of_vaccine_doses', Manager, 'number_of_vaccine_doses', Count('custom_user__vaccine_dose_x_custom_user')),
+        ('staff.number_of_vaccine_doses', Staff, 'number_of_vaccine_doses', Count('custom_user__vaccine_dose_x_custom_user')),
+    ]
+
+    return_dict = dict()
+    for name, model, field, real_value in counters:
+        wrong_rows = list(model.objects.annotate(
+            real_value=real_value,
+        ).exclude(**{field: F('real_value')}).only('id', field))
+
+        return_dict[name] = len(wrong_rows)
+        if dry_run or not wrong_rows:
+            continue
+
+        # counter and real value of a row are read by the same statement, the difference is added with F(),
+        # so changes committed by other transactions after this statement are kept
+        add_to_counter(model, field, {row.id: row.real_value - getattr(row, field) for row in wrong_rows})
+
+    return return_dict
@@ -0,0 +1,277 @@
+import datetime
+import pytz
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F
+from django.db.models.functions import TruncDate
+from .models import CustomUser, QuarantineHistory
+from quarantine_ward.models import WardDailyStats
+from utils.enums import (
+    CustomUserStatus, HealthStatus,
+    MemberQuarantinedStatus,
+    QuarantineHistoryStatus, QuarantineHistoryEndType,
+)
+
+vntz = pytz.timezone('Asia/Saigon')
+
+def get_list_of_days(number_of_days, time_now):
+    """
+    Return list of 'number_of_days' last days (date in Asia/Saigon, oldest first, today last)
+    """
+
+    today = time_now.astimezone(vntz).date()
+    return [today - datetime.timedelta(days=day_sub) for day_sub in range(number_of_days - 1, -1, -1)]
+
+def get_start_of_day(day):
+    return vntz.localize(datetime.datetime(day.year, day.month, day.day))
+
+def count_member_statistics(quarantine_ward_id, last_tested_max, time_now):
+    """
+    Count all headline numbers of members for manager home screen in one query.
+
+    Return a dict with keys:
+        number_of_all_members_past_and_now, number_of_quarantining_members,
+        number_of_waiting_members, number_of_suspected_members,
+        number_of_positive_members, number_of_need_test_members,
+        number_of_can_finish_members, number_of_hospitalize_waiting_members,
+        number_of_completed_members, number_of_hospitalized_members
+    """
+
+    query_set = CustomUser.objects.filter(role__name='MEMBER')
+    if quarantine_ward_id:
+        query_set = query_set.filter(quarantine_ward__id=quarantine_ward_id)
+
+    available = Q(status=CustomUserStatus.AVAILABLE)
+    leave = Q(status=CustomUserStatus.LEAVE)
+    positive_test_now_not_true = (
+        Q(member_x_custom_user__positive_test_now=False) |
+        Q(member_x_custom_user__positive_test_now__isnull=True)
+    )
+
+    return query_set.aggregate(
+        number_of_all_members_past_and_now=Count('id', filter=available | leave),
+        number_of_quarantining_members=Count('id', filter=available),
+        number_of_waiting_members=Count('id', filter=Q(status=CustomUserStatus.WAITING)),
+        number_of_suspected_members=Count('id', filter=(
+            available &
+            Q(member_x_custom_user__health_status__in=[HealthStatus.UNWELL, HealthStatus.SERIOUS]) &
+            positive_test_now_not_true
+        )),
+        number_of_positive_members=Count('id', filter=(
+            available &
+            Q(member_x_custom_user__positive_test_now=True)
+        )),
+        number_of_need_test_members=Count('id', filter=(
+            available &
+            (Q(member_x_custom_user__last_tested__lte=last_tested_max) | Q(member_x_custom_user__last_tested=None))
+        )),
+        number_of_can_finish_members=Count('id', filter=(
+            available &
+            Q(member_x_custom_user__positive_test_now=False) &
+            Q(member_x_custom_user__health_status__in=[HealthStatus.NORMAL, HealthStatus.UNWELL]) &
+            Q(member_x_custom_user__quarantined_finish_expected_at__lte=time_now)
+        )),
+        number_of_hospitalize_waiting_members=Count('id', filter=(
+            available &
+            Q(member_x_custom_user__quarantined_status=MemberQuarantinedStatus.HOSPITALIZE_WAITING)
+        )),
+        number_of_completed_members=Count('id', filter=(
+            leave &
+            Q(member_x_custom_user__quarantined_status=MemberQuarantinedStatus.COMPLETED)
+        )),
+        number_of_hospitalized_members=Count('id', filter=(
+            leave &
+            Q(member_x_custom_user__quarantined_status=MemberQuarantinedStatus.HOSPITALIZE)
+        )),
+    )
+
+def get_day_in_vntz(time):
+    return time.astimezone(vntz).date()
+
+def add_to_ward_daily_stats(quarantine_ward_id, day, num_in=0, num_complete=0, num_hospitalize=0):
+    """
+    Add (can be negative) numbers to row (quarantine_ward_id, day) of WardDailyStats
+    """
+
+    if not quarantine_ward_id or not day:
+        return
+    if not (num_in or num_complete or num_hospitalize):
+        return
+
+    ward_daily_stats, _ = WardDailyStats.objects.get_or_create(quarantine_ward_id=quarantine_ward_id, day=day)
+    WardDailyStats.objects.filter(id=ward_daily_stats.id).update(
+        num_in=F('num_in') + num_in,
+        num_complete=F('num_complete') + num_complete,
+        num_hospitalize=F('num_hospitalize') + num_hospitalize,
+    )
+
+def update_ward_daily_stats_of_in_member(old_quarantine_ward_id, old_quarantined_at, new_quarantine_ward_id, new_quarantined_at):
+    """
+    Run this function after changing quarantined_at or quarantine_ward of a member.
+    A member is counted as 'in' at quarantine_ward of this CustomUser, on the day of quarantined_at.
+    """
+
+    old_day = get_day_in_vntz(old_quarantined_at) if old_quarantined_at else None
+    new_day = get_day_in_vntz(new_quarantined_at) if new_quarantined_at else None
+
+    if old_quarantine_ward_id == new_quarantine_ward_id and old_day == new_day:
+        return
+
+    add_to_ward_daily_stats(old_quarantine_ward_id, old_day, num_in=-1)
+    add_to_ward_daily_stats(new_quarantine_ward_id, new_day, num_in=1)
+
+def update_ward_daily_stats_of_in_members(changes):
+    """
+    Same as update_ward_daily_stats_of_in_member for many members, each row (quarantine_ward, day) is updated once.
+    changes: list of tuple (old_quarantine_ward_id, old_quarantined_at, new_quarantine_ward_id, new_quarantined_at)
+    """
+
+    dict_of_num_in = dict()
+    for old_quarantine_ward_id, old_quarantined_at, new_quarantine_ward_id, new_quarantined_at in changes:
+        old_day = get_day_in_vntz(old_quarantined_at) if old_quarantined_at else None
+        new_day = get_day_in_vntz(new_quarantined_at) if new_quarantined_at else None
+
+        if old_quarantine_ward_id == new_quarantine_ward_id and old_day == new_day:
+            continue
+
+        old_key = (old_quarantine_ward_id, old_day)
+        new_key = (new_quarantine_ward_id, new_day)
+        dict_of_num_in[old_key] = dict_of_num_in.get(old_key, 0) - 1
+        dict_of_num_in[new_key] = dict_of_num_in.get(new_key, 0) + 1
+
+    for (quarantine_ward_id, day), num_in in dict_of_num_in.items():
+        add_to_ward_daily_stats(quarantine_ward_id, day, num_in=num_in)
+
+def update_ward_daily_stats_of_ended_quarantine_history(quarantine_history):
+    """
+    Run this function after a quarantine history is ended (and saved) with end_type COMPLETED or HOSPITALIZE.
+    The user is counted at quarantine ward of its room, on the day of end_date,
+    once even if the user has other histories ended with the same end_type there that day (same as rebuild_ward_daily_stats).
+    """
+
+    if quarantine_history.status != QuarantineHistoryStatus.ENDED or not quarantine_history.end_date:
+        return
+    if quarantine_history.end_type not in [QuarantineHistoryEndType.COMPLETED, QuarantineHistoryEndType.HOSPITALIZE]:
+        return
+    if not quarantine_history.quarantine_room:
+        return
+
+    quarantine_ward_id = quarantine_history.quarantine_room.quarantine_floor.quarantine_building.quarantine_ward_id
+    day = get_day_in_vntz(quarantine_history.end_date)
+
+    user_is_counted = QuarantineHistory.objects.filter(
+        user_id=quarantine_history.user_id,
+        status=QuarantineHistoryStatus.ENDED,
+        end_type=quarantine_history.end_type,
+        end_date__gte=get_start_of_day(day),
+        end_date__lt=get_start_of_day(day + datetime.timedelta(days=1)),
+        quarantine_room__quarantine_floor__quarantine_building__quarantine_ward_id=quarantine_ward_id,
+    ).exclude(id=quarantine_history.id).exists()
+    if user_is_counted:
+        return
+
+    if quarantine_history.end_type == QuarantineHistoryEndType.COMPLETED:
+        add_to_ward_daily_stats(quarantine_ward_id, day, num_complete=1)
+    elif quarantine_history.end_type == QuarantineHistoryEndType.HOSPITALIZE:
+        add_to_ward_daily_stats(quarantine_ward_id, day, num_hospitalize=1)
+
+def rebuild_ward_daily_stats(start_day, end_day, quarantine_ward_id=None):
+    """
+    Recalculate all rows of WardDailyStats from start_day to end_day (include both) from members and quarantine histories.
+
+    Return number of rows created
+    """
+
+    start_time = get_start_of_day(start_day)
+    end_time = get_start_of_day(end_day + datetime.timedelta(days=1))
+
+    dict_of_stats = dict()
+
+    def get_stats(key):
+        return dict_of_stats.setdefault(key, {'num_in': 0, 'num_complete': 0, 'num_hospitalize': 0})
+
+    # Calculate number of member 'in' each day of each quarantine ward
+
+    query_set = CustomUser.objects.filter(
+        role__name='MEMBER',
+        quarantine_ward__isnull=False,
+        member_x_custom_user__quarantined_at__gte=start_time,
+        member_x_custom_user__quarantined_at__lt=end_time,
+    )
+    if quarantine_ward_id:
+        query_set = query_set.filter(quarantine_ward__id=quarantine_ward_id)
+
+    query_set = query_set.annotate(
+        day=TruncDate('member_x_custom_user__quarantined_at', tzinfo=vntz),
+    ).values('quarantine_ward', 'day').annotate(number=Count('id')).order_by()
+
+    for item in query_set:
+        get_stats((item['quarantine_ward'], item['day']))['num_in'] = item['number']
+
+    # Calculate number of member 'complete', 'hospitalize' each day of each quarantine ward
+
+    quarantine_ward_path = 'quarantine_room__quarantine_floor__quarantine_building__quarantine_ward'
+
+    query_set = QuarantineHistory.objects.filter(
+        status=QuarantineHistoryStatus.ENDED,
+        end_type__in=[QuarantineHistoryEndType.COMPLETED, QuarantineHistoryEndType.HOSPITALIZE],
+        end_date__gte=start_time,
+        end_date__lt=end_time,
+        quarantine_room__isnull=False,
+    )
+    if quarantine_ward_id:
+        query_set = query_set.filter(**{f'{quarantine_ward_path}__id': quarantine_ward_id})
+
+    query_set = query_set.annotate(
+        day=TruncDate('end_date', tzinfo=vntz),
+    ).values(quarantine_ward_path, 'day').annotate(
+        number_of_complete_members=Count('user', distinct=True, filter=Q(end_type=QuarantineHistoryEndType.COMPLETED)),
+        number_of_hospitalize_members=Count('user', distinct=True, filter=Q(end_type=QuarantineHistoryEndType.HOSPITALIZE)),
+    ).order_by()
+
+    for item in query_set:
+        stats = get_stats((item[quarantine_ward_path], item['day']))
+        stats['num_complete'] = item['number_of_complete_members']
+        stats['num_hospitalize'] = item['number_of_hospitalize_members']
+
+    with transaction.atomic():
+        old_query_set = WardDailyStats.objects.filter(day__gte=start_day, day__lte=end_day)
+        if quarantine_ward_id:
+            old_query_set = old_query_set.filter(quarantine_ward__id=quarantine_ward_id)
+        old_query_set.delete()
+
+        WardDailyStats.objects.bulk_create([
+            WardDailyStats(quarantine_ward_id=key[0], day=key[1], **stats)
+            for key, stats in dict_of_stats.items()
+        ])
+
+    return len(dict_of_stats)
+
+def count_members_in_out_by_day(quarantine_ward_id, days):
+    """
+    Get number of member 'in', 'complete', 'hospitalize' for each day in days from WardDailyStats.
+
+    Return a tuple of 3 dict (in, complete, hospitalize), each is {'YYYY-MM-DD': number}
+    """
+
+    dict_of_in_members = {f'{day}': 0 for day in days}
+    dict_of_complete_members = {f'{day}': 0 for day in days}
+    dict_of_hospitalize_members = {f'{day}': 0 for day in days}
+    if not days:
+        return dict_of_in_members, dict_of_complete_members, dict_of_hospitalize_members
+
+    query_set = WardDailyStats.objects.filter(day__gte=days[0], day__lte=days[-1])
+    if quarantine_ward_id:
+        query_set = query_set.filter(quarantine_ward__id=quarantine_ward_id)
+
+    query_set = query_set.values('day').annotate(
+        sum_in=Sum('num_in'),
+        sum_complete=Sum('num_complete'),
+        sum_hospitalize=Sum('num_hospitalize'),
+    ).order_by()
+
+    for item in query_set:
+        dict_of_in_members[f'{item["day"]}'] = item['sum_in']
+        dict_of_complete_members[f'{item["day"]}'] = item['sum_complete']
+        dict_of_hospitalize_members[f'{item["day"]}'] = item['sum_hospitalize']
+
+    return dict_of_in_members, dict_of_complete_members, dict_of_hospitalize_members
@@ -3,6 +3,7 @@ import django_filters
 from django.db.models import Q
 from django.db.models.query import QuerySet
 from ..models import CustomUser, Member
+from ..search import search_custom_users
 from utils.tools import split_input_list, timestamp_string_to_date_string, compare_date_string
 
 class MemberFilter(django_filters.FilterSet):
@@ -151,13 +152,13 @@ class MemberFilter(django_filters.FilterSet):
     )
 
     quarantine_building_id = django_filters.CharFilter(
-        field_name='member_x_custom_user__quarantine_room__quarantine_floor__quarantine_building__id',
-        lookup_expr='iexact',
+        field_name='member_x_custom_user__quarantine_building__id',
+        lookup_expr='exact',
     )
 
     quarantine_floor_id = django_filters.CharFilter(
-        field_name='member_x_custom_user__quarantine_room__quarantine_floor__id',
-        lookup_expr='iexact',
+        field_name='member_x_custom_user__quarantine_floor__id',
+        lookup_expr='exact',
     )
 
     quarantine_room_id = django_filters.CharFilter(
@@ -201,15 +202,7 @@ class MemberFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method='query_search')
 
     def query_search(self, queryset, name, value):
-        query = (
-            Q(full_name__icontains=value) |
-            Q(full_name__unaccent__icontains=value) |
-            Q(code__iexact=value) |
-            Q(phone_number__iexact=value) |
-            Q(identity_number__iexact=value)
-        )
-        qs = queryset.filter(query)
-        return qs
+        return search_custom_users(queryset, value, ['code', 'phone_number', 'identity_number'])
 
     class Meta:
         model = CustomUser
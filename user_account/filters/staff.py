@@ -5,6 +5,7 @@ import django_filters
 from django.db.models import Q
 from django.db.models.query import QuerySet
 from ..models import CustomUser, Member
+from ..search import search_custom_users
 from utils.tools import split_input_list
 
 class StaffFilter(django_filters.FilterSet):
@@ -129,14 +130,7 @@ class StaffFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method='query_search')
 
     def query_search(self, queryset, name, value):
-        query = (
-            Q(full_name__icontains=value) |
-            Q(full_name__unaccent__icontains=value) |
-            Q(code__iexact=value) |
-            Q(phone_number__iexact=value)
-        )
-        qs = queryset.filter(query)
-        return qs
+        return search_custom_users(queryset, value, ['code', 'phone_number'])
 
     class Meta:
         model = CustomUser
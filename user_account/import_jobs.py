@@ -0,0 +1,153 @@
+import os
+import time
+import datetime
+import logging
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from .models import ImportJob
+from utils import messages
+from utils.enums import ImportJobType, ImportJobStatus
+
+logger = logging.getLogger(__name__)
+
+def create_import_job(type, file, created_by):
+    """Save an uploaded file as a waiting job, worker.py will process it"""
+
+    return ImportJob.objects.create(
+        type=type,
+        file_name=str(file),
+        file_content=file.read(),
+        created_by=created_by,
+    )
+
+class ImportJobLeaseLost(Exception):
+    """Lease of a running job expired and the job was set to failed, its worker must stop"""
+
+def fail_expired_import_jobs():
+    """
+    Set running jobs whose lease expired (their worker died) to failed.
+    They are not run again, rows of chunks already committed would be imported twice.
+
+    Return number of failed jobs
+    """
+
+    time_now = timezone.now()
+    return ImportJob.objects.filter(
+        status=ImportJobStatus.RUNNING,
+        lease_expires_at__lt=time_now,
+    ).update(
+        status=ImportJobStatus.FAILED,
+        message=messages.IMPORT_JOB_WORKER_STOPPED,
+        file_content=None,
+        finished_at=time_now,
+        updated_at=time_now,
+    )
+
+def claim_import_job(lease_seconds):
+    """
+    Set expired running jobs to failed, then take the oldest waiting job and set it to running until the end of the lease.
+    Rows of jobs taken by other workers are skipped, so many workers can run at the same time.
+
+    Return ImportJob or None
+    """
+
+    fail_expired_import_jobs()
+
+    with transaction.atomic():
+        import_job = ImportJob.objects.select_for_update(skip_locked=True).filter(
+            status=ImportJobStatus.WAITING,
+        ).order_by('id').first()
+        if not import_job:
+            return None
+
+        time_now = timezone.now()
+        import_job.status = ImportJobStatus.RUNNING
+        import_job.started_at = time_now
+        import_job.lease_expires_at = time_now + datetime.timedelta(seconds=lease_seconds)
+        import_job.save(update_fields=['status', 'started_at', 'lease_expires_at', 'updated_at'])
+    return import_job
+
+def update_import_job_progress(import_job, num_processed, result_ids, error, lease_seconds):
+    """
+    Save progress of a running job, so it can be polled while the file is being processed, and renew its lease.
+    error: dict {row: error message}, in the order they are found
+    Raise ImportJobLeaseLost if the job is not running any more (its lease expired before)
+    """
+
+    time_now = timezone.now()
+    import_job.num_processed = num_processed
+    import_job.num_succeeded = len(result_ids)
+    import_job.num_failed = len(error)
+    import_job.errors = [[row, message] for row, message in error.items()]
+    import_job.result_ids = result_ids
+    import_job.lease_expires_at = time_now + datetime.timedelta(seconds=lease_seconds)
+
+    fields = ['num_processed', 'num_succeeded', 'num_failed', 'errors', 'result_ids', 'lease_expires_at']
+    is_updated = ImportJob.objects.filter(id=import_job.id, status=ImportJobStatus.RUNNING).update(
+        updated_at=time_now,
+        **{field: getattr(import_job, field) for field in fields},
+    )
+    if not is_updated:
+        raise ImportJobLeaseLost(f'Import job {import_job.id} is not running any more')
+
+def run_import_job(import_job, lease_seconds):
+    """Process the file of a running job, then set it to done (or failed if the whole file cannot be processed)"""
+
+    # import here, views import this module
+    from .views import MemberAPI
+    from form.views import TestAPI
+
+    file = SimpleUploadedFile(import_job.file_name, bytes(import_job.file_content))
+
+    def on_progress(num_processed, result_ids, error):
+        update_import_job_progress(import_job, num_processed, result_ids, error, lease_seconds)
+
+    try:
+        if import_job.type == ImportJobType.MEMBER:
+            result_ids, error = MemberAPI().import_members_from_file(file, import_job.created_by, on_progress)
+        else:
+            result_ids, error = TestAPI().import_tests_from_file(file, import_job.created_by, on_progress)
+
+        update_import_job_progress(import_job, import_job.num_processed, result_ids, error, lease_seconds)
+        import_job.status = ImportJobStatus.DONE
+    except ImportJobLeaseLost:
+        logger.warning('Import job %s was set to failed after its lease expired, stop it', import_job.id)
+        return
+    except Exception as exception:
+        logger.exception('Import job %s failed', import_job.id)
+        import_job.message = str(exception)
+        import_job.status = ImportJobStatus.FAILED
+
+    time_now = timezone.now()
+    # a job set to failed after its lease expired is not changed
+    ImportJob.objects.filter(id=import_job.id, status=ImportJobStatus.RUNNING).update(
+        status=import_job.status,
+        message=import_job.message,
+        file_content=None,
+        finished_at=time_now,
+        updated_at=time_now,
+    )
+
+def run_import_worker():
+    """
+    Process waiting jobs one by one, wait IMPORT_JOB_POLL_SECONDS when there is no job.
+    Lease of a job is renewed for IMPORT_JOB_LEASE_SECONDS each time its progress is saved.
+    An error (database restarted, ...) is logged and the worker keeps polling,
+    a job left running is set to failed after its lease expires.
+    """
+
+    poll_seconds = int(os.environ.get('IMPORT_JOB_POLL_SECONDS', 5))
+    lease_seconds = int(os.environ.get('IMPORT_JOB_LEASE_SECONDS', 600))
+    while True:
+        try:
+            import_job = claim_import_job(lease_seconds)
+            if import_job:
+                run_import_job(import_job, lease_seconds)
+            else:
+                time.sleep(poll_seconds)
+        except Exception as exception:
+            logger.exception('Import worker failed: %s', exception)
+            # connections broken by the error are closed, a new one is opened by the next query
+            close_old_connections()
+            time.sleep(poll_seconds)
@@ -0,0 +1,55 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from user_account.models import CustomUser
+from role.models import Role
+from utils.tools import get_default_password_hash
+
+class Command(BaseCommand):
+    help = 'Compare time of creating accounts with the default password as the member import does, when the password is hashed for each row and when one hash is made for the batch, created rows are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number_of_rows', type=int, default=100, help='Number of accounts created each way (default is 100)')
+
+    def create_accounts(self, number_of_rows, phone_prefix, role, set_password):
+        start_time = time.perf_counter()
+        custom_users = []
+        for index in range(number_of_rows):
+            custom_user = CustomUser(phone_number=f'{phone_prefix}{index:06d}', full_name=f'Benchmark {index}', role=role)
+            set_password(custom_user)
+            custom_users += [custom_user]
+        CustomUser.objects.bulk_create(custom_users)
+        return time.perf_counter() - start_time, custom_users[0]
+
+    def handle(self, *args, **options):
+        number_of_rows = options['number_of_rows']
+        if number_of_rows <= 0 or number_of_rows > 999999:
+            raise CommandError('number_of_rows must be from 1 to 999999')
+
+        with transaction.atomic():
+            role, _ = Role.objects.get_or_create(name='MEMBER')
+
+            def hash_for_each_row(custom_user):
+                custom_user.set_password('123456')
+
+            password_hash = None
+
+            def reuse_one_hash(custom_user):
+                nonlocal password_hash
+                if password_hash is None:
+                    password_hash = get_default_password_hash()
+                custom_user.password = password_hash
+
+            # phone numbers must be unique, each way has its own
+            before_time, before_custom_user = self.create_accounts(number_of_rows, '0910', role, hash_for_each_row)
+            after_time, after_custom_user = self.create_accounts(number_of_rows, '0920', role, reuse_one_hash)
+
+            transaction.set_rollback(True)
+
+        if not (before_custom_user.check_password('123456') and after_custom_user.check_password('123456')):
+            raise CommandError('Created accounts do not accept the default password')
+
+        self.stdout.write(f'Rows: {number_of_rows}')
+        self.stdout.write(f'Password hashed for each row: {before_time:.2f} s, {before_time / number_of_rows * 1000:.2f} ms per row')
+        self.stdout.write(f'One password hash for the batch: {after_time:.2f} s, {after_time / number_of_rows * 1000:.2f} ms per row (first hash included)')
+        self.stdout.write(f'Speedup: {before_time / after_time:.1f}x')
@@ -0,0 +1,100 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from user_account.models import CustomUser, Member
+from user_account.serializers import FilterMemberSerializer, FilterMemberValuesSerializer
+from quarantine_ward.models import QuarantineWard, QuarantineBuilding, QuarantineFloor, QuarantineRoom
+from role.models import Role
+
+class Command(BaseCommand):
+    help = 'Compare time per row of FilterMemberSerializer and FilterMemberValuesSerializer (query and serialize) on members of the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number_of_members', type=int, default=1000, help='Number of members to serialize (default is 1000)')
+        parser.add_argument('--seed', action='store_true', help='Create number_of_members members first, they are rolled back at the end')
+        parser.add_argument('--repeat', type=int, default=3, help='Run each way this number of times, the best time is reported (default is 3)')
+
+    def seed_members(self, number_of_members):
+        role, _ = Role.objects.get_or_create(name='MEMBER')
+        quarantine_ward = QuarantineWard.objects.create(full_name='Benchmark')
+        quarantine_building = QuarantineBuilding.objects.create(name='Benchmark', quarantine_ward=quarantine_ward)
+        quarantine_floor = QuarantineFloor.objects.create(name='Benchmark', quarantine_building=quarantine_building)
+        quarantine_rooms = QuarantineRoom.objects.bulk_create([
+            QuarantineRoom(name=f'Benchmark {index}', capacity=4, quarantine_floor=quarantine_floor)
+            for index in range((number_of_members + 3) // 4)
+        ])
+
+        custom_users = CustomUser.objects.bulk_create([
+            CustomUser(
+                phone_number=f'bench{index:09d}',
+                full_name=f'Benchmark {index}',
+                role=role,
+                quarantine_ward=quarantine_ward,
+            )
+            for index in range(number_of_members)
+        ])
+        Member.objects.bulk_create([
+            Member(
+                custom_user=custom_user,
+                quarantine_room=quarantine_rooms[index // 4],
+                quarantine_floor=quarantine_floor,
+                quarantine_building=quarantine_building,
+                quarantine_ward=quarantine_ward,
+            )
+            for index, custom_user in enumerate(custom_users)
+        ])
+        return custom_users
+
+    def get_best_time(self, function, repeat):
+        best_time = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            data = function()
+            run_time = time.perf_counter() - start_time
+            best_time = run_time if best_time is None else min(best_time, run_time)
+        return best_time, data
+
+    def handle(self, *args, **options):
+        number_of_members = options['number_of_members']
+        if number_of_members <= 0 or options['repeat'] <= 0:
+            raise CommandError('number_of_members and repeat must be positive')
+
+        with transaction.atomic():
+            if options['seed']:
+                custom_users = self.seed_members(number_of_members)
+                query_set = CustomUser.objects.filter(id__in=[custom_user.id for custom_user in custom_users])
+            else:
+                query_set = CustomUser.objects.filter(role__name='MEMBER')
+            query_set = query_set.order_by('id')
+
+            def serialize_by_model():
+                rows = query_set.select_related(
+                    'member_x_custom_user__quarantine_room',
+                    'member_x_custom_user__quarantine_floor',
+                    'member_x_custom_user__quarantine_building',
+                    'quarantine_ward',
+                )[:number_of_members]
+                return FilterMemberSerializer(rows, many=True).data
+
+            def serialize_by_values():
+                rows = FilterMemberValuesSerializer.values(query_set)[:number_of_members]
+                return FilterMemberValuesSerializer(rows, many=True).data
+
+            model_time, model_data = self.get_best_time(serialize_by_model, options['repeat'])
+            values_time, values_data = self.get_best_time(serialize_by_values, options['repeat'])
+
+            transaction.set_rollback(True)
+
+        number_of_rows = len(model_data)
+        if not number_of_rows:
+            raise CommandError('No member to serialize, use --seed')
+
+        is_same_json = json.dumps(model_data, cls=DjangoJSONEncoder) == json.dumps(values_data, cls=DjangoJSONEncoder)
+
+        self.stdout.write(f'Rows: {number_of_rows}')
+        self.stdout.write(f'FilterMemberSerializer: {model_time * 1000:.1f} ms, {model_time / number_of_rows * 1e6:.1f} us per row')
+        self.stdout.write(f'FilterMemberValuesSerializer: {values_time * 1000:.1f} ms, {values_time / number_of_rows * 1e6:.1f} us per row')
+        self.stdout.write(f'Speedup: {model_time / values_time:.1f}x')
+        self.stdout.write(f'Same JSON: {is_same_json}')
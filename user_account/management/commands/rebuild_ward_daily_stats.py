@@ -0,0 +1,31 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from user_account.dashboard import rebuild_ward_daily_stats, get_day_in_vntz
+
+class Command(BaseCommand):
+    help = 'Recalculate WardDailyStats (number of member in / complete / hospitalize each day) for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="Start day 'dd/mm/yyyy' (default is 30 days ago)")
+        parser.add_argument('--end', help="End day 'dd/mm/yyyy' (default is today)")
+        parser.add_argument('--quarantine_ward_id', type=int, help='Only rebuild this quarantine ward')
+
+    def parse_day(self, value, name):
+        try:
+            return datetime.datetime.strptime(value, '%d/%m/%Y').date()
+        except ValueError:
+            raise CommandError(f"{name} must be 'dd/mm/yyyy'")
+
+    def handle(self, *args, **options):
+        today = get_day_in_vntz(timezone.now())
+
+        end_day = self.parse_day(options['end'], 'end') if options['end'] else today
+        start_day = self.parse_day(options['start'], 'start') if options['start'] else end_day - datetime.timedelta(days=30)
+
+        if start_day > end_day:
+            raise CommandError('start must be before end')
+
+        number_of_rows = rebuild_ward_daily_stats(start_day, end_day, options['quarantine_ward_id'])
+
+        self.stdout.write(f'Rebuilt WardDailyStats from {start_day} to {end_day}: {number_of_rows} rows')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from user_account.counters import reconcile_counters
+
+class Command(BaseCommand):
+    help = 'Check counters (num_current_member of rooms / floors / buildings / quarantine wards, num_care_member of staffs, number_of_vaccine_doses) and repair wrong values'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry_run', action='store_true', help='Only report wrong counters, do not repair')
+
+    def handle(self, *args, **options):
+        result = reconcile_counters(dry_run=options['dry_run'])
+
+        for name, number_of_wrong_rows in result.items():
+            self.stdout.write(f'{name}: {number_of_wrong_rows} wrong rows')
+
+        if options['dry_run']:
+            self.stdout.write('Dry run, nothing is repaired')
+        else:
+            self.stdout.write('Repaired all wrong counters')
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+def forwards_func(apps, schema_editor):
+    # fill num_care_member of staffs that exist before this migration
+    Staff = apps.get_model('user_account', 'Staff')
+    db_alias = schema_editor.connection.alias
+    dict_of_ids = dict()
+    for row in Staff.objects.using(db_alias).annotate(count=Count('custom_user__member_x_care_staff')).filter(count__gt=0).values('id', 'count'):
+        dict_of_ids.setdefault(row['count'], []).append(row['id'])
+    for count, ids in dict_of_ids.items():
+        Staff.objects.using(db_alias).filter(id__in=ids).update(num_care_member=count)
+
+def reverse_func(apps, schema_editor):
+    ...
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0048_alter_member_label'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staff',
+            name='num_care_member',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+    ]
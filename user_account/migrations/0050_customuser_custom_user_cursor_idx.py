@@ -0,0 +1,17 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0049_staff_num_care_member'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['created_at', 'id'], name='custom_user_cursor_idx'),
+        ),
+    ]
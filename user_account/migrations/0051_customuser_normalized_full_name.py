@@ -0,0 +1,35 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:46
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from utils.tools import normalize_name
+
+
+def set_normalized_full_name(apps, schema_editor):
+    CustomUser = apps.get_model('user_account', 'CustomUser')
+    custom_users = list(CustomUser.objects.only('id', 'full_name'))
+    for custom_user in custom_users:
+        custom_user.normalized_full_name = normalize_name(custom_user.full_name)
+    CustomUser.objects.bulk_update(custom_users, ['normalized_full_name'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0050_customuser_custom_user_cursor_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='customuser',
+            name='normalized_full_name',
+            field=models.CharField(blank=True, default='', max_length=256),
+        ),
+        migrations.RunPython(set_normalized_full_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['normalized_full_name'], name='custom_user_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0051_customuser_normalized_full_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='destinationhistory',
+            index=models.Index(fields=['city', 'start_time'], name='destination_city_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='destinationhistory',
+            index=models.Index(fields=['district', 'start_time'], name='destination_district_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='destinationhistory',
+            index=models.Index(fields=['ward', 'start_time'], name='destination_ward_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['quarantine_room', 'positive_test_now'], name='member_room_positive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['quarantined_status', 'quarantined_finish_expected_at'], name='member_status_finish_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(condition=models.Q(('positive_test_now', True)), fields=['quarantine_room'], name='member_positive_room_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quarantinehistory',
+            index=models.Index(fields=['user', 'status', 'start_date'], name='qt_history_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quarantinehistory',
+            index=models.Index(condition=models.Q(('status', 'PRESENT')), fields=['user'], name='qt_history_present_user_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:48
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def set_location_of_members(apps, schema_editor):
+    Member = apps.get_model('user_account', 'Member')
+    QuarantineRoom = apps.get_model('quarantine_ward', 'QuarantineRoom')
+    room = QuarantineRoom.objects.filter(id=OuterRef('quarantine_room_id'))
+    Member.objects.filter(quarantine_room__isnull=False).update(
+        quarantine_floor=Subquery(room.values('quarantine_floor')[:1]),
+        quarantine_building=Subquery(room.values('quarantine_floor__quarantine_building')[:1]),
+        quarantine_ward=Subquery(room.values('quarantine_floor__quarantine_building__quarantine_ward')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quarantine_ward', '0008_auto_20261018_1438'),
+        ('user_account', '0052_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='quarantine_building',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='member_x_quarantine_building', to='quarantine_ward.quarantinebuilding'),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='quarantine_floor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='member_x_quarantine_floor', to='quarantine_ward.quarantinefloor'),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='quarantine_ward',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='member_x_quarantine_ward', to='quarantine_ward.quarantineward'),
+        ),
+        migrations.RunPython(set_location_of_members, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.7 on 2026-10-18 07:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_account', '0053_member_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('MEMBER', 'Member'), ('TEST', 'Test')], max_length=32)),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='WAITING', max_length=32)),
+                ('file_name', models.CharField(max_length=256)),
+                ('file_content', models.BinaryField(blank=True, null=True)),
+                ('num_processed', models.IntegerField(default=0)),
+                ('num_succeeded', models.IntegerField(default=0)),
+                ('num_failed', models.IntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('result_ids', models.JSONField(default=list)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_job_x_created_by', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,8 +1,9 @@
 import os
 from random import randint
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
-from django.db import models
-from django.db.models import Q
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models, transaction
+from django.db.models import Q, DEFERRED
 from address.models import Country, City, District, Ward
 from role.models import Role
 from utils.enums import (
@@ -14,8 +15,12 @@ from utils.enums import (
     QuarantineHistoryStatus,
     QuarantineHistoryEndType,
     Professional,
+    ImportJobType,
+    ImportJobStatus,
 )
 from utils import validators
+from utils.tools import normalize_name
+from utils.models import AbstractCounterModel
 
 def user_code_generator():
     return ''.join(str(randint(0, 9)) for i in range(int(os.environ.get("USER_CODE_LENGTH", '15'))))
@@ -68,6 +73,14 @@ class CustomUser(AbstractBaseUser):
     USERNAME_FIELD = 'phone_number'
     REQUIRED_FIELDS = [] # Phone number & Password are required by default.
 
+    class Meta:
+        indexes = [
+            # cursor pagination order by (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='custom_user_cursor_idx'),
+            # search by name without accent (LIKE '%...%')
+            GinIndex(fields=['normalized_full_name'], opclasses=['gin_trgm_ops'], name='custom_user_name_trgm_idx'),
+        ]
+
     code = models.CharField(
         max_length=18,
         unique=True,
@@ -85,6 +98,9 @@ class CustomUser(AbstractBaseUser):
 
     full_name = models.CharField(max_length=256, null=False)
 
+    # full_name in lowercase without accent, set when saving
+    normalized_full_name = models.CharField(max_length=256, null=False, blank=True, default='')
+
     phone_number = models.CharField(max_length=16, unique=True, null=False)
 
     birthday = models.CharField(max_length=10, null=True, blank=True)
@@ -198,7 +214,24 @@ class CustomUser(AbstractBaseUser):
         blank=True,
     )
 
-class Member(models.Model):
+    def save(self, *args, **kwargs):
+        self.normalized_full_name = normalize_name(self.full_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'full_name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_full_name'}
+        super().save(*args, **kwargs)
+
+class Member(AbstractCounterModel):
+
+    counter_fields = ['number_of_vaccine_doses']
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quarantine_room', 'positive_test_now'], name='member_room_positive_idx'),
+            models.Index(fields=['quarantined_status', 'quarantined_finish_expected_at'], name='member_status_finish_idx'),
+            # few members are positive, rooms of positive members
+            models.Index(fields=['quarantine_room'], condition=Q(positive_test_now=True), name='member_positive_room_idx'),
+        ]
 
     custom_user = models.OneToOneField(
         to=CustomUser,
@@ -272,28 +305,58 @@ class Member(models.Model):
         blank=True,
     )
 
-    @property
-    def quarantine_floor(self):
-        if self.quarantine_room:
-            return self.quarantine_room.quarantine_floor
-        else:
-            return None
+    # floor, building, quarantine ward of quarantine_room, set when saving
+    quarantine_floor = models.ForeignKey(
+        to='quarantine_ward.QuarantineFloor',
+        on_delete=models.SET_NULL,
+        related_name='member_x_quarantine_floor',
+        null=True,
+        blank=True,
+    )
+
+    quarantine_building = models.ForeignKey(
+        to='quarantine_ward.QuarantineBuilding',
+        on_delete=models.SET_NULL,
+        related_name='member_x_quarantine_building',
+        null=True,
+        blank=True,
+    )
+
+    quarantine_ward = models.ForeignKey(
+        to='quarantine_ward.QuarantineWard',
+        on_delete=models.SET_NULL,
+        related_name='member_x_quarantine_ward',
+        null=True,
+        blank=True,
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # keep loaded values (DEFERRED if not loaded), to update counters when saving
+        instance._loaded_quarantine_room_id = instance.__dict__.get('quarantine_room_id', DEFERRED)
+        instance._loaded_care_staff_id = instance.__dict__.get('care_staff_id', DEFERRED)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # import here, counters imports quarantine_ward.models which imports this module
+        from .counters import update_counters_of_members, set_location_of_members
 
-    @property
-    def quarantine_building(self):
-        if self.quarantine_floor:
-            return self.quarantine_floor.quarantine_building
-        else:
-            return None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'quarantine_room' in update_fields:
+            if self.quarantine_room_id != getattr(self, '_loaded_quarantine_room_id', None) or \
+            (self.quarantine_room_id and not self.quarantine_floor_id):
+                set_location_of_members([self])
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'quarantine_floor', 'quarantine_building', 'quarantine_ward'}
 
-    @property
-    def quarantine_ward(self):
-        if self.quarantine_building:
-            return self.quarantine_building.quarantine_ward
-        else:
-            return None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            update_counters_of_members([self], fields=kwargs.get('update_fields'))
 
-class Manager(models.Model):
+class Manager(AbstractCounterModel):
+
+    counter_fields = ['number_of_vaccine_doses']
 
     custom_user = models.OneToOneField(
         to=CustomUser,
@@ -320,7 +383,9 @@ class Manager(models.Model):
 
     number_of_vaccine_doses = models.DecimalField(max_digits=2, decimal_places=0, default=0)
 
-class Staff(models.Model):
+class Staff(AbstractCounterModel):
+
+    counter_fields = ['number_of_vaccine_doses', 'num_care_member']
 
     custom_user = models.OneToOneField(
         to=CustomUser,
@@ -349,8 +414,18 @@ class Staff(models.Model):
 
     care_area = models.TextField(null=True, blank=True)
 
+    # number of members having this staff as care_staff, maintained by user_account.counters
+    num_care_member = models.IntegerField(default=0, null=False)
+
 class DestinationHistory(models.Model):
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', 'start_time'], name='destination_city_time_idx'),
+            models.Index(fields=['district', 'start_time'], name='destination_district_time_idx'),
+            models.Index(fields=['ward', 'start_time'], name='destination_ward_time_idx'),
+        ]
+
     user = models.ForeignKey(
         to=CustomUser,
         on_delete=models.CASCADE,
@@ -400,6 +475,13 @@ class DestinationHistory(models.Model):
 
 class QuarantineHistory(models.Model):
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status', 'start_date'], name='qt_history_user_status_idx'),
+            # each user has at most one PRESENT quarantine history
+            models.Index(fields=['user'], condition=Q(status=QuarantineHistoryStatus.PRESENT), name='qt_history_present_user_idx'),
+        ]
+
     user = models.ForeignKey(
         to=CustomUser,
         on_delete=models.CASCADE,
@@ -470,3 +552,57 @@ class QuarantineHistory(models.Model):
         null=True,
         blank=True,
     )
+
+class ImportJob(models.Model):
+    """An imported file (members or tests), processed by worker.py in background"""
+
+    type = models.CharField(
+        max_length=32,
+        choices=ImportJobType.choices,
+        null=False,
+    )
+
+    status = models.CharField(
+        max_length=32,
+        choices=ImportJobStatus.choices,
+        default=ImportJobStatus.WAITING,
+        null=False,
+    )
+
+    file_name = models.CharField(max_length=256, null=False)
+
+    # content of the uploaded file, kept in database so worker can run on another machine, cleared when job is finished
+    file_content = models.BinaryField(null=True, blank=True)
+
+    num_processed = models.IntegerField(null=False, default=0)
+
+    num_succeeded = models.IntegerField(null=False, default=0)
+
+    num_failed = models.IntegerField(null=False, default=0)
+
+    # list of [row, error message], in the order they are found
+    errors = models.JSONField(null=False, default=list)
+
+    # ids of created users or tests
+    result_ids = models.JSONField(null=False, default=list)
+
+    message = models.TextField(null=True, blank=True)
+
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    # a running job whose worker does not renew it before this time (worker died) is set to failed
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, auto_now=False)
+
+    created_by = models.ForeignKey(
+        to='user_account.CustomUser',
+        on_delete=models.SET_NULL,
+        related_name='import_job_x_created_by',
+        null=True,
+        blank=True,
+    )
+
+    updated_at = models.DateTimeField(auto_now_add=False, auto_now=True)
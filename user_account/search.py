@@ -0,0 +1,29 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Q
+from utils.tools import normalize_name
+
+def search_custom_users(queryset, value, identifier_fields):
+    """
+    Search a query set of CustomUser by value.
+
+    Exact match of an identifier (code, phone_number, ...) is tried first (unique index),
+    if there is any, only these users are returned.
+    Else return users whose normalized_full_name contains value without accent (pg_trgm GIN index),
+    most similar names first.
+    """
+
+    query = Q()
+    for field in identifier_fields:
+        query |= Q(**{field: value})
+
+    exact_queryset = queryset.filter(query)
+    if exact_queryset.exists():
+        return exact_queryset
+
+    normalized_value = normalize_name(value)
+
+    return queryset.filter(
+        normalized_full_name__contains=normalized_value,
+    ).annotate(
+        search_rank=TrigramSimilarity('normalized_full_name', normalized_value),
+    ).order_by('-search_rank', *queryset.query.order_by)
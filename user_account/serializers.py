@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CustomUser, Member, Manager, Staff, DestinationHistory, QuarantineHistory
+from .models import CustomUser, Member, Manager, Staff, DestinationHistory, QuarantineHistory, ImportJob
 from address.serializers import (
     BaseCountrySerializer, BaseCitySerializer,
     BaseDistrictSerializer, BaseWardSerializer,
@@ -205,6 +205,85 @@ class FilterMemberSerializer(serializers.ModelSerializer):
             'last_tested_had_result', 'label', 'number_of_vaccine_doses',
         ]
 
+class FilterMemberValuesSerializer:
+    """
+    Same output as FilterMemberSerializer for long member lists, without DRF fields.
+    Use values(query_set) to select only needed columns (one query with joins),
+    then FilterMemberValuesSerializer(rows, many=True).data build output dicts directly from these rows.
+    """
+
+    member_path = 'member_x_custom_user'
+    room_path = f'{member_path}__quarantine_room'
+    floor_path = f'{member_path}__quarantine_floor'
+    building_path = f'{member_path}__quarantine_building'
+    ward_path = 'quarantine_ward'
+
+    value_fields = [
+        'id', 'code', 'status', 'full_name', 'gender', 'birthday', 'phone_number', 'created_at',
+        f'{room_path}__id', f'{room_path}__name',
+        f'{floor_path}__id', f'{floor_path}__name',
+        f'{building_path}__id', f'{building_path}__name',
+        f'{ward_path}__id', f'{ward_path}__full_name', f'{ward_path}__image',
+        f'{member_path}__quarantined_status', f'{member_path}__quarantined_at',
+        f'{member_path}__quarantined_finish_expected_at', f'{member_path}__quarantined_finished_at',
+        f'{member_path}__health_status', f'{member_path}__positive_test_now',
+        f'{member_path}__last_tested', f'{member_path}__last_tested_had_result',
+        f'{member_path}__label', f'{member_path}__number_of_vaccine_doses',
+    ]
+
+    @classmethod
+    def values(cls, query_set):
+        return query_set.values(*cls.value_fields)
+
+    def __init__(self, instance, many=True):
+        self.instance = instance
+
+    @classmethod
+    def get_id_name(cls, row, path):
+        if row[f'{path}__id'] is None:
+            return None
+        return {'id': row[f'{path}__id'], 'name': row[f'{path}__name']}
+
+    @classmethod
+    def to_representation(cls, row):
+        member_path = cls.member_path
+        ward = None
+        if row[f'{cls.ward_path}__id'] is not None:
+            ward = {
+                'id': row[f'{cls.ward_path}__id'],
+                'full_name': row[f'{cls.ward_path}__full_name'],
+                'image': row[f'{cls.ward_path}__image'],
+            }
+
+        # same order of fields as FilterMemberSerializer
+        return {
+            'code': row['code'],
+            'status': row['status'],
+            'quarantined_status': row[f'{member_path}__quarantined_status'],
+            'full_name': row['full_name'],
+            'gender': row['gender'],
+            'birthday': row['birthday'],
+            'quarantine_room': cls.get_id_name(row, cls.room_path),
+            'phone_number': row['phone_number'],
+            'created_at': timestamp_string_to_date_string(str(row['created_at'])),
+            'quarantined_at': row[f'{member_path}__quarantined_at'],
+            'quarantined_finish_expected_at': row[f'{member_path}__quarantined_finish_expected_at'],
+            'quarantined_finished_at': row[f'{member_path}__quarantined_finished_at'],
+            'quarantine_floor': cls.get_id_name(row, cls.floor_path),
+            'quarantine_building': cls.get_id_name(row, cls.building_path),
+            'quarantine_ward': ward,
+            'health_status': row[f'{member_path}__health_status'],
+            'positive_test_now': row[f'{member_path}__positive_test_now'],
+            'last_tested': row[f'{member_path}__last_tested'],
+            'last_tested_had_result': row[f'{member_path}__last_tested_had_result'],
+            'label': row[f'{member_path}__label'],
+            'number_of_vaccine_doses': row[f'{member_path}__number_of_vaccine_doses'],
+        }
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.instance]
+
 class FilterNotMemberSerializer(serializers.ModelSerializer):
 
     role = RoleSerializer(many=False)
@@ -381,3 +460,14 @@ class QuarantineHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = QuarantineHistory
         fields = '__all__'
+
+class ImportJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'type', 'status', 'file_name',
+            'num_processed', 'num_succeeded', 'num_failed',
+            'message', 'started_at', 'finished_at',
+            'created_at', 'updated_at',
+        ]
@@ -1,3 +1,912 @@
-from django.test import TestCase
+import datetime
+import importlib
+import json
+import threading
+from unittest import mock
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from .models import CustomUser, Member, Staff, QuarantineHistory, DestinationHistory, ImportJob
+from form.models import Test, TestState, MedicalDeclaration
+from form.positivity import update_test_state, rebuild_test_states
+from form.views import TestAPI
+from . import counters, import_jobs
+from .counters import add_to_counter, update_number_of_vaccine_doses, reconcile_counters
+from .serializers import FilterMemberSerializer, FilterMemberValuesSerializer
+from .views import MemberAPI
+from .import_jobs import claim_import_job, update_import_job_progress, run_import_worker, ImportJobLeaseLost
+from .dashboard import (
+    get_day_in_vntz, update_ward_daily_stats_of_ended_quarantine_history,
+    rebuild_ward_daily_stats,
+)
+from role.models import Role
+from address.models import Country, City, District, Ward
+from quarantine_ward.models import (
+    QuarantineWard, QuarantineBuilding,
+    QuarantineFloor, QuarantineRoom, WardDailyStats,
+)
+from utils import messages
+from utils.tools import get_default_password_hash
+from utils.views import paginate_data, paginate_data_by_cursor
+from quarantine_ward.occupancy import annotate_total_capacity, filter_by_is_full
+from utils.enums import (
+    CustomUserStatus, MemberLabel, HealthStatus, MemberQuarantinedStatus,
+    QuarantineHistoryStatus, QuarantineHistoryEndType, TestResult, TestType,
+    ImportJobType, ImportJobStatus,
+)
 
 # Create your tests here.
+
+def create_roles():
+    return {
+        name: Role.objects.get_or_create(name=name)[0]
+        for name in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF', 'MEMBER']
+    }
+
+def create_address():
+    country = Country.objects.create(code='VNM', name='Việt Nam')
+    city = City.objects.create(name='Hồ Chí Minh', country=country)
+    district = District.objects.create(name='Quận 1', city=city)
+    ward = Ward.objects.create(name='Phường Bến Nghé', district=district)
+    return {'nationality': country, 'country': country, 'city': city, 'district': district, 'ward': ward}
+
+def create_quarantine_ward(number_of_rooms=1, capacity=4):
+    """Create a quarantine ward with one building, one floor and number_of_rooms rooms"""
+
+    quarantine_ward = QuarantineWard.objects.create(full_name='Khu cách ly')
+    quarantine_building = QuarantineBuilding.objects.create(name='Tòa 1', quarantine_ward=quarantine_ward)
+    quarantine_floor = QuarantineFloor.objects.create(name='Tầng 1', quarantine_building=quarantine_building)
+    quarantine_rooms = [
+        QuarantineRoom.objects.create(name=f'Phòng {index}', capacity=capacity, quarantine_floor=quarantine_floor)
+        for index in range(number_of_rooms)
+    ]
+    return quarantine_ward, quarantine_rooms
+
+def create_user(role, phone_number, **kwargs):
+    return CustomUser.objects.create(
+        phone_number=phone_number,
+        full_name=f'Người dùng {phone_number}',
+        role=role,
+        **kwargs,
+    )
+
+def create_member(role, phone_number, address, quarantine_ward, quarantine_room=None, status=CustomUserStatus.AVAILABLE):
+    custom_user = create_user(role, phone_number, status=status, quarantine_ward=quarantine_ward, **address)
+    Member.objects.create(custom_user=custom_user, label=MemberLabel.F1, quarantine_room=quarantine_room)
+    return custom_user
+
+class WardDailyStatsTest(TestCase):
+
+    def setUp(self):
+        roles = create_roles()
+        quarantine_ward, quarantine_rooms = create_quarantine_ward()
+        self.quarantine_ward = quarantine_ward
+        self.quarantine_room = quarantine_rooms[0]
+        self.custom_user = create_member(roles['MEMBER'], '0900000001', create_address(), quarantine_ward)
+
+    def end_quarantine_history(self, end_date, end_type):
+        quarantine_history = QuarantineHistory.objects.create(
+            user=self.custom_user,
+            quarantine_ward=self.quarantine_ward,
+            quarantine_room=self.quarantine_room,
+            status=QuarantineHistoryStatus.ENDED,
+            start_date=end_date - datetime.timedelta(days=1),
+            end_date=end_date,
+            end_type=end_type,
+        )
+        update_ward_daily_stats_of_ended_quarantine_history(quarantine_history)
+
+    def get_stats(self):
+        return list(WardDailyStats.objects.order_by('day').values_list('day', 'num_complete', 'num_hospitalize'))
+
+    def test_user_is_counted_once_per_day_as_rebuild(self):
+        end_date = timezone.now()
+        day = get_day_in_vntz(end_date)
+
+        self.end_quarantine_history(end_date - datetime.timedelta(minutes=2), QuarantineHistoryEndType.COMPLETED)
+        self.end_quarantine_history(end_date - datetime.timedelta(minutes=1), QuarantineHistoryEndType.COMPLETED)
+        self.end_quarantine_history(end_date, QuarantineHistoryEndType.HOSPITALIZE)
+
+        incremental_stats = self.get_stats()
+        self.assertEqual(incremental_stats, [(day, 1, 1)])
+
+        rebuild_ward_daily_stats(day, day)
+        self.assertEqual(self.get_stats(), incremental_stats)
+
+class CounterSaveTest(TestCase):
+
+    def setUp(self):
+        self.roles = create_roles()
+        self.quarantine_ward, quarantine_rooms = create_quarantine_ward()
+        self.quarantine_room = quarantine_rooms[0]
+
+    def test_full_save_keeps_counter_updated_after_loading(self):
+        quarantine_room = QuarantineRoom.objects.get(id=self.quarantine_room.id)
+        quarantine_ward = QuarantineWard.objects.get(id=self.quarantine_ward.id)
+
+        # committed by another request after these instances were loaded
+        add_to_counter(QuarantineRoom, 'num_current_member', {quarantine_room.id: 2})
+        add_to_counter(QuarantineWard, 'num_current_member', {quarantine_ward.id: 2})
+
+        quarantine_room.capacity = 6
+        quarantine_room.save()
+        quarantine_ward.full_name = 'Khu cách ly mới'
+        quarantine_ward.save()
+
+        quarantine_room.refresh_from_db()
+        quarantine_ward.refresh_from_db()
+        self.assertEqual((quarantine_room.capacity, quarantine_room.num_current_member), (6, 2))
+        self.assertEqual((quarantine_ward.full_name, quarantine_ward.num_current_member), ('Khu cách ly mới', 2))
+
+    def test_full_save_of_member_and_staff_keeps_counters(self):
+        custom_user = create_member(self.roles['MEMBER'], '0900000001', create_address(), self.quarantine_ward)
+        staff_user = create_user(self.roles['STAFF'], '0900000002', quarantine_ward=self.quarantine_ward)
+        Staff.objects.create(custom_user=staff_user)
+
+        member = Member.objects.get(custom_user=custom_user)
+        staff = Staff.objects.get(custom_user=staff_user)
+
+        update_number_of_vaccine_doses(custom_user, 1)
+        update_number_of_vaccine_doses(staff_user, 1)
+        add_to_counter(Staff, 'num_care_member', {staff_user.id: 3}, key='custom_user_id')
+
+        member.health_status = 'UNWELL'
+        member.save()
+        staff.care_area = 'Tầng 1'
+        staff.save()
+
+        member.refresh_from_db()
+        staff.refresh_from_db()
+        self.assertEqual((member.health_status, member.number_of_vaccine_doses), ('UNWELL', 1))
+        self.assertEqual((staff.care_area, staff.number_of_vaccine_doses, staff.num_care_member), ('Tầng 1', 1, 3))
+
+class ReconcileCounterTest(TestCase):
+
+    def setUp(self):
+        self.roles = create_roles()
+        self.quarantine_ward, quarantine_rooms = create_quarantine_ward()
+        self.quarantine_room = quarantine_rooms[0]
+        self.staff_user = create_user(self.roles['STAFF'], '0900000009', quarantine_ward=self.quarantine_ward)
+        Staff.objects.create(custom_user=self.staff_user)
+        address = create_address()
+        for index in range(2):
+            custom_user = create_member(self.roles['MEMBER'], f'090000000{index}', address, self.quarantine_ward, self.quarantine_room)
+            Member.objects.filter(custom_user=custom_user).update(care_staff=self.staff_user)
+
+    def get_counters(self):
+        return [
+            QuarantineRoom.objects.get(id=self.quarantine_room.id).num_current_member,
+            QuarantineWard.objects.get(id=self.quarantine_ward.id).num_current_member,
+            Staff.objects.get(custom_user=self.staff_user).num_care_member,
+        ]
+
+    def test_repair_keeps_change_committed_after_recount(self):
+        QuarantineRoom.objects.filter(id=self.quarantine_room.id).update(num_current_member=5)
+        real_add_to_counter = counters.add_to_counter
+
+        def add_to_counter_after_admission(model, field, dict_of_delta, key='id'):
+            if model is QuarantineRoom:
+                # a member is admitted after the recount, before the repair
+                real_add_to_counter(QuarantineRoom, 'num_current_member', {self.quarantine_room.id: 1})
+            real_add_to_counter(model, field, dict_of_delta, key)
+
+        with mock.patch.object(counters, 'add_to_counter', add_to_counter_after_admission):
+            return_dict = reconcile_counters()
+
+        self.assertEqual(return_dict['quarantine_room.num_current_member'], 1)
+        self.assertEqual(QuarantineRoom.objects.get(id=self.quarantine_room.id).num_current_member, 3)
+
+    def test_migrations_fill_counters_of_existing_rows(self):
+        QuarantineRoom.objects.update(num_current_member=0)
+        QuarantineFloor.objects.update(num_current_member=0)
+        QuarantineBuilding.objects.update(num_current_member=0)
+        QuarantineWard.objects.update(num_current_member=0)
+        Staff.objects.update(num_care_member=0)
+
+        with connection.schema_editor() as schema_editor:
+            for module_name in [
+                'quarantine_ward.migrations.0008_auto_20261018_1438',
+                'user_account.migrations.0049_staff_num_care_member',
+            ]:
+                importlib.import_module(module_name).forwards_func(apps, schema_editor)
+
+        self.assertEqual(self.get_counters(), [2, 2, 2])
+        self.assertEqual(set(reconcile_counters(dry_run=True).values()), {0})
+
+class MoveRoomTest(TestCase):
+    """Members and counters follow a room moved to another floor (a floor to another building, a building to another quarantine ward)"""
+
+    def setUp(self):
+        roles = create_roles()
+        address = create_address()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quarantine_ward, quarantine_rooms = create_quarantine_ward()
+            self.quarantine_room = quarantine_rooms[0]
+            self.new_quarantine_ward, new_quarantine_rooms = create_quarantine_ward()
+            self.new_quarantine_floor = new_quarantine_rooms[0].quarantine_floor
+            self.new_quarantine_building = self.new_quarantine_floor.quarantine_building
+            # names are unique in their parent
+            QuarantineRoom.objects.filter(id=new_quarantine_rooms[0].id).update(name='Phòng mới')
+            QuarantineFloor.objects.filter(id=self.new_quarantine_floor.id).update(name='Tầng mới')
+            QuarantineBuilding.objects.filter(id=self.new_quarantine_building.id).update(name='Tòa mới')
+            for index in range(2):
+                create_member(roles['MEMBER'], f'090000000{index}', address, self.quarantine_ward, quarantine_room=self.quarantine_room)
+        self.client = APIClient()
+        self.client.force_authenticate(user=create_user(roles['MANAGER'], '0800000000', quarantine_ward=self.quarantine_ward))
+
+    def assert_members_are_in(self, quarantine_floor, quarantine_building, quarantine_ward):
+        self.assertEqual(
+            set(Member.objects.values_list('quarantine_floor', 'quarantine_building', 'quarantine_ward')),
+            {(quarantine_floor.id, quarantine_building.id, quarantine_ward.id)},
+        )
+        for row in [quarantine_floor, quarantine_building, quarantine_ward]:
+            row.refresh_from_db()
+            self.assertEqual(row.num_current_member, 2)
+        self.assertEqual(set(reconcile_counters(dry_run=True).values()), {0})
+
+    def test_move_room_to_floor_of_another_quarantine_ward(self):
+        response = self.client.post('/api/quarantine_ward/room/update', {
+            'id': self.quarantine_room.id,
+            'quarantine_floor': self.new_quarantine_floor.id,
+        }).json()
+
+        self.assertEqual(response['error_code'], 0)
+        self.assert_members_are_in(self.new_quarantine_floor, self.new_quarantine_building, self.new_quarantine_ward)
+        self.assertEqual(QuarantineWard.objects.get(id=self.quarantine_ward.id).num_current_member, 0)
+
+    def test_move_floor_to_building_of_another_quarantine_ward(self):
+        quarantine_floor = self.quarantine_room.quarantine_floor
+        response = self.client.post('/api/quarantine_ward/floor/update', {
+            'id': quarantine_floor.id,
+            'quarantine_building': self.new_quarantine_building.id,
+        }).json()
+
+        self.assertEqual(response['error_code'], 0)
+        self.assert_members_are_in(quarantine_floor, self.new_quarantine_building, self.new_quarantine_ward)
+        self.assertEqual(QuarantineBuilding.objects.get(quarantine_ward=self.quarantine_ward).num_current_member, 0)
+
+    def test_move_building_to_another_quarantine_ward(self):
+        quarantine_floor = self.quarantine_room.quarantine_floor
+        quarantine_building = quarantine_floor.quarantine_building
+        response = self.client.post('/api/quarantine_ward/building/update', {
+            'id': quarantine_building.id,
+            'quarantine_ward': self.new_quarantine_ward.id,
+        }).json()
+
+        self.assertEqual(response['error_code'], 0)
+        self.assert_members_are_in(quarantine_floor, quarantine_building, self.new_quarantine_ward)
+        self.assertEqual(QuarantineWard.objects.get(id=self.quarantine_ward.id).num_current_member, 0)
+
+class FilterMemberValuesSerializerTest(TestCase):
+
+    def setUp(self):
+        roles = create_roles()
+        address = create_address()
+        quarantine_ward, quarantine_rooms = create_quarantine_ward()
+        quarantine_ward.image = 'https://example.com/image.png'
+        quarantine_ward.save()
+
+        # member in a room with all fields set
+        custom_user = create_member(roles['MEMBER'], '0900000001', address, quarantine_ward, quarantine_room=quarantine_rooms[0])
+        custom_user.birthday = '26/01/2000'
+        custom_user.save()
+        member = custom_user.member_x_custom_user
+        time_now = timezone.now()
+        member.quarantined_status = MemberQuarantinedStatus.QUARANTINING
+        member.quarantined_at = time_now - datetime.timedelta(days=3, microseconds=123456)
+        member.quarantined_finish_expected_at = time_now + datetime.timedelta(days=11)
+        member.health_status = HealthStatus.UNWELL
+        member.positive_test_now = True
+        member.last_tested = time_now - datetime.timedelta(days=1)
+        member.last_tested_had_result = time_now - datetime.timedelta(days=1)
+        member.label = MemberLabel.F0
+        member.save()
+        update_number_of_vaccine_doses(custom_user, 2)
+
+        # waiting member without room, not in a quarantine ward
+        create_member(roles['MEMBER'], '0900000002', address, None, status=CustomUserStatus.WAITING)
+
+        # user without Member
+        create_user(roles['MEMBER'], '0900000003')
+
+    def test_same_json_as_filter_member_serializer(self):
+        query_set = CustomUser.objects.order_by('id')
+
+        data = FilterMemberSerializer(query_set, many=True).data
+        values_data = FilterMemberValuesSerializer(FilterMemberValuesSerializer.values(query_set), many=True).data
+
+        self.assertEqual(len(values_data), 3)
+        self.assertEqual(
+            json.dumps(values_data, cls=DjangoJSONEncoder, ensure_ascii=False),
+            json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False),
+        )
+
+class HotLookupIndexTest(TestCase):
+    """Hot lookups of views must use the indexes of Member, QuarantineHistory, Test and MedicalDeclaration"""
+
+    number_of_users = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        role = create_roles()['MEMBER']
+        quarantine_ward, quarantine_rooms = create_quarantine_ward(number_of_rooms=cls.number_of_users // 4)
+        time_now = timezone.now()
+
+        custom_users = CustomUser.objects.bulk_create([
+            CustomUser(phone_number=f'09{index:08d}', full_name=f'Người dùng {index}', role=role, quarantine_ward=quarantine_ward)
+            for index in range(cls.number_of_users)
+        ])
+        # 1 positive member in 50, most members completed their quarantine
+        Member.objects.bulk_create([
+            Member(
+                custom_user=custom_user,
+                quarantine_room=quarantine_rooms[index // 4],
+                positive_test_now=index % 50 == 0,
+                quarantined_status=MemberQuarantinedStatus.QUARANTINING if index % 10 == 0 else MemberQuarantinedStatus.COMPLETED,
+                quarantined_finish_expected_at=time_now + datetime.timedelta(hours=index),
+            )
+            for index, custom_user in enumerate(custom_users)
+        ])
+        # 3 ended and 1 present quarantine histories for each user
+        QuarantineHistory.objects.bulk_create([
+            QuarantineHistory(
+                user=custom_user,
+                quarantine_ward=quarantine_ward,
+                status=QuarantineHistoryStatus.PRESENT if number == 3 else QuarantineHistoryStatus.ENDED,
+                start_date=time_now - datetime.timedelta(days=30 * (4 - number)),
+            )
+            for custom_user in custom_users for number in range(4)
+        ])
+        Test.objects.bulk_create([
+            Test(user=custom_user, result=TestResult.POSITIVE if number == 0 else TestResult.NEGATIVE)
+            for custom_user in custom_users for number in range(4)
+        ])
+        MedicalDeclaration.objects.bulk_create([
+            MedicalDeclaration(user=custom_user)
+            for custom_user in custom_users for _ in range(4)
+        ])
+
+        # a user with long history, 2 medical declarations a day
+        cls.custom_user = custom_users[cls.number_of_users // 2]
+        QuarantineHistory.objects.bulk_create([
+            QuarantineHistory(
+                user=cls.custom_user,
+                quarantine_ward=quarantine_ward,
+                status=QuarantineHistoryStatus.ENDED,
+                start_date=time_now - datetime.timedelta(days=30 * number),
+            )
+            for number in range(5, 100)
+        ])
+        MedicalDeclaration.objects.bulk_create([
+            MedicalDeclaration(user=cls.custom_user)
+            for _ in range(500)
+        ])
+
+        with connection.cursor() as cursor:
+            for model in [CustomUser, Member, QuarantineHistory, Test, MedicalDeclaration]:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        cls.quarantine_room = quarantine_rooms[0]
+        cls.time_now = time_now
+
+    def assert_index_is_used(self, query_set, index_name):
+        plan = query_set.explain()
+        self.assertIn(index_name, plan)
+
+    def test_positive_members_of_room_use_partial_index(self):
+        self.assert_index_is_used(
+            Member.objects.filter(quarantine_room=self.quarantine_room, positive_test_now=True),
+            'member_positive_room_idx',
+        )
+
+    def test_quarantining_members_by_finish_time_use_index(self):
+        self.assert_index_is_used(
+            Member.objects.filter(
+                quarantined_status=MemberQuarantinedStatus.QUARANTINING,
+                quarantined_finish_expected_at__lte=self.time_now + datetime.timedelta(days=1),
+            ),
+            'member_status_finish_idx',
+        )
+
+    def test_present_quarantine_history_of_user_uses_partial_index(self):
+        self.assert_index_is_used(
+            QuarantineHistory.objects.filter(user=self.custom_user, status=QuarantineHistoryStatus.PRESENT),
+            'qt_history_present_user_idx',
+        )
+
+    def test_ended_quarantine_histories_of_user_use_index(self):
+        self.assert_index_is_used(
+            QuarantineHistory.objects.filter(user=self.custom_user, status=QuarantineHistoryStatus.ENDED).order_by('-start_date')[:1],
+            'qt_history_user_status_idx',
+        )
+
+    def test_positive_tests_of_user_use_index(self):
+        self.assert_index_is_used(
+            Test.objects.filter(user=self.custom_user, result=TestResult.POSITIVE).order_by('-created_at')[:1],
+            'test_user_result_created_idx',
+        )
+
+    def test_medical_declarations_of_user_use_index(self):
+        self.assert_index_is_used(
+            MedicalDeclaration.objects.filter(user=self.custom_user).order_by('-created_at')[:10],
+            'medical_decl_user_created_idx',
+        )
+
+class DefaultPasswordHashTest(TestCase):
+
+    def test_each_batch_has_its_own_salt(self):
+        first_hash = get_default_password_hash()
+        second_hash = get_default_password_hash()
+
+        self.assertNotEqual(first_hash, second_hash)
+        for password_hash in [first_hash, second_hash]:
+            self.assertTrue(CustomUser(password=password_hash).check_password('123456'))
+
+class PaginateDataTest(TestCase):
+
+    def test_rows_with_same_ordering_key_are_paginated_by_pk(self):
+        _, quarantine_rooms = create_quarantine_ward(number_of_rooms=5)
+        room_ids = sorted(quarantine_room.id for quarantine_room in quarantine_rooms)
+
+        for order_by in ['capacity', '-capacity']:
+            query_set = QuarantineRoom.objects.order_by(order_by).values_list('id', flat=True)
+            paged_ids = []
+            for page in range(1, 4):
+                request = mock.Mock(data={'page': page, 'page_size': 2})
+                with CaptureQueriesContext(connection) as context:
+                    paged_ids += list(paginate_data(request, query_set)['content'])
+                self.assertIn('"quarantine_ward_quarantineroom"."id" ASC LIMIT', context.captured_queries[-1]['sql'])
+            self.assertEqual(paged_ids, room_ids)
+
+def calculate_conclude_from_all_tests(test, old_positive_test_now, number_test_need, type_test_need):
+    """positive_test_now concluded by reading all tests of the user, as before TestState"""
+
+    if test.result == TestResult.POSITIVE:
+        return True
+    if test.result != TestResult.NEGATIVE:
+        return old_positive_test_now
+    if not old_positive_test_now:
+        return False
+    tests_to_check = Test.objects.filter(user=test.user).exclude(result=TestResult.NONE)
+    if type_test_need == TestType.RT_PCR:
+        tests_to_check = tests_to_check.filter(type=type_test_need)
+    last_positive_test = Test.objects.filter(user=test.user, result=TestResult.POSITIVE).order_by('-created_at').first()
+    if last_positive_test:
+        tests_to_check = tests_to_check.filter(created_at__gt=last_positive_test.created_at)
+    tests_to_check = list(tests_to_check.order_by('-created_at')[:number_test_need])
+    if len(tests_to_check) < number_test_need:
+        return True
+    return any(test_to_check.result == TestResult.POSITIVE for test_to_check in tests_to_check)
+
+@mock.patch.dict('os.environ', {'NUM_TEST_POS_TO_NEG_NOT_VAC': '2', 'TEST_TYPE_POS_TO_NEG_NOT_VAC': TestType.RT_PCR})
+class TestStateTest(TestCase):
+
+    def setUp(self):
+        roles = create_roles()
+        quarantine_ward, _ = create_quarantine_ward()
+        self.custom_user = create_member(roles['MEMBER'], '0900000001', create_address(), quarantine_ward)
+        self.positive_test_now = None
+
+    def conclude(self, test):
+        new_value = TestAPI().calculate_new_conclude_from_test(test, self.positive_test_now)
+        old_value = calculate_conclude_from_all_tests(test, self.positive_test_now, 2, TestType.RT_PCR)
+        self.assertEqual(new_value, old_value)
+        self.positive_test_now = new_value
+        return new_value
+
+    def create_test(self, result, type):
+        test = Test.objects.create(user=self.custom_user, result=result, type=type)
+        update_test_state(test)
+        return test
+
+    def edit_test(self, test, result):
+        old_result, old_type = test.result, test.type
+        test.result = result
+        test.save()
+        update_test_state(test, old_result, old_type)
+
+    def get_test_state(self):
+        return TestState.objects.filter(user=self.custom_user).values_list('last_positive_at', 'num_quick_negative', 'num_rt_pcr_negative').get()
+
+    def test_state_concludes_as_all_tests(self):
+        positive_test = self.create_test(TestResult.POSITIVE, TestType.RT_PCR)
+        self.assertTrue(self.conclude(positive_test))
+        # quick tests are not counted when RT-PCR tests are needed
+        self.assertTrue(self.conclude(self.create_test(TestResult.NEGATIVE, TestType.QUICK)))
+        negative_test = self.create_test(TestResult.NEGATIVE, TestType.RT_PCR)
+        self.assertTrue(self.conclude(negative_test))
+        last_test = self.create_test(TestResult.NEGATIVE, TestType.RT_PCR)
+        self.assertFalse(self.conclude(last_test))
+        self.assertEqual(self.get_test_state(), (positive_test.created_at, 1, 2))
+
+        # a negative test before the last test is edited to positive
+        self.positive_test_now = True
+        self.edit_test(negative_test, TestResult.POSITIVE)
+        self.assertTrue(self.conclude(last_test))
+        self.assertEqual(self.get_test_state(), (negative_test.created_at, 0, 1))
+
+        # the last positive test is edited to negative
+        self.edit_test(negative_test, TestResult.NEGATIVE)
+        self.assertFalse(self.conclude(last_test))
+
+        incremental_test_state = self.get_test_state()
+        rebuild_test_states([self.custom_user.id])
+        self.assertEqual(self.get_test_state(), incremental_test_state)
+
+class CursorPaginationTest(TestCase):
+
+    class IdSerializer(serializers.Serializer):
+        id = serializers.IntegerField()
+
+    def test_rows_with_same_created_at_are_not_skipped_or_repeated(self):
+        created_at = timezone.now()
+        tests = [Test.objects.create() for _ in range(5)]
+        Test.objects.update(created_at=created_at)
+        # a row created before these rows
+        older_test = Test.objects.create()
+        Test.objects.filter(id=older_test.id).update(created_at=created_at - datetime.timedelta(seconds=1))
+
+        paged_ids = []
+        cursor = ''
+        for _ in range(4):
+            request = mock.Mock(data={'cursor': cursor, 'page_size': 2})
+            paginated_data = paginate_data_by_cursor(request, Test.objects.values('id', 'created_at'), self.IdSerializer)
+            paged_ids += [row['id'] for row in paginated_data['content']]
+            cursor = paginated_data['nextCursor']
+            if not cursor:
+                break
+
+        self.assertIsNone(cursor)
+        self.assertEqual(paged_ids, sorted([test.id for test in tests], reverse=True) + [older_test.id])
+
+class AddressWithNumOfMembersPassByTest(TestCase):
+
+    def setUp(self):
+        roles = create_roles()
+        self.address = create_address()
+        quarantine_ward, _ = create_quarantine_ward()
+        self.client = APIClient()
+        self.client.force_authenticate(user=create_user(roles['MANAGER'], '0800000000', quarantine_ward=quarantine_ward))
+
+        city = self.address['city']
+        self.empty_district = District.objects.create(name='Quận 3', city=city)
+        District.objects.create(name='Quận 5', city=City.objects.create(name='Hà Nội', country=self.address['country']))
+
+        available_user = create_member(roles['MEMBER'], '0900000001', self.address, quarantine_ward)
+        waiting_user = create_member(roles['MEMBER'], '0900000002', self.address, quarantine_ward, status=CustomUserStatus.WAITING)
+        for custom_user, district in [
+            (available_user, self.address['district']),
+            (available_user, self.address['district']),
+            (waiting_user, self.empty_district),
+        ]:
+            DestinationHistory.objects.create(user=custom_user, city=city, district=district, start_time=timezone.now())
+
+    def test_districts_without_members_have_zero(self):
+        response = self.client.post('/api/user/home/filter_address_with_num_of_members_pass_by', {
+            'address_type': 'district',
+            'father_address_id': self.address['city'].id,
+        }).json()
+
+        self.assertEqual(response['error_code'], 0)
+        self.assertEqual(response['data']['totalRows'], 2)
+        self.assertEqual([
+            (item['district']['id'], item['num_of_members_pass_by']) for item in response['data']['content']
+        ], [
+            (self.address['district'].id, 1),
+            (self.empty_district.id, 0),
+        ])
+
+class FilterByIsFullTest(TestCase):
+
+    def setUp(self):
+        self.roles = create_roles()
+        self.address = create_address()
+        self.quarantine_ward, self.quarantine_rooms = create_quarantine_ward(number_of_rooms=3, capacity=1)
+        self.full_rooms = self.quarantine_rooms[1:]
+        for index, quarantine_room in enumerate(self.full_rooms):
+            create_member(self.roles['MEMBER'], f'090000000{index}', self.address, self.quarantine_ward, quarantine_room)
+        self.client = APIClient()
+        self.client.force_authenticate(user=create_user(self.roles['MANAGER'], '0800000000', quarantine_ward=self.quarantine_ward))
+
+    def test_rooms_are_filtered_before_pagination(self):
+        room_ids = []
+        for page in [1, 2]:
+            response = self.client.post('/api/quarantine_ward/room/filter', {
+                'quarantine_floor': self.quarantine_rooms[0].quarantine_floor_id,
+                'is_full': 'true',
+                'page': page,
+                'page_size': 1,
+            }).json()
+            self.assertEqual(response['error_code'], 0)
+            self.assertEqual((response['data']['totalRows'], response['data']['totalPages']), (2, 2))
+            room_ids += [room['id'] for room in response['data']['content']]
+
+        self.assertEqual(sorted(room_ids), sorted(quarantine_room.id for quarantine_room in self.full_rooms))
+
+    def test_floor_is_full_when_all_rooms_are_full(self):
+        query_set = annotate_total_capacity(QuarantineFloor.objects.all())
+        self.assertFalse(filter_by_is_full(query_set, True).exists())
+        self.assertTrue(filter_by_is_full(query_set, False).exists())
+
+        create_member(self.roles['MEMBER'], '0900000009', self.address, self.quarantine_ward, self.quarantine_rooms[0])
+        self.assertTrue(filter_by_is_full(query_set, True).exists())
+        self.assertFalse(filter_by_is_full(query_set, False).exists())
+
+class SetTestCodesTest(TestCase):
+
+    def setUp(self):
+        roles = create_roles()
+        quarantine_ward, _ = create_quarantine_ward()
+        self.custom_user = create_member(roles['MEMBER'], '0900000001', create_address(), quarantine_ward)
+        Test.objects.create(code='C1', user=self.custom_user)
+
+    def test_codes_of_one_batch_are_unique(self):
+        tests = [Test(user=self.custom_user) for _ in range(3)]
+        # C2 is generated twice in this batch, C1 is already used by a saved test and by this batch
+        generated_codes = ['C1', 'C2', 'C2', 'C3', 'C1', 'C4']
+
+        with mock.patch.object(TestAPI, 'custom_test_code_generator', side_effect=generated_codes) as generator:
+            TestAPI().set_test_codes(tests)
+
+        self.assertEqual(generator.call_count, len(generated_codes))
+        self.assertEqual([test.code for test in tests], ['C4', 'C2', 'C3'])
+        Test.objects.bulk_create(tests)
+        self.assertEqual(Test.objects.count(), 4)
+
+class ExportPermissionTest(TestCase):
+
+    def setUp(self):
+        self.roles = create_roles()
+        address = create_address()
+        self.quarantine_ward, _ = create_quarantine_ward()
+        other_quarantine_ward, _ = create_quarantine_ward()
+        self.custom_user = create_member(self.roles['MEMBER'], '0900000001', address, self.quarantine_ward)
+        other_custom_user = create_member(self.roles['MEMBER'], '0900000002', address, other_quarantine_ward)
+        self.medical_declaration = MedicalDeclaration.objects.create(user=self.custom_user)
+        MedicalDeclaration.objects.create(user=other_custom_user)
+
+    def post(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.post(url, {})
+
+    def test_member_cannot_export(self):
+        for url in ['/api/user/member/export', '/api/form/medical-declaration/export', '/api/form/test/export']:
+            response = self.post(self.custom_user, url)
+            self.assertNotEqual(response.json()['error_code'], 0, url)
+
+    def test_manager_exports_medical_declarations_of_own_quarantine_ward(self):
+        manager = create_user(self.roles['MANAGER'], '0800000000', quarantine_ward=self.quarantine_ward)
+        response = self.post(manager, '/api/form/medical-declaration/export')
+
+        rows = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertIn(self.medical_declaration.code, rows[1])
+
+class ImportMemberChunkTest(TestCase):
+
+    def setUp(self):
+        self.roles = create_roles()
+        self.address = create_address()
+        self.quarantine_ward, self.quarantine_rooms = create_quarantine_ward(number_of_rooms=2)
+        self.created_by = create_user(self.roles['ADMINISTRATOR'], '0900000000')
+
+    def parse_member_row(self, row, is_csv_file):
+        phone_number, quarantine_room = row
+        dict_custom_user_data = {
+            'full_name': f'Người dùng {phone_number}',
+            'phone_number': phone_number,
+            'gender': 'MALE',
+            'nationality_code': 'VNM',
+            'country_code': 'VNM',
+            'city_id': self.address['city'].id,
+            'district_id': self.address['district'].id,
+            'ward_id': self.address['ward'].id,
+            'detail_address': '1 Lê Lợi',
+            'quarantine_ward_id': self.quarantine_ward.id,
+        }
+        dict_member_data = {'label': MemberLabel.F1, 'quarantine_room_id': quarantine_room.id}
+        return dict_custom_user_data, dict_member_data, True
+
+    def test_only_row_that_cannot_be_saved_gets_error(self):
+        failed_room = self.quarantine_rooms[1]
+        real_work = MemberAPI.do_after_change_room_of_member_work
+
+        def do_after_change_room_of_member_work(view, member, old_room):
+            if member.quarantine_room_id == failed_room.id:
+                raise Exception('Cannot update this room')
+            real_work(view, member, old_room)
+
+        chunk = [
+            (0, ['0900000001', self.quarantine_rooms[0]], True),
+            (1, ['0900000002', failed_room], True),
+        ]
+        custom_user_ids = []
+        error = dict()
+        with mock.patch.object(MemberAPI, 'parse_member_row', side_effect=self.parse_member_row), \
+            mock.patch.object(MemberAPI, 'do_after_change_room_of_member_work', do_after_change_room_of_member_work):
+            MemberAPI().create_members_of_chunk(
+                chunk, self.created_by, self.roles['MEMBER'], get_default_password_hash(), dict(), custom_user_ids, error,
+            )
+
+        self.assertEqual(error, {'2': 'Cannot update this room'})
+        self.assertEqual(list(CustomUser.objects.filter(id__in=custom_user_ids).values_list('phone_number', flat=True)), ['0900000001'])
+        self.assertFalse(CustomUser.objects.filter(phone_number='0900000002').exists())
+        self.assertEqual(set(reconcile_counters(dry_run=True).values()), {0})
+        self.assertEqual(QuarantineRoom.objects.get(id=self.quarantine_rooms[0].id).num_current_member, 1)
+
+class ImportJobLeaseTest(TestCase):
+
+    def create_import_job(self, **kwargs):
+        return ImportJob.objects.create(type=ImportJobType.MEMBER, file_name='members.csv', file_content=b'', **kwargs)
+
+    def test_running_job_of_dead_worker_is_failed(self):
+        time_now = timezone.now()
+        expired_import_job = self.create_import_job(
+            status=ImportJobStatus.RUNNING,
+            started_at=time_now - datetime.timedelta(minutes=20),
+            lease_expires_at=time_now - datetime.timedelta(minutes=10),
+        )
+        running_import_job = self.create_import_job(
+            status=ImportJobStatus.RUNNING,
+            started_at=time_now,
+            lease_expires_at=time_now + datetime.timedelta(minutes=10),
+        )
+        waiting_import_job = self.create_import_job()
+
+        import_job = claim_import_job(lease_seconds=600)
+
+        self.assertEqual(import_job.id, waiting_import_job.id)
+        self.assertGreater(import_job.lease_expires_at, time_now)
+        expired_import_job.refresh_from_db()
+        running_import_job.refresh_from_db()
+        self.assertEqual(expired_import_job.status, ImportJobStatus.FAILED)
+        self.assertEqual(expired_import_job.message, messages.IMPORT_JOB_WORKER_STOPPED)
+        self.assertIsNone(expired_import_job.file_content)
+        self.assertEqual(running_import_job.status, ImportJobStatus.RUNNING)
+
+    def test_progress_renews_lease_until_job_is_failed(self):
+        self.create_import_job()
+        import_job = claim_import_job(lease_seconds=600)
+        lease_expires_at = import_job.lease_expires_at
+
+        update_import_job_progress(import_job, 300, [1, 2], {'3': 'Phone is not valid'}, lease_seconds=900)
+        import_job.refresh_from_db()
+        self.assertGreater(import_job.lease_expires_at, lease_expires_at)
+        self.assertEqual((import_job.num_processed, import_job.num_succeeded, import_job.num_failed), (300, 2, 1))
+
+        # the worker was too slow, its job is failed by another worker
+        ImportJob.objects.filter(id=import_job.id).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        claim_import_job(lease_seconds=600)
+        with self.assertRaises(ImportJobLeaseLost):
+            update_import_job_progress(import_job, 600, [1, 2], {}, lease_seconds=900)
+        import_job.refresh_from_db()
+        self.assertEqual((import_job.status, import_job.num_processed), (ImportJobStatus.FAILED, 300))
+
+    @mock.patch.dict('os.environ', {'IMPORT_JOB_POLL_SECONDS': '0'})
+    def test_worker_keeps_polling_after_error(self):
+        # the worker is stopped by an exception that is not an Exception
+        with mock.patch.object(import_jobs, 'claim_import_job', side_effect=[Exception('Connection closed'), None, KeyboardInterrupt]) as claim, \
+            mock.patch.object(import_jobs, 'close_old_connections') as close_old_connections, \
+            self.assertLogs(import_jobs.logger, 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                run_import_worker()
+
+        self.assertEqual(claim.call_count, 3)
+        close_old_connections.assert_called_once()
+
+class AcceptManyMembersTest(TestCase):
+
+    def setUp(self):
+        roles = create_roles()
+        address = create_address()
+        self.quarantine_ward, quarantine_rooms = create_quarantine_ward(capacity=4)
+        self.quarantine_room = quarantine_rooms[0]
+        self.client = APIClient()
+        self.client.force_authenticate(user=create_user(roles['MANAGER'], '0800000000', quarantine_ward=self.quarantine_ward))
+        self.waiting_users = [
+            create_member(roles['MEMBER'], f'090000000{index}', address, self.quarantine_ward, status=CustomUserStatus.WAITING)
+            for index in range(3)
+        ]
+
+    def test_work_of_room_is_done_once_in_transaction(self):
+        real_work = MemberAPI.do_after_change_room_of_member_work
+        calls = []
+
+        number_of_savepoints = len(connection.savepoint_ids)
+
+        def do_after_change_room_of_member_work(view, member, old_room):
+            calls.append((member.quarantine_room_id, len(connection.savepoint_ids) > number_of_savepoints))
+            real_work(view, member, old_room)
+
+        with mock.patch.object(MemberAPI, 'do_after_change_room_of_member_work', do_after_change_room_of_member_work):
+            response = self.client.post('/api/user/member/accept_many', {
+                'member_codes': ','.join(custom_user.code for custom_user in self.waiting_users),
+            }).json()
+
+        self.assertEqual(response['error_code'], 0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], self.quarantine_room.id)
+        # TestCase wraps each test in a transaction, the transaction of the view is a savepoint
+        self.assertTrue(calls[0][1])
+        members = Member.objects.filter(custom_user__in=self.waiting_users)
+        self.assertEqual({member.quarantine_room_id for member in members}, {self.quarantine_room.id})
+        self.assertEqual(QuarantineRoom.objects.get(id=self.quarantine_room.id).num_current_member, 3)
+
+class ConcurrentAdmissionTest(TransactionTestCase):
+    """Admissions started at the same time for the last free slots of a room must not overbook it"""
+
+    def setUp(self):
+        roles = create_roles()
+        address = create_address()
+        self.quarantine_ward, quarantine_rooms = create_quarantine_ward(number_of_rooms=1, capacity=3)
+        self.quarantine_room = quarantine_rooms[0]
+        self.manager = create_user(roles['MANAGER'], '0800000000', quarantine_ward=self.quarantine_ward)
+
+        # 2 free slots left
+        create_member(roles['MEMBER'], '0900000000', address, self.quarantine_ward, quarantine_room=self.quarantine_room)
+        self.waiting_users = [
+            create_member(roles['MEMBER'], f'090000000{index}', address, self.quarantine_ward, status=CustomUserStatus.WAITING)
+            for index in range(1, 7)
+        ]
+
+    def post_at_the_same_time(self, list_of_url_and_data):
+        """Post each (url, data) in its own thread (and database connection), all threads start together"""
+
+        barrier = threading.Barrier(len(list_of_url_and_data))
+        responses = [None] * len(list_of_url_and_data)
+
+        def post(index, url, data):
+            client = APIClient()
+            client.force_authenticate(user=self.manager)
+            try:
+                barrier.wait()
+                responses[index] = client.post(url, data).json()
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=post, args=(index, url, data))
+            for index, (url, data) in enumerate(list_of_url_and_data)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def assert_not_overbooked(self):
+        quarantine_room = QuarantineRoom.objects.get(id=self.quarantine_room.id)
+        number_of_members = Member.objects.filter(quarantine_room=quarantine_room).count()
+
+        self.assertLessEqual(number_of_members, quarantine_room.capacity)
+        self.assertEqual(quarantine_room.num_current_member, number_of_members)
+        for model in [QuarantineFloor, QuarantineBuilding, QuarantineWard]:
+            self.assertEqual(model.objects.get().num_current_member, number_of_members)
+        return number_of_members
+
+    def test_accept_one_member_for_last_slots(self):
+        responses = self.post_at_the_same_time([
+            ('/api/user/member/accept_one', {'code': custom_user.code, 'quarantine_room_id': self.quarantine_room.id})
+            for custom_user in self.waiting_users
+        ])
+
+        self.assertEqual(len([response for response in responses if response['error_code'] == 0]), 2)
+        self.assertEqual(self.assert_not_overbooked(), 3)
+
+    def test_accept_many_and_one_members_for_last_slots(self):
+        member_codes = [custom_user.code for custom_user in self.waiting_users]
+        responses = self.post_at_the_same_time([
+            ('/api/user/member/accept_many', {'member_codes': ','.join(member_codes[:3])}),
+            ('/api/user/member/accept_many', {'member_codes': ','.join(member_codes[3:5])}),
+            ('/api/user/member/accept_one', {'code': member_codes[5], 'quarantine_room_id': self.quarantine_room.id}),
+        ])
+
+        self.assertTrue(all(response is not None for response in responses))
+        self.assertEqual(self.assert_not_overbooked(), 3)
+        self.assertEqual(CustomUser.objects.filter(code__in=member_codes, status=CustomUserStatus.AVAILABLE).count(), 2)
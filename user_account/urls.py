@@ -9,5 +9,6 @@ router.register('staff', views.StaffAPI, basename='staff')
 router.register('home', views.HomeAPI, basename='home')
 router.register('destination_history', views.DestinationHistoryAPI, basename='destination_history')
 router.register('quarantine_history', views.QuarantineHistoryAPI, basename='quarantine_history')
+router.register('import_job', views.ImportJobAPI, basename='import_job')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -0,0 +1,37 @@
+from django.db.models import Q
+from ..models import ImportJob
+from utils import validators, messages, exceptions
+
+class ImportJobValidator(validators.AbstractRequestValidate):
+
+    def is_valid_fields(self, keys: list):
+        ignorable_fields = {}
+        set_of_keys = set(keys)
+
+        return super().is_valid_fields(set_of_keys)
+
+    def is_validate_error_offset(self):
+        if hasattr(self, '_error_offset'):
+            self._error_offset = validators.PositiveIntegerValidator.valid(
+                self._error_offset,
+                message={'error_offset': messages.INVALID},
+                message1={'error_offset': messages.INVALID},
+            )
+
+    def is_id_exist(self):
+        if hasattr(self, '_id'):
+            try:
+                self._import_job = validators.ModelInstanceExistenceValidator.valid(
+                    model_cls=ImportJob.objects.defer('file_content'),
+                    query_expr=Q(id=self._id),
+                )
+                return True
+            except Exception as exception:
+                return False
+        return False
+
+    def extra_validate_to_get_import_job(self):
+        if hasattr(self, '_id') and not self.is_id_exist():
+            raise exceptions.NotFoundException({'id': messages.NOT_EXIST})
+        if not hasattr(self, '_error_offset'):
+            self._error_offset = 0
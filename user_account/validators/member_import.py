@@ -0,0 +1,180 @@
+from django.db.models import Q
+from .user import UserValidator
+from ..models import CustomUser
+from address.models import Country, City, District, Ward
+from quarantine_ward.models import QuarantineWard, QuarantineRoom
+from form.models import BackgroundDisease
+from utils import messages, exceptions
+from utils.tools import split_input_list
+
+def to_int(value):
+    try:
+        return int(value)
+    except Exception as exception:
+        return None
+
+class MemberImportLookup:
+    """
+    Objects needed to validate a chunk of rows of an imported file, each model is loaded with one __in query.
+    list_of_data: list of dict, data of custom user and member of each row
+    """
+
+    identifier_fields = [
+        'phone_number', 'email', 'health_insurance_number',
+        'identity_number', 'passport_number',
+    ]
+
+    def __init__(self, list_of_data):
+        def get_values(*keys):
+            return {
+                data[key] for data in list_of_data for key in keys
+                if data.get(key) not in [None, '']
+            }
+
+        def get_ids(*keys):
+            ids = {to_int(value) for value in get_values(*keys)}
+            ids.discard(None)
+            return ids
+
+        countries = Country.objects.filter(code__in=[str(code) for code in get_values('nationality_code', 'country_code')])
+        self.countries = {country.code: country for country in countries}
+
+        cities = City.objects.filter(id__in=get_ids('city_id')).select_related('country')
+        self.cities = {city.id: city for city in cities}
+
+        districts = District.objects.filter(id__in=get_ids('district_id')).select_related('city__country')
+        self.districts = {district.id: district for district in districts}
+
+        wards = Ward.objects.filter(id__in=get_ids('ward_id')).select_related('district__city__country')
+        self.wards = {ward.id: ward for ward in wards}
+
+        quarantine_wards = QuarantineWard.objects.filter(id__in=get_ids('quarantine_ward_id')).select_related('pandemic')
+        self.quarantine_wards = {quarantine_ward.id: quarantine_ward for quarantine_ward in quarantine_wards}
+
+        quarantine_rooms = QuarantineRoom.objects.filter(id__in=get_ids('quarantine_room_id')).select_related(
+            'quarantine_floor__quarantine_building__quarantine_ward__pandemic',
+        )
+        self.quarantine_rooms = {quarantine_room.id: quarantine_room for quarantine_room in quarantine_rooms}
+
+        care_staffs = CustomUser.objects.filter(
+            code__in=[str(code) for code in get_values('care_staff_code')],
+        ).select_related('role', 'quarantine_ward')
+        self.care_staffs = {care_staff.code: care_staff for care_staff in care_staffs}
+
+        background_disease_ids = set()
+        for value in get_values('background_disease'):
+            if isinstance(value, str):
+                background_disease_ids |= {to_int(id) for id in split_input_list(value)}
+        background_disease_ids.discard(None)
+        background_diseases = BackgroundDisease.objects.filter(id__in=background_disease_ids)
+        self.background_diseases = {background_disease.id: background_disease for background_disease in background_diseases}
+
+        # identifiers of existed users, one query for all fields
+        self.existed_identifiers = {field: set() for field in self.identifier_fields}
+        query = Q()
+        for field in self.identifier_fields:
+            values = get_values(field)
+            if values:
+                query |= Q(**{f'{field}__in': values})
+        if query:
+            for row in CustomUser.objects.filter(query).values_list(*self.identifier_fields):
+                for field, value in zip(self.identifier_fields, row):
+                    self.existed_identifiers[field].add(value)
+
+    def is_identifier_exist(self, field, value):
+        return value in self.existed_identifiers[field]
+
+    def add_identifiers(self, custom_user):
+        """Add identifiers of a user accepted in this chunk, next rows cannot use them again"""
+        for field in self.identifier_fields:
+            value = getattr(custom_user, field, None)
+            if value not in [None, '']:
+                self.existed_identifiers[field].add(value)
+
+class MemberImportValidator(UserValidator):
+    """
+    UserValidator for a row of an imported file,
+    existence of objects is checked in lookup (a MemberImportLookup) instead of one query for each field.
+    """
+
+    def get_from_lookup(self, objects, key, attr):
+        object = objects.get(key)
+        if object is None:
+            return False
+        setattr(self, attr, object)
+        return True
+
+    def is_validate_background_disease(self):
+        if hasattr(self, '_background_disease'):
+            self._list_background_disease_objects = []
+            self._list_background_disease_ids = split_input_list(self._background_disease)
+            for item in self._list_background_disease_ids:
+                object = self._lookup.background_diseases.get(to_int(item))
+                if object is None:
+                    raise exceptions.NotFoundException({'background_disease': messages.NOT_EXIST})
+                self._list_background_disease_objects += [object]
+
+    def is_email_exist(self):
+        if hasattr(self, '_email'):
+            return self._lookup.is_identifier_exist('email', self._email)
+        return False
+
+    def is_health_insurance_number_exist(self):
+        if hasattr(self, '_health_insurance_number'):
+            return self._lookup.is_identifier_exist('health_insurance_number', self._health_insurance_number)
+        return False
+
+    def is_identity_number_exist(self):
+        if hasattr(self, '_identity_number'):
+            return self._lookup.is_identifier_exist('identity_number', self._identity_number)
+        return False
+
+    def is_passport_number_exist(self):
+        if hasattr(self, '_passport_number'):
+            return self._lookup.is_identifier_exist('passport_number', self._passport_number)
+        return False
+
+    def is_phone_number_exist(self):
+        if hasattr(self, '_phone_number'):
+            return self._lookup.is_identifier_exist('phone_number', self._phone_number)
+        return False
+
+    def is_nationality_code_exist(self):
+        if hasattr(self, '_nationality_code'):
+            return self.get_from_lookup(self._lookup.countries, str(self._nationality_code), '_nationality')
+        return False
+
+    def is_country_code_exist(self):
+        if hasattr(self, '_country_code'):
+            return self.get_from_lookup(self._lookup.countries, str(self._country_code), '_country')
+        return False
+
+    def is_city_id_exist(self):
+        if hasattr(self, '_city_id'):
+            return self.get_from_lookup(self._lookup.cities, to_int(self._city_id), '_city')
+        return False
+
+    def is_district_id_exist(self):
+        if hasattr(self, '_district_id'):
+            return self.get_from_lookup(self._lookup.districts, to_int(self._district_id), '_district')
+        return False
+
+    def is_ward_id_exist(self):
+        if hasattr(self, '_ward_id'):
+            return self.get_from_lookup(self._lookup.wards, to_int(self._ward_id), '_ward')
+        return False
+
+    def is_quarantine_ward_id_exist(self):
+        if hasattr(self, '_quarantine_ward_id'):
+            return self.get_from_lookup(self._lookup.quarantine_wards, to_int(self._quarantine_ward_id), '_quarantine_ward')
+        return True
+
+    def is_quarantine_room_id_exist(self):
+        if hasattr(self, '_quarantine_room_id'):
+            return self.get_from_lookup(self._lookup.quarantine_rooms, to_int(self._quarantine_room_id), '_quarantine_room')
+        return True
+
+    def is_care_staff_code_exist(self):
+        if hasattr(self, '_care_staff_code'):
+            return self.get_from_lookup(self._lookup.care_staffs, str(self._care_staff_code), '_care_staff')
+        return True
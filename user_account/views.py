@@ -1,26 +1,28 @@
 import os
 import datetime, pytz
-import locale
 import json
 import requests
 import openpyxl, csv, codecs
 from django.utils import timezone
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count, Avg, Sum, Q
+from django.db.models import Count, Sum, Q, F, Exists, OuterRef
 from rest_framework import permissions
 from rest_framework.decorators import action, permission_classes
 from .validators.user import UserValidator
+from .validators.member_import import MemberImportValidator, MemberImportLookup
 from .validators.home import HomeValidator
 from .validators.destination_history import DestinationHistoryValidator
 from .validators.quarantine_history import QuarantineHistoryValidator
+from .validators.import_job import ImportJobValidator
 from .models import CustomUser, Member, Manager, Staff, DestinationHistory, QuarantineHistory
 from .serializers import (
     DestinationHistorySerializer, QuarantineHistorySerializer,
     CustomUserSerializer, MemberSerializer,
-    FilterMemberSerializer, FilterNotMemberSerializer,
+    FilterMemberValuesSerializer, FilterNotMemberSerializer,
     MemberHomeSerializer, ManagerSerializer,
     StaffSerializer, FilterStaffSerializer, FilterManagerSerializer,
-    BaseQuarantineHistorySerializer,
+    BaseQuarantineHistorySerializer, ImportJobSerializer,
 )
 from .filters.member import MemberFilter
 from .filters.user import UserFilter
@@ -28,10 +30,17 @@ from .filters.staff import StaffFilter
 from .filters.manager import ManagerFilter
 from .filters.destination_history import DestinationHistoryFilter
 from .filters.quarantine_history import QuarantineHistoryFilter
+from .counters import update_counters_of_members, set_location_of_members
+from .import_jobs import create_import_job
+from .dashboard import (
+    get_list_of_days, count_member_statistics, count_members_in_out_by_day,
+    update_ward_daily_stats_of_in_member, update_ward_daily_stats_of_in_members,
+    update_ward_daily_stats_of_ended_quarantine_history,
+)
 from form.models import Test, VaccineDose, Pandemic, MedicalDeclaration, BackgroundDisease
 from form.serializers import (
     BaseMedicalDeclarationSerializer,
-    BaseTestSerializer,
+    BaseTestSerializer, FilterTestSerializer,
 )
 from form.filters.test import TestFilter
 from form.serializers import (
@@ -40,6 +49,11 @@ from form.serializers import (
 from role.models import Role
 from address.models import City, District, Ward
 from quarantine_ward.models import QuarantineRoom
+from quarantine_ward.occupancy import (
+    get_room_occupancies, choose_suitable_room, allocate_rooms,
+    get_care_staff_loads, choose_care_staff,
+    lock_rooms, reserve_room,
+)
 from quarantine_ward.serializers import (
     QuarantineRoomSerializer, QuarantineFloorSerializer,
     QuarantineBuildingSerializer, BaseQuarantineWardSerializer,
@@ -49,13 +63,14 @@ from quarantine_ward.serializers import (
 from notification.views import create_and_send_noti_to_list_user
 from utils import exceptions, messages
 from utils.enums import (
-    CustomUserStatus, HealthStatus, TestStatus,
+    CustomUserStatus, TestStatus,
     MemberQuarantinedStatus, MemberLabel,
     QuarantineHistoryStatus, QuarantineHistoryEndType,
     Professional, TestResult, Gender,
+    ImportJobType, ImportJobStatus,
 )
-from utils.views import AbstractView, paginate_data, query_debugger
-from utils.tools import custom_user_code_generator, LabelTool, split_input_list
+from utils.views import AbstractView, paginate_data, paginate_data_by_cursor, export_data, query_debugger
+from utils.tools import custom_user_code_generator, get_default_password_hash, LabelTool, split_input_list, normalize_name
 
 # Create your views here.
 
@@ -335,9 +350,7 @@ class DestinationHistoryAPI(AbstractView):
             query_set = filter.qs
             query_set = query_set.select_related('user', 'country', 'city', 'district', 'ward')
 
-            serializer = DestinationHistorySerializer(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            paginated_data = paginate_data(request, query_set, DestinationHistorySerializer)
             
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -428,9 +441,7 @@ class QuarantineHistoryAPI(AbstractView):
             query_set = filter.qs
             query_set = query_set.select_related('user', 'pandemic', 'quarantine_ward', 'quarantine_room__quarantine_floor__quarantine_building', 'created_by', 'updated_by')
 
-            serializer = QuarantineHistorySerializer(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            paginated_data = paginate_data(request, query_set, QuarantineHistorySerializer)
             
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -545,6 +556,75 @@ def send_notification_is_last_test():
         receive_user_list=list(query_set),
     )
 
+class ImportJobAPI(AbstractView):
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @csrf_exempt
+    @query_debugger
+    @action(methods=['POST'], url_path='get', detail=False)
+    def get_import_job(self, request):
+        """Get progress of an import job (members or tests by file),
+        errors of rows found from error_offset are returned, poll again with next_error_offset
+
+        Args:
+            + id: int
+            - error_offset: int
+        """
+
+        accept_fields = [
+            'id', 'error_offset',
+        ]
+
+        require_fields = [
+            'id',
+        ]
+
+        try:
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
+                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
+
+            request_extractor = self.request_handler.handle(request)
+            receive_fields = request_extractor.data
+            accepted_fields = dict()
+
+            for key in receive_fields.keys():
+                if key in accept_fields:
+                    accepted_fields[key] = receive_fields[key]
+
+            validator = ImportJobValidator(**accepted_fields)
+            validator.is_missing_fields(require_fields)
+            validator.is_valid_fields([
+                'error_offset',
+            ])
+            validator.extra_validate_to_get_import_job()
+
+            import_job = validator.get_field('import_job')
+            error_offset = validator.get_field('error_offset')
+
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER'] and import_job.created_by_id != request.user.id:
+                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
+
+            response_data = ImportJobSerializer(import_job, many=False).data
+
+            errors = import_job.errors[error_offset:]
+            response_data['next_error_offset'] = error_offset + len(errors)
+
+            if import_job.type == ImportJobType.MEMBER:
+                response_data['user_fail'] = {row: message for row, message in errors}
+                if import_job.status == ImportJobStatus.DONE:
+                    custom_user_data = FilterMemberValuesSerializer.values(CustomUser.objects.filter(id__in=import_job.result_ids))
+                    response_data['user_success'] = FilterMemberValuesSerializer(custom_user_data, many=True).data
+            else:
+                response_data['test_fail'] = {row: message for row, message in errors}
+                if import_job.status == ImportJobStatus.DONE:
+                    test_data = Test.objects.filter(id__in=import_job.result_ids)
+                    response_data['test_success'] = FilterTestSerializer(test_data, many=True).data
+
+            return self.response_handler.handle(data=response_data)
+        except Exception as exception:
+            return self.exception_handler.handle(exception)
+
 class MemberAPI(AbstractView):
 
     permission_classes = [permissions.IsAuthenticated]
@@ -561,10 +641,7 @@ class MemberAPI(AbstractView):
         return super().get_permissions()
 
     def is_room_full(self, room):
-        return room.member_x_quarantine_room.all().count() >= room.capacity
-
-    def is_room_empty(self, room):
-        return room.member_x_quarantine_room.all().count() == 0
+        return room.num_current_member >= room.capacity
 
     def is_room_close(self, room, num_day_to_close_room):
         # All members in this room must have quarantined at >= 'num_day_to_close_room' day ago.
@@ -574,26 +651,6 @@ class MemberAPI(AbstractView):
                 return True
         return False
 
-    def count_members_same_label(self, room, label):
-        if not label:
-            return 0
-        return room.member_x_quarantine_room.all().filter(label=label).count()
-
-    def count_average_number_of_vaccine_doses(self, room):
-        return_value = room.member_x_quarantine_room.all().aggregate(Avg('number_of_vaccine_doses'))['number_of_vaccine_doses__avg']
-        if not return_value:
-            # Nobody in room or 0
-            return_value = 0
-        return return_value
-
-    def count_members_same_gender(self, room, gender):
-        if not gender:
-            return 0
-        return room.member_x_quarantine_room.all().filter(custom_user__gender=gender).count()
-
-    def count_available_slot(self, room):
-        return room.capacity - room.member_x_quarantine_room.all().count()
-
     def get_suitable_room_for_member(self, input_dict):
         """input_dict.keys() = [
             quarantine_ward
@@ -627,83 +684,26 @@ class MemberAPI(AbstractView):
                     return_dict['warning'] = 'This room is current room of this member'
                     return return_dict
 
-        rooms = QuarantineRoom.objects.filter(quarantine_floor__quarantine_building__quarantine_ward = input_dict['quarantine_ward'])
-        rooms = rooms.exclude(id__in=input_dict['not_quarantine_room_ids'])
-        rooms = list(rooms)
-
-        remain_rooms = [room for room in rooms if not self.is_room_full(room)]
-        if len(remain_rooms) > 0:
-            rooms = remain_rooms
+        if input_dict['quarantine_ward'].pandemic:
+            num_day_to_close_room = input_dict['quarantine_ward'].pandemic.num_day_to_close_room
         else:
-            return_dict['room'] = None
-            return_dict['warning'] = 'All rooms in this quarantine ward are full'
-            return return_dict
+            num_day_to_close_room = int(os.environ.get('NUM_DAY_TO_CLOSE_ROOM', 1))
+
+        # load occupancy of all rooms in one query, then check all tieu_chi in memory
+        room_occupancies = get_room_occupancies(input_dict['quarantine_ward'], input_dict['not_quarantine_room_ids'])
+
+        suitable_room_occupancy_dict = choose_suitable_room(
+            room_occupancies,
+            gender=input_dict['gender'],
+            label=input_dict['label'],
+            positive_test_now=input_dict['positive_test_now'],
+            number_of_vaccine_doses=input_dict['number_of_vaccine_doses'],
+            num_day_to_close_room=num_day_to_close_room,
+        )
+        room_occupancy = suitable_room_occupancy_dict['room_occupancy']
 
-        # check this room has positive / not positive member
-        if input_dict['positive_test_now'] in [False, None]:
-            remain_rooms = [room for room in rooms if self.count_positive_test_now_true_in_room(room) == 0]
-        else:
-            remain_rooms = [room for room in rooms if self.count_positive_test_now_not_true_in_room(room) == 0]
-        if len(remain_rooms) > 0:
-            rooms = remain_rooms
-        else:
-            return_dict['room'] = None
-            return_dict['warning'] = 'All rooms in this quarantine ward are full or dont meet with this user positive_test_now'
-            return return_dict
-
-        tieu_chi = ['close_room', 'label', 'vaccine', 'gender', 'less_slot']
-        # close_room: All members in this room must have quarantined at >= 'num_day_to_close_room' day ago.
-        # label: This room must have at most number of members that is same label as this member.
-        # vaccine: This room must have minimum average abs(this.number_of_vaccine_doses - another_member.number_of_vaccine_doses)
-        # gender: This room must have at most number of members that is same gender as this member.
-        # less_slot: This room must have at less number of available slot.
-
-        # tieu_chi close_room
-        if input_dict['positive_test_now'] in [False, None]:
-            if input_dict['quarantine_ward'].pandemic:
-                num_day_to_close_room = input_dict['quarantine_ward'].pandemic.num_day_to_close_room
-            else:
-                num_day_to_close_room = int(os.environ.get('NUM_DAY_TO_CLOSE_ROOM', 1))
-            remain_rooms = [room for room in rooms if not self.is_room_close(room, num_day_to_close_room)]
-            if len(remain_rooms) > 0:
-                rooms = remain_rooms
-            else:
-                return_dict['room'] = None
-                return_dict['warning'] = 'All rooms are not accept any more member'
-                return return_dict
-
-        empty_rooms = [room for room in rooms if self.is_room_empty(room)]
-        rooms = [room for room in rooms if room not in empty_rooms]
-
-        if rooms:
-            # tieu_chi label
-            count_each_room = [self.count_members_same_label(room, input_dict['label']) for room in rooms]
-            max_same_label_in_room = max(count_each_room)
-            remain_rooms = [rooms[i] for i in range(len(rooms)) if count_each_room[i] == max_same_label_in_room]
-            rooms = remain_rooms
-            
-            # tieu_chi vaccine
-            difference_each_room = [abs(self.count_average_number_of_vaccine_doses(room) - input_dict['number_of_vaccine_doses']) for room in rooms]
-            min_difference_each_room = min(difference_each_room)
-            remain_rooms = [rooms[i] for i in range(len(rooms)) if difference_each_room[i] == min_difference_each_room]
-            rooms = remain_rooms
-
-            # tieu_chi gender
-            count_each_room = [self.count_members_same_gender(room, input_dict['gender']) for room in rooms]
-            max_same_gender_in_room = max(count_each_room)
-            remain_rooms = [rooms[i] for i in range(len(rooms)) if count_each_room[i] == max_same_gender_in_room]
-            rooms = remain_rooms
-
-        rooms += empty_rooms
-
-        # tieu_chi less_slot
-        count_each_room = [self.count_available_slot(room) for room in rooms]
-        min_available_slot = min(count_each_room)
-        remain_rooms = [rooms[i] for i in range(len(rooms)) if count_each_room[i] == min_available_slot]
-        rooms = remain_rooms
-
-        return_dict['room'] = rooms[0]
-        return_dict['warning'] = None
+        return_dict['room'] = room_occupancy.room if room_occupancy else None
+        return_dict['warning'] = suitable_room_occupancy_dict['warning']
         return return_dict
 
     def check_room_for_member(self, user, room):
@@ -733,6 +733,16 @@ class MemberAPI(AbstractView):
                 return 'This room is close (not accept any more member)'
         return messages.SUCCESS
 
+    def reserve_room_for_member(self, room, old_room=None):
+        """
+        Run this function in a transaction, right before saving a member to room (from old_room).
+        Row of room is locked until the end of the transaction, then room is checked again that it is not full,
+        so 2 admissions at the same time cannot overbook this room.
+        """
+
+        if room and room != old_room and not reserve_room(room, old_room):
+            raise exceptions.ValidationException({'quarantine_room_id': 'This room is full'})
+
     def get_suitable_care_staff_for_member(self, input_dict):
         """input_dict.keys() = [
             quarantine_floor
@@ -755,7 +765,7 @@ class MemberAPI(AbstractView):
                 custom_user__quarantine_ward=input_dict['quarantine_floor'].quarantine_building.quarantine_ward,
             )
         try:
-            return_dict['care_staff'] = query_set.annotate(num_care_member=Count('custom_user__member_x_care_staff')).order_by('num_care_member')[:1].get().custom_user
+            return_dict['care_staff'] = query_set.order_by('num_care_member')[:1].get().custom_user
         except Exception as exception:
             return_dict['care_staff'] = None
             return_dict['warning'] = 'Cannot set care_staff for this member'
@@ -771,84 +781,511 @@ class MemberAPI(AbstractView):
             return room.member_x_quarantine_room.all().filter(Q(positive_test_now=False) | Q(positive_test_now__isnull=True)).count()
         return 0
 
-    def count_label_not_f0_in_room(self, room):
-        if room:
-            return room.member_x_quarantine_room.all().filter(~Q(label=MemberLabel.F0)).count()
-        return 0
+    def extend_quarantined_finish_expected_at(self, members, remain_qt_not_vac, remain_qt_vac, time_now):
+        """
+        Set quarantined_finish_expected_at of members (except F0) to time_now + remain_qt (days) if it is later, in memory only.
+        Return list of changed members
+        """
+
+        changed_members = []
+        for each_member in members:
+            if each_member.label != MemberLabel.F0:
+                if each_member.number_of_vaccine_doses < 2:
+                    remain_qt = remain_qt_not_vac
+                else:
+                    remain_qt = remain_qt_vac
+                old_quarantined_finish_expected_at = each_member.quarantined_finish_expected_at
+                new_quarantined_finish_expected_at = time_now + datetime.timedelta(days=remain_qt)
+                if not old_quarantined_finish_expected_at or old_quarantined_finish_expected_at < new_quarantined_finish_expected_at:
+                    each_member.quarantined_finish_expected_at = new_quarantined_finish_expected_at
+                    changed_members += [each_member]
+        return changed_members
 
     def do_after_change_room_of_member_work(self, member, old_room):
         """
         run this function after moving a member from null room to a room, old room to new room or a room to out quarantine;
         old_room can be None, mean not have old_room;
         new_room is member.quarantine_room;
+        all changes of members in a room are calculated in memory then written with one bulk_update;
         """
         new_room = member.quarantine_room
+        time_now = timezone.now()
 
         # old room
         if old_room != None and new_room != old_room:
             if member.positive_test_now == True:
-                remain_members_in_old_room = old_room.member_x_quarantine_room.all().exclude(id=member.id)
-                number_of_remain_positive_member_in_old_room = remain_members_in_old_room.filter(positive_test_now=True).count()
+                remain_members_in_old_room = list(old_room.member_x_quarantine_room.all().exclude(id=member.id))
+                number_of_remain_positive_member_in_old_room = len([each_member for each_member in remain_members_in_old_room if each_member.positive_test_now == True])
                 if number_of_remain_positive_member_in_old_room == 0:
-                    quarantine_ward = old_room.quarantine_floor.quarantine_building.quarantine_ward
-                    for each_member in remain_members_in_old_room:
-                        if each_member.label != MemberLabel.F0:
-                            if quarantine_ward.pandemic:
-                                if each_member.number_of_vaccine_doses < 2:
-                                    remain_qt = quarantine_ward.pandemic.remain_qt_cc_pos_not_vac
-                                else:
-                                    remain_qt = quarantine_ward.pandemic.remain_qt_cc_pos_vac
-                            else:
-                                if each_member.number_of_vaccine_doses < 2:
-                                    remain_qt = int(os.environ.get('REMAIN_QT_CC_POS_NOT_VAC', 14))
-                                else:
-                                    remain_qt = int(os.environ.get('REMAIN_QT_CC_POS_VAC', 10))
-                            old_quarantined_finish_expected_at = each_member.quarantined_finish_expected_at
-                            new_quarantined_finish_expected_at = timezone.now() + datetime.timedelta(days=remain_qt)
-                            if not old_quarantined_finish_expected_at or old_quarantined_finish_expected_at < new_quarantined_finish_expected_at:
-                                each_member.quarantined_finish_expected_at = new_quarantined_finish_expected_at
-                                each_member.save()
+                    pandemic = old_room.quarantine_floor.quarantine_building.quarantine_ward.pandemic
+                    if pandemic:
+                        remain_qt_not_vac = pandemic.remain_qt_cc_pos_not_vac
+                        remain_qt_vac = pandemic.remain_qt_cc_pos_vac
+                    else:
+                        remain_qt_not_vac = int(os.environ.get('REMAIN_QT_CC_POS_NOT_VAC', 14))
+                        remain_qt_vac = int(os.environ.get('REMAIN_QT_CC_POS_VAC', 10))
+
+                    changed_members = self.extend_quarantined_finish_expected_at(remain_members_in_old_room, remain_qt_not_vac, remain_qt_vac, time_now)
+                    if changed_members:
+                        Member.objects.bulk_update(changed_members, ['quarantined_finish_expected_at'])
         
         # new room
         if new_room != None and new_room != old_room:
             if member.label != MemberLabel.F0:
                 all_members_in_new_room = list(new_room.member_x_quarantine_room.all().exclude(id=member.id))
+                number_of_other_members_in_new_room = len(all_members_in_new_room)
                 all_members_in_new_room.append(member)
 
+                changed_members = dict()
+
                 # set quarantined_finish_expected_at for all member in new room (include this member)
-                number_of_other_members_in_new_room = new_room.member_x_quarantine_room.all().exclude(id=member.id).count()
                 if number_of_other_members_in_new_room >= 1:
-                    quarantine_ward = new_room.quarantine_floor.quarantine_building.quarantine_ward
-                    for each_member in all_members_in_new_room:
-                        if each_member.label != MemberLabel.F0:
-                            if quarantine_ward.pandemic:
-                                if each_member.number_of_vaccine_doses < 2:
-                                    remain_qt = quarantine_ward.pandemic.remain_qt_cc_not_pos_not_vac
-                                else:
-                                    remain_qt = quarantine_ward.pandemic.remain_qt_cc_not_pos_vac
-                            else:
-                                if each_member.number_of_vaccine_doses < 2:
-                                    remain_qt = int(os.environ.get('REMAIN_QT_CC_NOT_POS_NOT_VAC', 7))
-                                else:
-                                    remain_qt = int(os.environ.get('REMAIN_QT_CC_NOT_POS_VAC', 5))
-                            old_quarantined_finish_expected_at = each_member.quarantined_finish_expected_at
-                            new_quarantined_finish_expected_at = timezone.now() + datetime.timedelta(days=remain_qt)
-                            if not old_quarantined_finish_expected_at or old_quarantined_finish_expected_at < new_quarantined_finish_expected_at:
-                                each_member.quarantined_finish_expected_at = new_quarantined_finish_expected_at
-                                each_member.save()
+                    pandemic = new_room.quarantine_floor.quarantine_building.quarantine_ward.pandemic
+                    if pandemic:
+                        remain_qt_not_vac = pandemic.remain_qt_cc_not_pos_not_vac
+                        remain_qt_vac = pandemic.remain_qt_cc_not_pos_vac
+                    else:
+                        remain_qt_not_vac = int(os.environ.get('REMAIN_QT_CC_NOT_POS_NOT_VAC', 7))
+                        remain_qt_vac = int(os.environ.get('REMAIN_QT_CC_NOT_POS_VAC', 5))
+
+                    for each_member in self.extend_quarantined_finish_expected_at(all_members_in_new_room, remain_qt_not_vac, remain_qt_vac, time_now):
+                        changed_members[each_member.id] = each_member
 
                 # set label
                 label_tool = LabelTool()
-                most_serious_label = member.label
-                for each_member in all_members_in_new_room:
-                    if label_tool.compare_label(each_member.label, most_serious_label) == 1:
-                        most_serious_label = each_member.label
+                most_serious_label = min(
+                    [each_member.label for each_member in all_members_in_new_room],
+                    key=label_tool.get_value_of_label,
+                )
                 if 0 <= label_tool.get_value_of_label(most_serious_label) <= 2:
                     down_label = label_tool.down_label(most_serious_label)
                     for each_member in all_members_in_new_room:
                         if label_tool.compare_label(each_member.label, down_label) == -1:
                             each_member.label = down_label
-                            each_member.save()
+                            changed_members[each_member.id] = each_member
+
+                if changed_members:
+                    Member.objects.bulk_update(list(changed_members.values()), ['quarantined_finish_expected_at', 'label'])
+
+    # columns of an imported file (csv, xlsx)
+    import_custom_user_fields = [
+        'full_name', 'email', 'phone_number',
+        'birthday', 'nationality_code', 'gender',
+        'country_code', 'city_id', 'district_id', 'ward_id', 'detail_address', 
+        'identity_number', 'health_insurance_number', 'passport_number',
+        'quarantine_ward_id',
+    ]
+
+    import_member_fields = [
+        'quarantine_room_id',
+        'label', 'quarantined_at', 'positive_tested_before',
+        'background_disease', 'other_background_disease',
+        'number_of_vaccine_doses', 'care_staff_code',
+    ]
+
+    def check_room_occupancy_for_member(self, room_occupancy, positive_test_now, num_day_to_close_room):
+        # Same as check_room_for_member for a new member, room is checked with its occupancy in memory
+        if room_occupancy.is_full():
+            return 'This room is full'
+        if positive_test_now == True:
+            if room_occupancy.num_not_positive >= 1:
+                return 'This member positive, but this room has member that is not positive'
+        else:
+            if room_occupancy.num_positive >= 1:
+                return 'This room has member that is positive'
+            if room_occupancy.is_close(num_day_to_close_room):
+                return 'This room is close (not accept any more member)'
+        return messages.SUCCESS
+
+    def get_room_occupancy(self, room_occupancies_of_ward, quarantine_ward, room):
+        for occupancy in room_occupancies_of_ward[quarantine_ward.id]:
+            if occupancy.room.id == room.id:
+                return occupancy
+        # room is created after occupancies are loaded
+        room_occupancies_of_ward[quarantine_ward.id] = get_room_occupancies(quarantine_ward)
+        for occupancy in room_occupancies_of_ward[quarantine_ward.id]:
+            if occupancy.room.id == room.id:
+                return occupancy
+        raise exceptions.NotFoundException({'quarantine_room_id': messages.NOT_EXIST})
+
+    def iter_rows_of_member_file(self, file_name):
+        """
+        Read rows of an imported file (csv, xlsx) one by one, xlsx file is opened in read only mode.
+        Yield (row_index, list of values, is_csv_file), empty rows are skipped
+        """
+
+        extension = os.path.splitext(str(file_name))[1]
+        iter_rows = None
+        wb = None
+        is_csv_file = False
+        if (extension == ".xlsx"):
+            wb = openpyxl.load_workbook(file_name, read_only=True)
+            ws = wb["Sheet1"]
+            iter_rows = ws.iter_rows(min_row=2, min_col=2, max_col=25, values_only=True)
+        elif (extension == ".csv"):
+            iter_rows = csv.DictReader(codecs.iterdecode(file_name, encoding='utf-8'))
+            is_csv_file = True
+
+        try:
+            for row_index, row in enumerate(iter_rows):
+                if is_csv_file:
+                    row = list(row.values())[1:]
+                else:
+                    row = list(row)
+                if row[0] in [None, '']:
+                    continue
+                yield row_index, row, is_csv_file
+        finally:
+            if wb:
+                wb.close()
+
+    def parse_member_row(self, row, is_csv_file):
+        """
+        Return (dict_custom_user_data, dict_member_data, is_available) of a row of an imported file
+        """
+
+        gender_switcher = {
+            "Nam": 'MALE',
+            "Nữ": 'FEMALE',
+        }
+
+        boolean_switcher = {
+            "Có": True,
+            "Không": False
+        }
+
+        dict_custom_user_data = dict()
+        dict_member_data = dict()
+        is_available = False
+
+        for index, value in enumerate(row):
+            if (index < 15):
+                if index == 3:
+                    if (value != None):
+                        if not is_csv_file: 
+                            value = value.strftime('%d/%m/%Y')
+                        else:
+                            value = str(value)
+                            value = str(datetime.datetime.strptime(value, '%d/%m/%Y').strftime('%d/%m/%Y'))
+                    else:
+                        continue
+                elif index == 5:
+                    value = str(value)
+                    value = gender_switcher[value]
+                elif index in [7, 8, 9, 14]:
+                    value = int(value)
+                elif (index == 11):
+                    if value == None or value == "":
+                        continue
+                else:
+                    value = str(value)
+                dict_custom_user_data[self.import_custom_user_fields[index]] = value
+
+            elif (index == 15):
+
+                if str(value) == "Có":
+                    is_available = True
+            elif (index == 17):
+                if not is_available:
+                    if value == None or value == "":
+                        continue
+            else:
+                if (index == 18):
+                    if (value != None):
+                        if not is_csv_file:
+                            value = value.strftime('%Y-%m-%dT%H:%M:%S.%f%zZ')
+                        else:
+                            value = str(value)
+                            value = str(datetime.datetime.strptime(value, '%d/%m/%Y').strftime('%Y-%m-%dT%H:%M:%S.%f%zZ'))
+                    
+                if value in ["Có", "Không"]:
+                    value = str(value)
+                    value = boolean_switcher[value]
+                if value != None or value != "":
+                    dict_member_data[self.import_member_fields[index - 16]] = value
+
+        return dict_custom_user_data, dict_member_data, is_available
+
+    def import_members_from_file(self, file_name, created_by, on_progress=None):
+        """
+        Create members from rows of an imported file (csv, xlsx), chunk by chunk.
+        on_progress(num_processed, custom_user_ids, error) is called after each chunk.
+        Return (custom_user_ids, error)
+        """
+
+        error = dict()
+        custom_user_ids = list()
+        num_processed = 0
+        # occupancy of rooms of each quarantine ward, loaded once and updated after each created member
+        room_occupancies_of_ward = dict()
+        member_role = Role.objects.get(name='MEMBER')
+        chunk_size = int(os.environ.get('MEMBER_IMPORT_CHUNK_SIZE', 300))
+        # default password is hashed once for this file, not for each row
+        password_hash = get_default_password_hash()
+
+        def create_chunk(chunk):
+            self.create_members_of_chunk(chunk, created_by, member_role, password_hash, room_occupancies_of_ward, custom_user_ids, error)
+            if on_progress:
+                on_progress(num_processed, custom_user_ids, error)
+
+        # rows are read one by one, each chunk is validated and created in its own transaction
+        chunk = []
+        for row in self.iter_rows_of_member_file(file_name):
+            chunk += [row]
+            num_processed += 1
+            if len(chunk) >= chunk_size:
+                create_chunk(chunk)
+                chunk = []
+        if chunk:
+            create_chunk(chunk)
+
+        return custom_user_ids, error
+
+    def create_members_of_chunk(self, chunk, created_by, member_role, password_hash, room_occupancies_of_ward, custom_user_ids, error):
+        """
+        Validate a chunk of rows of an imported file, then create valid members with bulk_create in one transaction,
+        if this transaction fails, valid rows are saved again one by one, so only rows that cannot be saved get an error.
+        chunk: list of (row_index, list of values, is_csv_file)
+        password_hash: hash of the default password, made once for the imported file
+        room_occupancies_of_ward: occupancy of rooms of each quarantine ward, loaded once and updated after each accepted member
+        Ids of created users are added to custom_user_ids, errors of rows are added to error
+        """
+
+        parsed_rows = []
+        for row_index, row, is_csv_file in chunk:
+            try:
+                parsed_rows += [(row_index, *self.parse_member_row(row, is_csv_file))]
+            except Exception as e:
+                error[str(row_index + 1)] = str(e)
+
+        # load objects of all rows with one query for each model
+        lookup = MemberImportLookup([
+            {**dict_custom_user_data, **dict_member_data}
+            for row_index, dict_custom_user_data, dict_member_data, is_available in parsed_rows
+        ])
+
+        custom_user_field = set(self.import_custom_user_fields) - \
+        {'nationality_code', 'country_code', 'city_id', 'district_id', 'ward_id', 'quarantine_ward_id'}
+        custom_user_field = list(custom_user_field) + \
+        [
+            'nationality', 'country', 'city', 'district', 'ward',
+            'quarantine_ward',
+        ]
+
+        member_field = set(self.import_member_fields) - \
+        {'quarantine_room_id', 'care_staff_code'}
+        member_field = list(member_field) + \
+        ['quarantined_at', 'quarantined_finish_expected_at', 'positive_test_now', 'care_staff',]
+
+        accepted_rows = []
+        for row_index, dict_custom_user_data, dict_member_data, is_available in parsed_rows:
+            try:
+                user_validator = MemberImportValidator(lookup=lookup, **dict_custom_user_data)
+                user_validator.is_valid_fields([
+                    'phone_number', 'email', 'birthday', 'gender',
+                    'passport_number', 'health_insurance_number', 'identity_number',
+                ])
+                user_validator.extra_validate_to_create_member()
+
+                # create CustomUser
+                dict_to_create_custom_user = user_validator.get_data(custom_user_field)
+
+                custom_user = CustomUser(**dict_to_create_custom_user)
+                custom_user.password = password_hash
+                custom_user.created_by = created_by
+                custom_user.updated_by = created_by
+                custom_user.role = member_role
+                if not is_available:
+                    dict_member_data.pop("quarantine_room")
+                    custom_user.status = CustomUserStatus.WAITING
+
+                # create Member
+                dict_member_data["quarantine_ward"] = custom_user.quarantine_ward
+
+                member_validator = MemberImportValidator(lookup=lookup, **dict_member_data)
+                member_validator.is_valid_fields([
+                    'label', 'quarantined_at', 'positive_tested_before',
+                    'background_disease', 'number_of_vaccine_doses',
+                ])
+                member_validator.extra_validate_to_create_member()
+
+                dict_to_create_member = member_validator.get_data(member_field)
+
+                member = Member(**dict_to_create_member)
+                member.custom_user = custom_user
+
+                quarantine_history = None
+                room_occupancy = None
+
+                # extra set room for this member
+                if is_available:
+                    quarantine_ward = custom_user.quarantine_ward
+                    if quarantine_ward.id not in room_occupancies_of_ward:
+                        room_occupancies_of_ward[quarantine_ward.id] = get_room_occupancies(quarantine_ward)
+
+                    if quarantine_ward.pandemic:
+                        num_day_to_close_room = quarantine_ward.pandemic.num_day_to_close_room
+                    else:
+                        num_day_to_close_room = int(os.environ.get('NUM_DAY_TO_CLOSE_ROOM', 1))
+
+                    if hasattr(member_validator, '_quarantine_room'):
+                        # this field is received and not None
+                        quarantine_room = member_validator.get_field('quarantine_room')
+                        if quarantine_room.quarantine_floor.quarantine_building.quarantine_ward != quarantine_ward:
+                            raise exceptions.ValidationException({'quarantine_room_id': 'This room is not in the quarantine ward of this user'})
+                        room_occupancy = self.get_room_occupancy(room_occupancies_of_ward, quarantine_ward, quarantine_room)
+                        check_room_result = self.check_room_occupancy_for_member(room_occupancy, member.positive_test_now, num_day_to_close_room)
+                        if check_room_result != messages.SUCCESS:
+                            raise exceptions.ValidationException({'quarantine_room_id': check_room_result})
+                    else:
+                        suitable_room_occupancy_dict = choose_suitable_room(
+                            room_occupancies_of_ward[quarantine_ward.id],
+                            gender=custom_user.gender,
+                            label=member.label,
+                            positive_test_now=member.positive_test_now,
+                            number_of_vaccine_doses=member.number_of_vaccine_doses,
+                            num_day_to_close_room=num_day_to_close_room,
+                        )
+                        if not suitable_room_occupancy_dict['room_occupancy']:
+                            raise exceptions.ValidationException({'main': suitable_room_occupancy_dict['warning']})
+                        room_occupancy = suitable_room_occupancy_dict['room_occupancy']
+
+                    member.quarantine_room = room_occupancy.room
+                    member.number_of_vaccine_doses = 0
+
+                    # create QuarantineHistory
+                    quarantine_history = QuarantineHistory(
+                        user=custom_user,
+                        pandemic=custom_user.quarantine_ward.pandemic,
+                        quarantine_ward=custom_user.quarantine_ward,
+                        quarantine_room=member.quarantine_room,
+                        status=QuarantineHistoryStatus.PRESENT,
+                        start_date=member.quarantined_at,
+                        created_by=created_by,
+                        updated_by=created_by,
+                    )
+
+                    room_occupancy.add_member(
+                        label=member.label,
+                        gender=custom_user.gender,
+                        positive_test_now=member.positive_test_now,
+                        number_of_vaccine_doses=member.number_of_vaccine_doses,
+                        quarantined_at=member.quarantined_at,
+                    )
+
+                lookup.add_identifiers(custom_user)
+                accepted_rows += [(row_index, custom_user, member, quarantine_history)]
+            except Exception as e:
+                error[str(row_index + 1)] = str(e)
+
+        if not accepted_rows:
+            return
+
+        # set codes of all users, check existed codes in one query
+        used_codes = set()
+        remaining_custom_users = [custom_user for row_index, custom_user, member, quarantine_history in accepted_rows]
+        while remaining_custom_users:
+            for custom_user in remaining_custom_users:
+                custom_user.code = custom_user_code_generator(custom_user.quarantine_ward.id)
+                while custom_user.code in used_codes:
+                    custom_user.code = custom_user_code_generator(custom_user.quarantine_ward.id)
+                used_codes.add(custom_user.code)
+
+            existed_codes = set(CustomUser.objects.filter(
+                code__in=[custom_user.code for custom_user in remaining_custom_users],
+            ).values_list('code', flat=True))
+            remaining_custom_users = [custom_user for custom_user in remaining_custom_users if custom_user.code in existed_codes]
+
+        try:
+            members = self.save_accepted_rows_of_chunk(accepted_rows, room_occupancies_of_ward, error)
+        except Exception:
+            # find rows that cannot be saved: save rows one by one, each in its own transaction
+            room_occupancies_of_ward.clear()
+            members = []
+            for accepted_row in accepted_rows:
+                self.reset_accepted_row(accepted_row)
+                try:
+                    members += self.save_accepted_rows_of_chunk([accepted_row], room_occupancies_of_ward, error)
+                except Exception as e:
+                    error[str(accepted_row[0] + 1)] = str(e)
+
+        if not members:
+            return
+
+        # after commit, rows of WardDailyStats are not locked while rooms are
+        update_ward_daily_stats_of_in_members([
+            (None, None, member.custom_user.quarantine_ward_id, member.quarantined_at) for member in members
+        ])
+
+        custom_user_ids += [member.custom_user.id for member in members]
+
+    def save_accepted_rows_of_chunk(self, accepted_rows, room_occupancies_of_ward, error):
+        """
+        Create users, members, quarantine histories of accepted rows with bulk_create in one transaction.
+        accepted_rows: list of (row_index, custom_user, member, quarantine_history)
+        Rows whose room is full are not saved, their errors are added to error.
+        Return saved members
+        """
+
+        with transaction.atomic():
+            # lock rooms, check again that they have enough slots for members of this chunk
+            dict_of_available_slot = {
+                room.id: room.capacity - room.num_current_member
+                for room in lock_rooms({member.quarantine_room_id for row_index, custom_user, member, quarantine_history in accepted_rows if member.quarantine_room_id})
+            }
+            saved_rows = []
+            for row_index, custom_user, member, quarantine_history in accepted_rows:
+                if member.quarantine_room_id:
+                    if dict_of_available_slot.get(member.quarantine_room_id, 0) <= 0:
+                        error[str(row_index + 1)] = str(exceptions.ValidationException({'quarantine_room_id': 'This room is full'}))
+                        # occupancy in memory is wrong, load again for next chunk
+                        room_occupancies_of_ward.pop(custom_user.quarantine_ward_id, None)
+                        continue
+                    dict_of_available_slot[member.quarantine_room_id] -= 1
+                saved_rows += [(row_index, custom_user, member, quarantine_history)]
+
+            custom_users = [custom_user for row_index, custom_user, member, quarantine_history in saved_rows]
+            members = [member for row_index, custom_user, member, quarantine_history in saved_rows]
+            quarantine_histories = [quarantine_history for row_index, custom_user, member, quarantine_history in saved_rows if quarantine_history]
+
+            for custom_user in custom_users:
+                custom_user.normalized_full_name = normalize_name(custom_user.full_name)
+            CustomUser.objects.bulk_create(custom_users)
+
+            set_location_of_members(members)
+            Member.objects.bulk_create(members)
+            update_counters_of_members(members)
+
+            QuarantineHistory.objects.bulk_create(quarantine_histories)
+
+            # all new members of a room are already saved, so work of this room is done once
+            dict_of_member_of_room = dict()
+            for member in members:
+                if member.quarantine_room_id and member.label != MemberLabel.F0:
+                    dict_of_member_of_room.setdefault(member.quarantine_room_id, member)
+            for member in dict_of_member_of_room.values():
+                self.do_after_change_room_of_member_work(member, None)
+
+        return members
+
+    def reset_accepted_row(self, accepted_row):
+        """
+        Objects of a row saved by a rolled back transaction keep ids given by the database,
+        clear them so that this row can be saved again.
+        """
+
+        row_index, custom_user, member, quarantine_history = accepted_row
+        custom_user.pk = None
+        custom_user._state.adding = True
+        member.pk = None
+        member._state.adding = True
+        member.custom_user = custom_user
+        member.__dict__.pop('_loaded_quarantine_room_id', None)
+        member.__dict__.pop('_loaded_care_staff_id', None)
+        if quarantine_history:
+            quarantine_history.pk = None
+            quarantine_history._state.adding = True
+            quarantine_history.user = custom_user
 
     @csrf_exempt
     @query_debugger
@@ -1101,6 +1538,8 @@ class MemberAPI(AbstractView):
 
             quarantine_history.save()
 
+            update_ward_daily_stats_of_in_member(None, None, custom_user.quarantine_ward_id, member.quarantined_at)
+
             self.do_after_change_room_of_member_work(member, None)
 
             member = Member.objects.get(id=member.id)
@@ -1120,225 +1559,21 @@ class MemberAPI(AbstractView):
     @query_debugger
     @action(methods=['POST'], url_path='create_by_file', detail=False)
     def create_member_by_file(self, request):
-        """Create a member by file (csv, xlsx)
+        """Create members by file (csv, xlsx) in background, return the import job
 
         Args:
             + file: .csv, .xlsx
         """
 
-        gender_switcher = {
-            "Nam": 'MALE',
-            "Nữ": 'FEMALE',
-        }
-
-        boolean_switcher = {
-            "Có": True,
-            "Không": False
-        }
-
-        custom_user_fields = [
-            'full_name', 'email', 'phone_number',
-            'birthday', 'nationality_code', 'gender',
-            'country_code', 'city_id', 'district_id', 'ward_id', 'detail_address', 
-            'identity_number', 'health_insurance_number', 'passport_number',
-            'quarantine_ward_id',
-        ]
-
-        member_fields = [
-            'quarantine_room_id',
-            'label', 'quarantined_at', 'positive_tested_before',
-            'background_disease', 'other_background_disease',
-            'number_of_vaccine_doses', 'care_staff_code',
-        ]
-
         try:
             if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
                 raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
 
             file_name = request.FILES.get('file', False)
             if file_name:
-                extension = os.path.splitext(str(file_name))[1]
-                iter_rows = None
-                error = dict()
-                custom_user_ids = list()
-                is_csv_file = False
-
-                if (extension == ".xlsx"):
-                    wb = openpyxl.load_workbook(file_name)
-                    ws = wb["Sheet1"]
-                    iter_rows = ws.iter_rows(min_row=2, min_col=2, max_col=25)
-                elif (extension == ".csv"):
-                    iter_rows = csv.DictReader(codecs.iterdecode(file_name, encoding='utf-8'))
-                    is_csv_file = True
-
-                for row_index, row in enumerate(iter_rows):
-                    try:
-                        dict_custom_user_data = dict()
-                        dict_member_data = dict()
-                        is_available = False
-                        check_data = None
-
-                        if is_csv_file: 
-                            row = list(row.values())[1:]
-                            check_data = row[0]
-                        else:
-                            check_data = row[0].value
-                        if check_data in [None, '']:
-                            continue
-
-                        for index, data in enumerate(row):
-                            value = data.value if not is_csv_file else data
-                            if (index < 15):
-                                if index == 3:
-                                    if (value != None):
-                                        if not is_csv_file: 
-                                            value = value.strftime('%d/%m/%Y')
-                                        else:
-                                            value = str(value)
-                                            value = str(datetime.datetime.strptime(value, '%d/%m/%Y').strftime('%d/%m/%Y'))
-                                    else:
-                                        continue
-                                elif index == 5:
-                                    value = str(value)
-                                    value = gender_switcher[value]
-                                elif index in [7, 8, 9, 14]:
-                                    value = int(value)
-                                elif (index == 11):
-                                    if value == None or value == "":
-                                        continue
-                                else:
-                                    value = str(value)
-                                dict_custom_user_data[custom_user_fields[index]] = value
-
-                            elif (index == 15):
-
-                                if str(value) == "Có":
-                                    is_available = True
-                            elif (index == 17):
-                                if not is_available:
-                                    if value == None or value == "":
-                                        continue
-                            else:
-                                if (index == 18):
-                                    if (value != None):
-                                        if not is_csv_file:
-                                            value = value.strftime('%Y-%m-%dT%H:%M:%S.%f%zZ')
-                                        else:
-                                            value = str(value)
-                                            value = str(datetime.datetime.strptime(value, '%d/%m/%Y').strftime('%Y-%m-%dT%H:%M:%S.%f%zZ'))
-                                    
-                                if value in ["Có", "Không"]:
-                                    value = str(value)
-                                    value = boolean_switcher[value]
-                                if value != None or value != "":
-                                    dict_member_data[member_fields[index - 16]] = value
-                        user_validator = UserValidator(**dict_custom_user_data)
-                        user_validator.is_valid_fields([
-                            'phone_number', 'email', 'birthday', 'gender',
-                            'passport_number', 'health_insurance_number', 'identity_number',
-                        ])
-                        user_validator.extra_validate_to_create_member()
-
-                        # create CustomUser
-                        custom_user_field = set(custom_user_fields) - \
-                        {'nationality_code', 'country_code', 'city_id', 'district_id', 'ward_id', 'quarantine_ward_id'}
-                        custom_user_field = list(custom_user_field) + \
-                        [
-                            'nationality', 'country', 'city', 'district', 'ward',
-                            'quarantine_ward',
-                        ]
-
-                        dict_to_create_custom_user = user_validator.get_data(custom_user_field)
-
-                        custom_user = CustomUser(**dict_to_create_custom_user)
-                        custom_user.set_password('123456')
-                        custom_user.code = custom_user_code_generator(custom_user.quarantine_ward.id)
-                        while (user_validator.is_code_exist(custom_user.code)):
-                            custom_user.code = custom_user_code_generator(custom_user.quarantine_ward.id)
-                        custom_user.created_by = request.user
-                        custom_user.updated_by = request.user
-                        custom_user.role = Role.objects.get(name='MEMBER')
-                        if not is_available:
-                            dict_member_data.pop("quarantine_room")
-                            custom_user.status = CustomUserStatus.WAITING
-                        
-                        # create Member
-                        dict_member_data["quarantine_ward"] = custom_user.quarantine_ward
-                        
-                        member_validator = UserValidator(**dict_member_data)
-                        member_validator.is_valid_fields([
-                            'label', 'quarantined_at', 'positive_tested_before',
-                            'background_disease', 'number_of_vaccine_doses',
-                        ])
-                        member_validator.extra_validate_to_create_member()
-                
-                        member_field = set(member_fields) - \
-                        {'quarantine_room_id', 'care_staff_code'}
-                        member_field = list(member_field) + \
-                        ['quarantined_at', 'quarantined_finish_expected_at', 'positive_test_now', 'care_staff',]
-
-                        dict_to_create_member = member_validator.get_data(member_field)
-
-                        member = Member(**dict_to_create_member)
-                        member.custom_user = custom_user
-
-                        # extra set room for this member
-                        if is_available:
-                            if hasattr(member_validator, '_quarantine_room'):
-                                # this field is received and not None
-                                quarantine_room = member_validator.get_field('quarantine_room')
-                                check_room_result = self.check_room_for_member(custom_user, quarantine_room)
-                                if check_room_result != messages.SUCCESS:
-                                    raise exceptions.ValidationException({'quarantine_room_id': check_room_result})
-                            else:
-                                input_dict_for_get_suitable_room = dict()
-                                input_dict_for_get_suitable_room['quarantine_ward'] = custom_user.quarantine_ward
-                                input_dict_for_get_suitable_room['gender'] = custom_user.gender
-                                input_dict_for_get_suitable_room['label'] = member.label
-                                input_dict_for_get_suitable_room['positive_test_now'] = member.positive_test_now
-                                input_dict_for_get_suitable_room['number_of_vaccine_doses'] = member.number_of_vaccine_doses
-                                input_dict_for_get_suitable_room['old_quarantine_room'] = None
-                                input_dict_for_get_suitable_room['not_quarantine_room_ids'] = []
-
-                                suitable_room_dict = self.get_suitable_room_for_member(input_dict=input_dict_for_get_suitable_room)
-                                quarantine_room = suitable_room_dict['room']
-                                warning = suitable_room_dict['warning']
-                                if not quarantine_room:
-                                    raise exceptions.ValidationException({'main': warning})
-
-                            member.quarantine_room = quarantine_room
-                            member.number_of_vaccine_doses = 0
-
-                            # create QuarantineHistory
-                            quarantine_history = QuarantineHistory(
-                                user=custom_user,
-                                pandemic=custom_user.quarantine_ward.pandemic,
-                                quarantine_ward=custom_user.quarantine_ward,
-                                quarantine_room=member.quarantine_room,
-                                status=QuarantineHistoryStatus.PRESENT,
-                                start_date=member.quarantined_at,
-                                created_by=request.user,
-                                updated_by=request.user,
-                            )
-
-                        custom_user.save()
-                        member.save()
-
-                        if is_available:
-                            quarantine_history.save()
-                            self.do_after_change_room_of_member_work(member, None)
-
-                        custom_user_ids += [custom_user.id]
-                    except Exception as e:
-                        error[str(row_index + 1)] = str(e)
-                        pass
-                
-                custom_user_data = CustomUser.objects.filter(id__in=custom_user_ids)
-                member_serializer = FilterMemberSerializer(custom_user_data, many=True)
-                response_data = dict()
-                response_data["user_success"] = member_serializer.data
-                response_data["user_fail"] = error
-                
+                # file is processed by worker.py, result is polled with import_job/get
+                import_job = create_import_job(ImportJobType.MEMBER, file_name, request.user)
+                response_data = ImportJobSerializer(import_job, many=False).data
             else:
                 raise exceptions.InvalidArgumentException({'main': messages.FILE_IMPORT_EMPTY})
 
@@ -1779,6 +2014,9 @@ class MemberAPI(AbstractView):
             if request.user.role.name == 'MEMBER' and request.user != custom_user:
                 raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
 
+            old_quarantine_ward_id = custom_user.quarantine_ward_id
+            old_quarantined_at = custom_user.member_x_custom_user.quarantined_at
+
             list_to_update_custom_user = [key for key in accepted_fields.keys() if key in custom_user_fields]
             list_to_update_custom_user = set(list_to_update_custom_user) - \
             {'code', 'nationality_code', 'country_code', 'city_id', 'district_id', 'ward_id', 'quarantine_ward_id'}
@@ -1918,6 +2156,8 @@ class MemberAPI(AbstractView):
             custom_user.save()
             member.save()
 
+            update_ward_daily_stats_of_in_member(old_quarantine_ward_id, old_quarantined_at, custom_user.quarantine_ward_id, member.quarantined_at)
+
             self.do_after_change_room_of_member_work(member, old_room)
 
             member = Member.objects.get(id=member.id)
@@ -2004,6 +2244,7 @@ class MemberAPI(AbstractView):
                     raise exceptions.ValidationException({field: messages.EMPTY})
             
             # quarantined_at
+            old_quarantined_at = member.quarantined_at
             if not quarantined_at:
                 quarantined_at = timezone.now()
             member.quarantined_at = quarantined_at
@@ -2081,7 +2322,6 @@ class MemberAPI(AbstractView):
             custom_user.status = CustomUserStatus.AVAILABLE
             custom_user.created_by = request.user
             custom_user.updated_by = request.user
-            member.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
 
             # create QuarantineHistory
             old_present_quarantine_history = QuarantineHistory.objects.filter(user=custom_user, status=QuarantineHistoryStatus.PRESENT)
@@ -2099,10 +2339,15 @@ class MemberAPI(AbstractView):
                 updated_by=request.user,
             )
 
-            quarantine_history.save()
+            with transaction.atomic():
+                self.reserve_room_for_member(member.quarantine_room)
 
-            custom_user.save()
-            member.save()
+                quarantine_history.save()
+
+                custom_user.save()
+                member.save()
+
+            update_ward_daily_stats_of_in_member(custom_user.quarantine_ward_id, old_quarantined_at, custom_user.quarantine_ward_id, member.quarantined_at)
 
             # Send notification
             title = 'Xét duyệt tài khoản'
@@ -2156,6 +2401,9 @@ class MemberAPI(AbstractView):
 
             custom_users = validator.get_field('members')
 
+            # check all members, then choose rooms for each quarantine ward in one pass
+
+            accepted_custom_users = []
             for custom_user in custom_users:
                 if custom_user.role.name != 'MEMBER' or not hasattr(custom_user, 'member_x_custom_user'):
                     return_data[custom_user.code] = messages.ISNOTMEMBER
@@ -2192,100 +2440,169 @@ class MemberAPI(AbstractView):
 
                 if is_continue_another_custom_user:
                     continue
-                
-                # set room
-                input_dict_for_get_suitable_room = dict()
-                input_dict_for_get_suitable_room['quarantine_ward'] = custom_user.quarantine_ward
-                input_dict_for_get_suitable_room['gender'] = custom_user.gender
-                input_dict_for_get_suitable_room['label'] = member.label
-                input_dict_for_get_suitable_room['positive_test_now'] = member.positive_test_now
-                input_dict_for_get_suitable_room['number_of_vaccine_doses'] = member.number_of_vaccine_doses
-                input_dict_for_get_suitable_room['old_quarantine_room'] = None
-                input_dict_for_get_suitable_room['not_quarantine_room_ids'] = []
 
-                suitable_room_dict = self.get_suitable_room_for_member(input_dict=input_dict_for_get_suitable_room)
-                quarantine_room = suitable_room_dict['room']
-                warning = suitable_room_dict['warning']
-                if not quarantine_room:
-                    return_data[custom_user.code] = warning
+                accepted_custom_users += [custom_user]
+
+            # check present quarantine history (and same member code sent twice)
+            user_ids_with_present_quarantine_history = set(QuarantineHistory.objects.filter(
+                user__in=accepted_custom_users,
+                status=QuarantineHistoryStatus.PRESENT,
+            ).values_list('user_id', flat=True))
+
+            custom_users_of_ward = dict()
+            for custom_user in accepted_custom_users:
+                if custom_user.id in user_ids_with_present_quarantine_history:
+                    return_data[custom_user.code] = messages.PRESENT_QUARANTINE_HISTORY_EXIST
                     continue
+                user_ids_with_present_quarantine_history.add(custom_user.id)
+                custom_users_of_ward.setdefault(custom_user.quarantine_ward.id, []).append(custom_user)
+
+            quarantined_at = timezone.now()
+            updated_custom_users = []
+            updated_members = []
+            quarantine_histories = []
+            ward_daily_stats_changes = []
+
+            for custom_users_in_ward in custom_users_of_ward.values():
+                quarantine_ward = custom_users_in_ward[0].quarantine_ward
+
+                if quarantine_ward.pandemic:
+                    num_day_to_close_room = quarantine_ward.pandemic.num_day_to_close_room
                 else:
-                    member.quarantine_room = quarantine_room
+                    num_day_to_close_room = int(os.environ.get('NUM_DAY_TO_CLOSE_ROOM', 1))
 
-                # set care_staff
-                if not member.care_staff:
-                    input_dict_for_get_care_staff = dict()
-                    input_dict_for_get_care_staff['quarantine_floor'] = member.quarantine_room.quarantine_floor
+                # set room
+                suitable_room_occupancy_dicts = allocate_rooms(
+                    get_room_occupancies(quarantine_ward),
+                    members_info=[{
+                        'gender': custom_user.gender,
+                        'label': custom_user.member_x_custom_user.label,
+                        'positive_test_now': custom_user.member_x_custom_user.positive_test_now,
+                        'number_of_vaccine_doses': custom_user.member_x_custom_user.number_of_vaccine_doses,
+                        'quarantined_at': quarantined_at,
+                    } for custom_user in custom_users_in_ward],
+                    num_day_to_close_room=num_day_to_close_room,
+                    time_now=quarantined_at,
+                )
 
-                    suitable_care_staff_dict = self.get_suitable_care_staff_for_member(input_dict=input_dict_for_get_care_staff)
-                    care_staff = suitable_care_staff_dict['care_staff']
-                    warning = suitable_care_staff_dict['warning']
-                    if care_staff:
-                        member.care_staff = care_staff
+                care_staff_loads = None
 
-                custom_user.status = CustomUserStatus.AVAILABLE
+                for custom_user, suitable_room_occupancy_dict in zip(custom_users_in_ward, suitable_room_occupancy_dicts):
+                    member = custom_user.member_x_custom_user
 
-                # set quarantined_at
-                quarantined_at = timezone.now()
-                member.quarantined_at = quarantined_at
-                if member.label == MemberLabel.F0:
-                    if custom_user.quarantine_ward.pandemic:
-                        if member.number_of_vaccine_doses < 2:
-                            remain_qt = custom_user.quarantine_ward.pandemic.remain_qt_pos_not_vac
-                        else:
-                            remain_qt = custom_user.quarantine_ward.pandemic.remain_qt_pos_vac
-                    else:
-                        if member.number_of_vaccine_doses < 2:
-                            remain_qt = int(os.environ.get('REMAIN_QT_POS_NOT_VAC', 14))
-                        else:
-                            remain_qt = int(os.environ.get('REMAIN_QT_POS_VAC', 10))
-                    member.quarantined_finish_expected_at = quarantined_at + datetime.timedelta(days=remain_qt)
-                else:
-                    if custom_user.quarantine_ward.pandemic:
-                        if member.number_of_vaccine_doses < 2:
-                            remain_qt = custom_user.quarantine_ward.pandemic.quarantine_time_not_vac
+                    room_occupancy = suitable_room_occupancy_dict['room_occupancy']
+                    if not room_occupancy:
+                        return_data[custom_user.code] = suitable_room_occupancy_dict['warning']
+                        continue
+                    member.quarantine_room = room_occupancy.room
+
+                    # set care_staff
+                    if not member.care_staff:
+                        if care_staff_loads is None:
+                            care_staff_loads = get_care_staff_loads(quarantine_ward)
+                        care_staff = choose_care_staff(care_staff_loads, member.quarantine_room.quarantine_floor)
+                        if care_staff:
+                            member.care_staff = care_staff
+
+                    # set quarantined_at
+                    old_quarantined_at = member.quarantined_at
+                    member.quarantined_at = quarantined_at
+                    if member.label == MemberLabel.F0:
+                        if quarantine_ward.pandemic:
+                            if member.number_of_vaccine_doses < 2:
+                                remain_qt = quarantine_ward.pandemic.remain_qt_pos_not_vac
+                            else:
+                                remain_qt = quarantine_ward.pandemic.remain_qt_pos_vac
                         else:
-                            remain_qt = custom_user.quarantine_ward.pandemic.quarantine_time_vac
+                            if member.number_of_vaccine_doses < 2:
+                                remain_qt = int(os.environ.get('REMAIN_QT_POS_NOT_VAC', 14))
+                            else:
+                                remain_qt = int(os.environ.get('REMAIN_QT_POS_VAC', 10))
+                        member.quarantined_finish_expected_at = quarantined_at + datetime.timedelta(days=remain_qt)
                     else:
-                        if member.number_of_vaccine_doses < 2:
-                            remain_qt = int(os.environ.get('QUARANTINE_TIME_NOT_VAC', 14))
+                        if quarantine_ward.pandemic:
+                            if member.number_of_vaccine_doses < 2:
+                                remain_qt = quarantine_ward.pandemic.quarantine_time_not_vac
+                            else:
+                                remain_qt = quarantine_ward.pandemic.quarantine_time_vac
                         else:
-                            remain_qt = int(os.environ.get('QUARANTINE_TIME_VAC', 10))
-                    member.quarantined_finish_expected_at = quarantined_at + datetime.timedelta(days=remain_qt)
+                            if member.number_of_vaccine_doses < 2:
+                                remain_qt = int(os.environ.get('QUARANTINE_TIME_NOT_VAC', 14))
+                            else:
+                                remain_qt = int(os.environ.get('QUARANTINE_TIME_VAC', 10))
+                        member.quarantined_finish_expected_at = quarantined_at + datetime.timedelta(days=remain_qt)
 
-                member.number_of_vaccine_doses = VaccineDose.objects.filter(custom_user=custom_user).count()
+                    custom_user.created_by = request.user
+                    custom_user.updated_by = request.user
+                    custom_user.updated_at = quarantined_at
 
-                custom_user.created_by = request.user
-                custom_user.updated_by = request.user
+                    # create QuarantineHistory
+                    quarantine_histories += [QuarantineHistory(
+                        user=custom_user,
+                        pandemic=quarantine_ward.pandemic,
+                        quarantine_ward=quarantine_ward,
+                        quarantine_room=member.quarantine_room,
+                        status=QuarantineHistoryStatus.PRESENT,
+                        start_date=member.quarantined_at,
+                        created_by=request.user,
+                        updated_by=request.user,
+                    )]
+
+                    updated_custom_users += [custom_user]
+                    updated_members += [member]
+                    ward_daily_stats_changes += [(quarantine_ward.id, old_quarantined_at, quarantine_ward.id, member.quarantined_at)]
+
+            with transaction.atomic():
+                # lock chosen rooms until the end of this transaction, then check capacity again;
+                # members over capacity (room is filled by another admission at the same time) are not accepted
+                available_slots = {
+                    room.id: room.capacity - room.num_current_member
+                    for room in lock_rooms({member.quarantine_room_id for member in updated_members})
+                }
 
-                # create QuarantineHistory
-                old_present_quarantine_history = QuarantineHistory.objects.filter(user=custom_user, status=QuarantineHistoryStatus.PRESENT)
-                if len(list(old_present_quarantine_history)) > 0:
-                    return_data[custom_user.code] = messages.PRESENT_QUARANTINE_HISTORY_EXIST
-                    continue
+                index_of_accepted_members = []
+                for index, member in enumerate(updated_members):
+                    if available_slots.get(member.quarantine_room_id, 0) > 0:
+                        available_slots[member.quarantine_room_id] -= 1
+                        index_of_accepted_members += [index]
+                    else:
+                        return_data[updated_custom_users[index].code] = 'This room is full'
 
-                quarantine_history = QuarantineHistory(
-                    user=custom_user,
-                    pandemic=custom_user.quarantine_ward.pandemic,
-                    quarantine_ward=custom_user.quarantine_ward,
-                    quarantine_room=member.quarantine_room,
-                    status=QuarantineHistoryStatus.PRESENT,
-                    start_date=member.quarantined_at,
-                    created_by=request.user,
-                    updated_by=request.user,
-                )
+                updated_custom_users = [updated_custom_users[index] for index in index_of_accepted_members]
+                updated_members = [updated_members[index] for index in index_of_accepted_members]
+                quarantine_histories = [quarantine_histories[index] for index in index_of_accepted_members]
+                ward_daily_stats_changes = [ward_daily_stats_changes[index] for index in index_of_accepted_members]
 
-                quarantine_history.save()
+                for custom_user in updated_custom_users:
+                    custom_user.status = CustomUserStatus.AVAILABLE
 
-                custom_user.save()
-                member.save()
+                set_location_of_members(updated_members)
 
-                # Send notification
-                title = 'Xét duyệt tài khoản'
-                description = f'Bạn đã được chấp nhận cách ly tại khu cách ly {custom_user.quarantine_ward.full_name}'
-                create_and_send_noti_to_list_user(title=title, description=description, created_by=None, receive_user_list=[custom_user])
+                QuarantineHistory.objects.bulk_create(quarantine_histories)
+                CustomUser.objects.bulk_update(updated_custom_users, ['status', 'created_by', 'updated_by', 'updated_at'])
+                Member.objects.bulk_update(updated_members, [
+                    'quarantine_room', 'quarantine_floor', 'quarantine_building', 'quarantine_ward', 'care_staff',
+                    'quarantined_at', 'quarantined_finish_expected_at',
+                ])
+                update_counters_of_members(updated_members)
 
-                self.do_after_change_room_of_member_work(member, None)
+                # all accepted members of a room are already saved, so work of this room is done once
+                dict_of_member_of_room = dict()
+                for member in updated_members:
+                    if member.label != MemberLabel.F0:
+                        dict_of_member_of_room.setdefault(member.quarantine_room_id, member)
+                for member in dict_of_member_of_room.values():
+                    self.do_after_change_room_of_member_work(member, None)
+
+            update_ward_daily_stats_of_in_members(ward_daily_stats_changes)
+
+            # Send notification
+            for custom_users_in_ward in custom_users_of_ward.values():
+                receive_user_list = [custom_user for custom_user in custom_users_in_ward if custom_user.status == CustomUserStatus.AVAILABLE]
+                if receive_user_list:
+                    title = 'Xét duyệt tài khoản'
+                    description = f'Bạn đã được chấp nhận cách ly tại khu cách ly {receive_user_list[0].quarantine_ward.full_name}'
+                    create_and_send_noti_to_list_user(title=title, description=description, created_by=None, receive_user_list=receive_user_list)
 
             return_message = messages.SUCCESS
             if return_data:
@@ -2432,6 +2749,8 @@ class MemberAPI(AbstractView):
 
                     old_present_quarantine_history.save()
 
+                    update_ward_daily_stats_of_ended_quarantine_history(old_present_quarantine_history)
+
                 custom_user.save()
                 member.save()
 
@@ -2445,6 +2764,65 @@ class MemberAPI(AbstractView):
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
+    def get_filtered_members(self, request, accepted_fields):
+        """Validate filter fields of filter_member, return filtered query set of CustomUser"""
+
+        validator = UserValidator(**accepted_fields)
+
+        validator.is_valid_fields([
+            'status_list', 'quarantined_status_list',
+            'positive_test_now_list', 'health_status_list', 'is_last_tested',
+            'can_finish_quarantine', 'is_need_change_room_because_be_positive',
+            'created_at_max', 'created_at_min',
+            'quarantined_at_max', 'quarantined_at_min',
+            'quarantined_finish_expected_at_max', 'quarantined_finish_expected_at_min',
+            'label_list', 'order_by',
+        ])
+        validator.extra_validate_to_filter_member()
+
+        query_set = CustomUser.objects.all()
+
+        list_to_filter_user = [key for key in accepted_fields.keys()]
+        list_to_filter_user = set(list_to_filter_user) - \
+        {'is_last_tested', 'is_need_change_room_because_be_positive', 'page', 'page_size'}
+        list_to_filter_user = list(list_to_filter_user) + \
+        [
+            'status_list',
+            'last_tested_max', 'role_name', 'quarantined_at_max',
+            'quarantined_finish_expected_at_max',
+            'positive_test_now_list', 'health_status_list',
+        ]
+
+        dict_to_filter_user = validator.get_data(list_to_filter_user)
+
+        # Check ward of sender
+        if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER']:
+            if hasattr(validator, '_quarantine_ward'):
+                # Sender want filter with ward, building, floor or room
+                if validator.get_field('quarantine_ward') != request.user.quarantine_ward:
+                    raise exceptions.AuthenticationException({'quarantine_ward_id': messages.NO_PERMISSION})
+            else:
+                dict_to_filter_user['quarantine_ward_id'] = request.user.quarantine_ward.id
+
+        if 'order_by' not in accepted_fields.keys():
+            dict_to_filter_user.setdefault('order_by', '-quarantined_at')
+
+        filter = MemberFilter(dict_to_filter_user, queryset=query_set)
+
+        query_set = filter.qs
+
+        # check if filter member is need change room because be positive
+        is_need_change_room_because_be_positive = validator.get_field('is_need_change_room_because_be_positive')
+        if is_need_change_room_because_be_positive == True:
+            # filter user that positive_test_now = True and need change room (room has member that is not F0)
+            query_set = query_set.filter(Exists(
+                Member.objects.filter(
+                    quarantine_room=OuterRef('member_x_custom_user__quarantine_room'),
+                ).exclude(label=MemberLabel.F0)
+            ))
+
+        return query_set
+
     @csrf_exempt
     @query_debugger
     @action(methods=['POST'], url_path='filter', detail=False)
@@ -2473,6 +2851,7 @@ class MemberAPI(AbstractView):
             - care_staff_code: String
             - page: int
             - page_size: int
+            - cursor: String ('' for first page, nextCursor for next page, order by created_at instead of page, order_by is not used)
             - search: String
             - order_by: String ['quarantined_finished_at']
         """
@@ -2501,65 +2880,84 @@ class MemberAPI(AbstractView):
                 if key in accept_fields:
                     accepted_fields[key] = receive_fields[key]
 
-            validator = UserValidator(**accepted_fields)
+            query_set = self.get_filtered_members(request, accepted_fields)
 
-            validator.is_valid_fields([
-                'status_list', 'quarantined_status_list',
-                'positive_test_now_list', 'health_status_list', 'is_last_tested',
-                'can_finish_quarantine', 'is_need_change_room_because_be_positive',
-                'created_at_max', 'created_at_min',
-                'quarantined_at_max', 'quarantined_at_min',
-                'quarantined_finish_expected_at_max', 'quarantined_finish_expected_at_min',
-                'label_list', 'order_by',
-            ])
-            validator.extra_validate_to_filter_member()
+            # only select columns of FilterMemberSerializer, rows of the page are mapped to dicts directly
+            query_set = FilterMemberValuesSerializer.values(query_set)
 
-            query_set = CustomUser.objects.all()
+            if 'cursor' in request.data:
+                paginated_data = paginate_data_by_cursor(request, query_set, FilterMemberValuesSerializer)
+            else:
+                paginated_data = paginate_data(request, query_set, FilterMemberValuesSerializer)
 
-            list_to_filter_user = [key for key in accepted_fields.keys()]
-            list_to_filter_user = set(list_to_filter_user) - \
-            {'is_last_tested', 'is_need_change_room_because_be_positive', 'page', 'page_size'}
-            list_to_filter_user = list(list_to_filter_user) + \
-            [
-                'status_list',
-                'last_tested_max', 'role_name', 'quarantined_at_max',
-                'quarantined_finish_expected_at_max',
-                'positive_test_now_list', 'health_status_list',
-            ]
+            return self.response_handler.handle(data=paginated_data)
+        except Exception as exception:
+            return self.exception_handler.handle(exception)
 
-            dict_to_filter_user = validator.get_data(list_to_filter_user)
+    # columns of exported file of members: (header, field of CustomUser)
+    export_member_columns = [
+        ('Mã', 'code'),
+        ('Họ và tên', 'full_name'),
+        ('Số điện thoại', 'phone_number'),
+        ('Giới tính', 'gender'),
+        ('Ngày sinh', 'birthday'),
+        ('Trạng thái', 'status'),
+        ('Khu cách ly', 'quarantine_ward__full_name'),
+        ('Tòa', 'member_x_custom_user__quarantine_building__name'),
+        ('Tầng', 'member_x_custom_user__quarantine_floor__name'),
+        ('Phòng', 'member_x_custom_user__quarantine_room__name'),
+        ('Diện cách ly', 'member_x_custom_user__label'),
+        ('Trạng thái cách ly', 'member_x_custom_user__quarantined_status'),
+        ('Ngày bắt đầu cách ly', 'member_x_custom_user__quarantined_at'),
+        ('Ngày dự kiến hoàn thành cách ly', 'member_x_custom_user__quarantined_finish_expected_at'),
+        ('Tình trạng sức khỏe', 'member_x_custom_user__health_status'),
+        ('Đang dương tính', 'member_x_custom_user__positive_test_now'),
+        ('Lần xét nghiệm gần nhất', 'member_x_custom_user__last_tested'),
+        ('Số mũi vắc xin', 'member_x_custom_user__number_of_vaccine_doses'),
+    ]
 
-            # Check ward of sender
-            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER']:
-                if hasattr(validator, '_quarantine_ward'):
-                    # Sender want filter with ward, building, floor or room
-                    if validator.get_field('quarantine_ward') != request.user.quarantine_ward:
-                        raise exceptions.AuthenticationException({'quarantine_ward_id': messages.NO_PERMISSION})
-                else:
-                    dict_to_filter_user['quarantine_ward_id'] = request.user.quarantine_ward.id
+    @csrf_exempt
+    @query_debugger
+    @action(methods=['POST'], url_path='export', detail=False)
+    def export_member(self, request):
+        """Export members as a file, rows are streamed
 
-            if 'order_by' not in accepted_fields.keys():
-                dict_to_filter_user.setdefault('order_by', '-quarantined_at')
+        Args:
+            - file_type: String ['csv', 'xlsx'], default 'csv'
+            - same filter fields as filter_member (except page, page_size, cursor)
+        """
 
-            filter = MemberFilter(dict_to_filter_user, queryset=query_set)
+        accept_fields = [
+            'status_list', 'quarantined_status_list',
+            'health_status_list', 'positive_test_now_list',
+            'is_last_tested', 'can_finish_quarantine',
+            'is_need_change_room_because_be_positive',
+            'created_at_max', 'created_at_min',
+            'quarantined_at_max', 'quarantined_at_min',
+            'quarantined_finish_expected_at_max', 'quarantined_finish_expected_at_min',
+            'quarantine_ward_id', 'quarantine_building_id',
+            'quarantine_floor_id', 'quarantine_room_id',
+            'label_list', 'care_staff_code',
+            'search', 'order_by', 'file_type',
+        ]
 
-            query_set = filter.qs
+        try:
+            if request.user.role.name not in ['ADMINISTRATOR', 'SUPER_MANAGER', 'MANAGER', 'STAFF']:
+                raise exceptions.AuthenticationException({'main': messages.NO_PERMISSION})
 
-            query_set = query_set.select_related('member_x_custom_user__quarantine_room__quarantine_floor__quarantine_building', 'quarantine_ward')
+            request_extractor = self.request_handler.handle(request)
+            receive_fields = request_extractor.data
+            accepted_fields = dict()
 
-            serializer = FilterMemberSerializer(query_set, many=True)
+            for key in receive_fields.keys():
+                if key in accept_fields:
+                    accepted_fields[key] = receive_fields[key]
 
-            # check if filter member is need change room because be positive
-            is_need_change_room_because_be_positive = validator.get_field('is_need_change_room_because_be_positive')
-            if is_need_change_room_because_be_positive == True:
-                # filter user that positive_test_now = True and need change room
-                result_users = list(query_set)
-                remain_result_users = [user for user in result_users if self.count_label_not_f0_in_room(user.member_x_custom_user.quarantine_room) >= 1]
-                serializer = FilterMemberSerializer(remain_result_users, many=True)
+            file_type = accepted_fields.pop('file_type', 'csv')
 
-            paginated_data = paginate_data(request, serializer.data)
+            query_set = self.get_filtered_members(request, accepted_fields)
 
-            return self.response_handler.handle(data=paginated_data)
+            return export_data(query_set, self.export_member_columns, 'members', file_type)
         except Exception as exception:
             return self.exception_handler.handle(exception)
 
@@ -2765,6 +3163,7 @@ class MemberAPI(AbstractView):
             
             member = custom_user.member_x_custom_user
 
+            old_quarantine_ward_id = custom_user.quarantine_ward_id
             custom_user.quarantine_ward = quarantine_ward
 
             old_room = member.quarantine_room
@@ -2817,37 +3216,42 @@ class MemberAPI(AbstractView):
             
             custom_user.updated_by = request.user
 
-            if new_room != old_room:
-                # update QuarantineHistory
-                old_present_quarantine_history = list(QuarantineHistory.objects.filter(user=custom_user, status=QuarantineHistoryStatus.PRESENT))
-                if len(old_present_quarantine_history) == 0:
-                    raise exceptions.ValidationException({'main': messages.PRESENT_QUARANTINE_HISTORY_NOT_EXIST})
-                elif len(old_present_quarantine_history) >= 2:
-                    raise exceptions.ValidationException({'main': messages.MANY_PRESENT_QUARANTINE_HISTORY_EXIST})
-                else:
-                    now_time = timezone.now()
-                    old_present_quarantine_history = old_present_quarantine_history[0]
-                    old_present_quarantine_history.status = QuarantineHistoryStatus.ENDED
-                    old_present_quarantine_history.end_date = now_time
-                    old_present_quarantine_history.end_type = QuarantineHistoryEndType.CHANGE_ROOM
-                    old_present_quarantine_history.updated_by = request.user
+            with transaction.atomic():
+                self.reserve_room_for_member(new_room, old_room)
 
-                    new_quarantine_history = QuarantineHistory(
-                        user=custom_user,
-                        pandemic=custom_user.quarantine_ward.pandemic,
-                        quarantine_ward=custom_user.quarantine_ward,
-                        quarantine_room=member.quarantine_room,
-                        status=QuarantineHistoryStatus.PRESENT,
-                        start_date=now_time,
-                        created_by=request.user,
-                        updated_by=request.user,
-                    )
+                if new_room != old_room:
+                    # update QuarantineHistory
+                    old_present_quarantine_history = list(QuarantineHistory.objects.filter(user=custom_user, status=QuarantineHistoryStatus.PRESENT))
+                    if len(old_present_quarantine_history) == 0:
+                        raise exceptions.ValidationException({'main': messages.PRESENT_QUARANTINE_HISTORY_NOT_EXIST})
+                    elif len(old_present_quarantine_history) >= 2:
+                        raise exceptions.ValidationException({'main': messages.MANY_PRESENT_QUARANTINE_HISTORY_EXIST})
+                    else:
+                        now_time = timezone.now()
+                        old_present_quarantine_history = old_present_quarantine_history[0]
+                        old_present_quarantine_history.status = QuarantineHistoryStatus.ENDED
+                        old_present_quarantine_history.end_date = now_time
+                        old_present_quarantine_history.end_type = QuarantineHistoryEndType.CHANGE_ROOM
+                        old_present_quarantine_history.updated_by = request.user
 
-                    new_quarantine_history.save()
-                    old_present_quarantine_history.save()
+                        new_quarantine_history = QuarantineHistory(
+                            user=custom_user,
+                            pandemic=custom_user.quarantine_ward.pandemic,
+                            quarantine_ward=custom_user.quarantine_ward,
+                            quarantine_room=member.quarantine_room,
+                            status=QuarantineHistoryStatus.PRESENT,
+                            start_date=now_time,
+                            created_by=request.user,
+                            updated_by=request.user,
+                        )
 
-            custom_user.save()
-            member.save()
+                        new_quarantine_history.save()
+                        old_present_quarantine_history.save()
+
+                custom_user.save()
+                member.save()
+
+            update_ward_daily_stats_of_in_member(old_quarantine_ward_id, member.quarantined_at, custom_user.quarantine_ward_id, member.quarantined_at)
 
             if new_room != old_room:
                 self.do_after_change_room_of_member_work(member, old_room)
@@ -2989,6 +3393,8 @@ class MemberAPI(AbstractView):
                 custom_user.save()
                 member.save()
 
+                update_ward_daily_stats_of_ended_quarantine_history(old_present_quarantine_history)
+
                 self.do_after_change_room_of_member_work(member, old_room)
 
             return self.response_handler.handle(data=messages.SUCCESS)
@@ -3066,6 +3472,8 @@ class MemberAPI(AbstractView):
                 custom_user.save()
                 member.save()
 
+                update_ward_daily_stats_of_ended_quarantine_history(old_present_quarantine_history)
+
                 try:
                     self.do_after_change_room_of_member_work(member, old_room)
                 except:
@@ -3195,6 +3603,8 @@ class MemberAPI(AbstractView):
             first_positive_test_date = validator.get_field('first_positive_test_date')
 
             # requarantine
+            old_quarantine_ward_id = custom_user.quarantine_ward_id
+            old_quarantined_at = member.quarantined_at
             custom_user.status = CustomUserStatus.WAITING
             custom_user.quarantine_ward = quarantine_ward
             member.quarantined_at = None
@@ -3217,6 +3627,8 @@ class MemberAPI(AbstractView):
             custom_user.save()
             member.save()
 
+            update_ward_daily_stats_of_in_member(old_quarantine_ward_id, old_quarantined_at, custom_user.quarantine_ward_id, member.quarantined_at)
+
             return self.response_handler.handle(data=messages.SUCCESS)
         except Exception as exception:
             return self.exception_handler.handle(exception)
@@ -3272,6 +3684,8 @@ class MemberAPI(AbstractView):
             # update CustomUser
             custom_user = validator.get_field('custom_user')
             quarantine_ward = validator.get_field('quarantine_ward')
+            old_quarantine_ward_id = custom_user.quarantine_ward_id
+            old_quarantined_at = custom_user.member_x_custom_user.quarantined_at
             custom_user.status = CustomUserStatus.AVAILABLE
             custom_user.quarantine_ward = quarantine_ward
             custom_user.updated_by = request.user
@@ -3350,6 +3764,8 @@ class MemberAPI(AbstractView):
 
             quarantine_history.save()
 
+            update_ward_daily_stats_of_in_member(old_quarantine_ward_id, old_quarantined_at, custom_user.quarantine_ward_id, member.quarantined_at)
+
             self.do_after_change_room_of_member_work(member, None)
 
             member = Member.objects.get(id=member.id)
@@ -3664,9 +4080,7 @@ class ManagerAPI(AbstractView):
 
             query_set = query_set.select_related('quarantine_ward', 'role')
 
-            serializer = FilterManagerSerializer(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            paginated_data = paginate_data(request, query_set, FilterManagerSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -3976,13 +4390,11 @@ class StaffAPI(AbstractView):
             query_set = filter.qs
 
             if 'order_by' not in dict_to_filter_staff.keys():
-                query_set = query_set.annotate(num_care_member=Count('member_x_care_staff')).order_by('num_care_member')
+                query_set = query_set.annotate(num_care_member=F('staff_x_custom_user__num_care_member')).order_by('num_care_member')
 
             query_set = query_set.select_related('quarantine_ward')
 
-            serializer = FilterStaffSerializer(query_set, many=True)
-
-            paginated_data = paginate_data(request, serializer.data)
+            paginated_data = paginate_data(request, query_set, FilterStaffSerializer)
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
@@ -4042,36 +4454,22 @@ class HomeAPI(AbstractView):
                 if int(quarantine_ward_id) != request.user.quarantine_ward.id:
                     raise exceptions.ValidationException({'quarantine_ward_id': messages.NO_PERMISSION})
 
-            users_query_set = CustomUser.objects.all()
             tests_query_set = Test.objects.all()
+            time_now = timezone.now()
 
-            # Calculate number of all members past and now
-
-            dict_to_filter_all_members_past_and_now = {
-                'role_name': 'MEMBER',
-                'status_list': f'{CustomUserStatus.AVAILABLE},{CustomUserStatus.LEAVE}',
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_all_members_past_and_now['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_all_members_past_and_now, queryset=users_query_set)
-
-            number_of_all_members_past_and_now = filter.qs.count()
+            # Calculate number of members by each status in one query
 
-            # Calculate number of quarantining members
-
-            dict_to_filter_quarantining_members = {
-                'role_name': 'MEMBER',
-                'status': CustomUserStatus.AVAILABLE,
-            }
+            try:
+                pandemic = Pandemic.objects.get(name='Covid-19')
+                day_between_tests = int(pandemic.day_between_tests)
+            except:
+                day_between_tests = int(os.environ.get('DAY_BETWEEN_TESTS', 5))
 
-            if quarantine_ward_id:
-                dict_to_filter_quarantining_members['quarantine_ward_id'] = quarantine_ward_id
+            last_tested_max = time_now - datetime.timedelta(days=day_between_tests)
 
-            filter = MemberFilter(dict_to_filter_quarantining_members, queryset=users_query_set)
+            member_statistics = count_member_statistics(quarantine_ward_id, last_tested_max, time_now)
 
-            number_of_quarantining_members = filter.qs.count()
+            number_of_quarantining_members = member_statistics['number_of_quarantining_members']
 
             # Calculate number of available slots
 
@@ -4086,136 +4484,6 @@ class HomeAPI(AbstractView):
                 total_capacity = 0
             number_of_available_slots = total_capacity - number_of_quarantining_members
 
-            # Calculate number of waiting members
-
-            dict_to_filter_waiting_members = {
-                'role_name': 'MEMBER',
-                'status': CustomUserStatus.WAITING,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_waiting_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_waiting_members, queryset=users_query_set)
-
-            number_of_waiting_members = filter.qs.count()
-
-            # Calculate number of suspected members
-
-            dict_to_filter_suspected_members = {
-                'role_name': 'MEMBER',
-                'health_status_list': f'{HealthStatus.UNWELL},{HealthStatus.SERIOUS}',
-                'positive_test_now_list': [False, None],
-                'status': CustomUserStatus.AVAILABLE,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_suspected_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_suspected_members, queryset=users_query_set)
-
-            number_of_suspected_members = filter.qs.count()
-
-            # Calculate number of positive members
-
-            dict_to_filter_positive_members = {
-                'role_name': 'MEMBER',
-                'positive_test_now_list': [True],
-                'status': CustomUserStatus.AVAILABLE,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_positive_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_positive_members, queryset=users_query_set)
-
-            number_of_positive_members = filter.qs.count()
-
-            # Calculate number of need test members
-
-            try:
-                pandemic = Pandemic.objects.get(name='Covid-19')
-                day_between_tests = int(pandemic.day_between_tests)
-            except:
-                day_between_tests = int(os.environ.get('DAY_BETWEEN_TESTS', 5))
-
-            last_tested_max = timezone.now() - datetime.timedelta(days=day_between_tests)
-
-            dict_to_filter_need_test_members = {
-                'role_name': 'MEMBER',
-                'last_tested_max': last_tested_max,
-                'status': CustomUserStatus.AVAILABLE,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_need_test_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_need_test_members, queryset=users_query_set)
-
-            number_of_need_test_members = filter.qs.count()
-
-            # Calculate number of can finish members
-
-            dict_to_filter_can_finish_members = {
-                'role_name': 'MEMBER',
-                'positive_test_now_list': [False],
-                'health_status_list': f'{HealthStatus.NORMAL},{HealthStatus.UNWELL}',
-                'quarantined_finish_expected_at_max': timezone.now(),
-                'status': CustomUserStatus.AVAILABLE,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_can_finish_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_can_finish_members, queryset=users_query_set)
-
-            number_of_can_finish_members = filter.qs.count()
-
-            # Calculate number of hospitalize waiting members
-
-            dict_to_filter_hospitalize_waiting_members = {
-                'role_name': 'MEMBER',
-                'status': CustomUserStatus.AVAILABLE,
-                'quarantined_status': MemberQuarantinedStatus.HOSPITALIZE_WAITING,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_positive_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_hospitalize_waiting_members, queryset=users_query_set)
-
-            number_of_hospitalize_waiting_members = filter.qs.count()
-
-            # Calculate number of completed members
-
-            dict_to_filter_completed_members = {
-                'role_name': 'MEMBER',
-                'status': CustomUserStatus.LEAVE,
-                'quarantined_status': MemberQuarantinedStatus.COMPLETED,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_completed_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_completed_members, queryset=users_query_set)
-
-            number_of_completed_members = filter.qs.count()
-
-            # Calculate number of hospitalized members
-
-            dict_to_filter_hospitalized_members = {
-                'role_name': 'MEMBER',
-                'status': CustomUserStatus.LEAVE,
-                'quarantined_status': MemberQuarantinedStatus.HOSPITALIZE,
-            }
-
-            if quarantine_ward_id:
-                dict_to_filter_hospitalized_members['quarantine_ward_id'] = quarantine_ward_id
-
-            filter = MemberFilter(dict_to_filter_hospitalized_members, queryset=users_query_set)
-
-            number_of_hospitalized_members = filter.qs.count()
-
             # Calculate number of waiting tests
 
             dict_to_filter_waiting_tests = {
@@ -4229,82 +4497,11 @@ class HomeAPI(AbstractView):
 
             number_of_waiting_tests = filter.qs.count()
 
-            # Calculate number of member 'in' everyday
-
-            dict_of_in_members = dict()
-
-            for day_sub in range(number_of_days_in_out - 1, -1, -1):
-                day = timezone.now() - datetime.timedelta(days=day_sub)
-                day = day.astimezone(pytz.timezone('Asia/Saigon'))
-                start_of_day = datetime.datetime(day.year, day.month, day.day)
-                start_of_day = start_of_day.astimezone(pytz.timezone('Asia/Saigon'))
-                end_of_day = datetime.datetime(day.year, day.month, day.day, 23, 59, 59, 999999)
-                end_of_day = end_of_day.astimezone(pytz.timezone('Asia/Saigon'))
-
-                dict_to_filter_in_members = {
-                    'role_name': 'MEMBER',
-                    'quarantined_at_max': end_of_day,
-                    'quarantined_at_min': start_of_day,
-                }
-
-                if quarantine_ward_id:
-                    dict_to_filter_in_members['quarantine_ward_id'] = quarantine_ward_id
-
-                filter = MemberFilter(dict_to_filter_in_members, queryset=users_query_set)
-
-                dict_of_in_members[f'{day}'[:10]] = filter.qs.count()
-
-            # Calculate number of member 'complete' everyday
-
-            dict_of_complete_members = dict()
-
-            for day_sub in range(number_of_days_in_out - 1, -1, -1):
-                day = timezone.now() - datetime.timedelta(days=day_sub)
-                day = day.astimezone(pytz.timezone('Asia/Saigon'))
-                start_of_day = datetime.datetime(day.year, day.month, day.day)
-                start_of_day = start_of_day.astimezone(pytz.timezone('Asia/Saigon'))
-                end_of_day = datetime.datetime(day.year, day.month, day.day, 23, 59, 59, 999999)
-                end_of_day = end_of_day.astimezone(pytz.timezone('Asia/Saigon'))
-
-                quarantine_history_query_set = QuarantineHistory.objects.filter(
-                    status=QuarantineHistoryStatus.ENDED,
-                    end_type=QuarantineHistoryEndType.COMPLETED,
-                    end_date__lte=end_of_day,
-                    end_date__gte=start_of_day,
-                )
-                
-                if quarantine_ward_id:
-                    quarantine_history_query_set = quarantine_history_query_set.filter(quarantine_room__quarantine_floor__quarantine_building__quarantine_ward__id=quarantine_ward_id)
-
-                quarantine_history_query_set = quarantine_history_query_set.values('user').distinct()
+            # Calculate number of member 'in', 'complete', 'hospitalize' everyday
 
-                dict_of_complete_members[f'{day}'[:10]] = quarantine_history_query_set.count()
+            days = get_list_of_days(number_of_days_in_out, time_now)
 
-            # Calculate number of member 'hospitalize' everyday
-
-            dict_of_hospitalize_members = dict()
-
-            for day_sub in range(number_of_days_in_out - 1, -1, -1):
-                day = timezone.now() - datetime.timedelta(days=day_sub)
-                day = day.astimezone(pytz.timezone('Asia/Saigon'))
-                start_of_day = datetime.datetime(day.year, day.month, day.day)
-                start_of_day = start_of_day.astimezone(pytz.timezone('Asia/Saigon'))
-                end_of_day = datetime.datetime(day.year, day.month, day.day, 23, 59, 59, 999999)
-                end_of_day = end_of_day.astimezone(pytz.timezone('Asia/Saigon'))
-
-                quarantine_history_query_set = QuarantineHistory.objects.filter(
-                    status=QuarantineHistoryStatus.ENDED,
-                    end_type=QuarantineHistoryEndType.HOSPITALIZE,
-                    end_date__lte=end_of_day,
-                    end_date__gte=start_of_day,
-                )
-                
-                if quarantine_ward_id:
-                    quarantine_history_query_set = quarantine_history_query_set.filter(quarantine_room__quarantine_floor__quarantine_building__quarantine_ward__id=quarantine_ward_id)
-
-                quarantine_history_query_set = quarantine_history_query_set.values('user').distinct()
-
-                dict_of_hospitalize_members[f'{day}'[:10]] = quarantine_history_query_set.count()
+            dict_of_in_members, dict_of_complete_members, dict_of_hospitalize_members = count_members_in_out_by_day(quarantine_ward_id, days)
 
             if quarantine_ward:
                 serializer = BaseQuarantineWardSerializer(quarantine_ward, many=False)
@@ -4314,17 +4511,17 @@ class HomeAPI(AbstractView):
 
             response_data = {
                 'quarantine_ward': quarantine_ward_data,
-                'number_of_all_members_past_and_now': number_of_all_members_past_and_now,
+                'number_of_all_members_past_and_now': member_statistics['number_of_all_members_past_and_now'],
                 'number_of_quarantining_members': number_of_quarantining_members,
                 'number_of_available_slots': number_of_available_slots,
-                'number_of_waiting_members': number_of_waiting_members,
-                'number_of_suspected_members': number_of_suspected_members,
-                'number_of_positive_members': number_of_positive_members,
-                'number_of_need_test_members': number_of_need_test_members,
-                'number_of_can_finish_members': number_of_can_finish_members,
-                'number_of_hospitalize_waiting_members': number_of_hospitalize_waiting_members,
-                'number_of_completed_members': number_of_completed_members,
-                'number_of_hospitalized_members': number_of_hospitalized_members,
+                'number_of_waiting_members': member_statistics['number_of_waiting_members'],
+                'number_of_suspected_members': member_statistics['number_of_suspected_members'],
+                'number_of_positive_members': member_statistics['number_of_positive_members'],
+                'number_of_need_test_members': member_statistics['number_of_need_test_members'],
+                'number_of_can_finish_members': member_statistics['number_of_can_finish_members'],
+                'number_of_hospitalize_waiting_members': member_statistics['number_of_hospitalize_waiting_members'],
+                'number_of_completed_members': member_statistics['number_of_completed_members'],
+                'number_of_hospitalized_members': member_statistics['number_of_hospitalized_members'],
                 'number_of_waiting_tests': number_of_waiting_tests,
                 'in': dict_of_in_members,
                 'complete': dict_of_complete_members,
@@ -4384,64 +4581,47 @@ class HomeAPI(AbstractView):
             search_value = validator.get_field('search')
             order_by = validator.get_field('order_by')
 
-            response_list = []
-
             if address_type == 'city':
                 all_addresses = City.objects.filter(country__code='VNM')
+                destination_history_path = 'destination_history_x_city'
             elif address_type == 'district':
                 all_addresses = District.objects.filter(city__id=father_address_id)
+                destination_history_path = 'destination_history_x_district'
             else:
                 all_addresses = Ward.objects.filter(district__id=father_address_id)
+                destination_history_path = 'destination_history_x_ward'
             if search_value:
                 all_addresses = all_addresses.filter(name__unaccent__icontains=search_value)
 
-            for address in list(all_addresses):
-                query_set = DestinationHistory.objects.filter(
-                    user__status__in=[CustomUserStatus.AVAILABLE, CustomUserStatus.LEAVE],
-                    user__role__name='MEMBER',
-                )
-                if address_type == 'city':
-                    query_set = query_set.filter(city=address)
-                elif address_type == 'district':
-                    query_set = query_set.filter(district=address)
-                else:
-                    query_set = query_set.filter(ward=address)
-                if quarantine_ward:
-                    query_set = query_set.filter(user__quarantine_ward=quarantine_ward)
-                if start_time_max:
-                    query_set = query_set.filter(start_time__lte=start_time_max)
-                if start_time_min:
-                    query_set = query_set.filter(start_time__gte=start_time_min)
-                num_of_members_pass_by = query_set.values('user').annotate(num_user=Count('user')).count()
-                response_list += [{
-                    address_type: {
-                        'id': address.id,
-                        'name': address.name,
-                    },
-                    'num_of_members_pass_by': num_of_members_pass_by,
-                }]
-
-            if order_by:
-                locale.setlocale(locale.LC_COLLATE, '')
-                if order_by == 'name':
-                    key_to_sort = lambda d: locale.strxfrm(d[address_type]['name'])
-                    reverse_to_sort = False
-                elif order_by == '-name':
-                    key_to_sort = lambda d: locale.strxfrm(d[address_type]['name'])
-                    reverse_to_sort = True
-                elif order_by == 'num_of_members_pass_by':
-                    key_to_sort = lambda d: d['num_of_members_pass_by']
-                    reverse_to_sort = False
-                elif order_by == '-num_of_members_pass_by':
-                    key_to_sort = lambda d: d['num_of_members_pass_by']
-                    reverse_to_sort = True
-            else:
-                key_to_sort = lambda d: d['num_of_members_pass_by']
-                reverse_to_sort = True
-
-            response_list = sorted(response_list, key=key_to_sort, reverse=reverse_to_sort)
+            # Count members pass by each address in one query,
+            # addresses that no member pass by still in result because of LEFT OUTER JOIN
+            query_to_count = Q(**{
+                f'{destination_history_path}__user__status__in': [CustomUserStatus.AVAILABLE, CustomUserStatus.LEAVE],
+                f'{destination_history_path}__user__role__name': 'MEMBER',
+            })
+            if quarantine_ward:
+                query_to_count &= Q(**{f'{destination_history_path}__user__quarantine_ward': quarantine_ward})
+            if start_time_max:
+                query_to_count &= Q(**{f'{destination_history_path}__start_time__lte': start_time_max})
+            if start_time_min:
+                query_to_count &= Q(**{f'{destination_history_path}__start_time__gte': start_time_min})
+
+            query_set = all_addresses.annotate(
+                num_of_members_pass_by=Count(f'{destination_history_path}__user', distinct=True, filter=query_to_count),
+            )
 
-            paginated_data = paginate_data(request, response_list)
+            if not order_by:
+                order_by = '-num_of_members_pass_by'
+            query_set = query_set.order_by(order_by, 'id').values('id', 'name', 'num_of_members_pass_by')
+
+            paginated_data = paginate_data(request, query_set)
+            paginated_data['content'] = [{
+                address_type: {
+                    'id': item['id'],
+                    'name': item['name'],
+                },
+                'num_of_members_pass_by': item['num_of_members_pass_by'],
+            } for item in paginated_data['content']]
 
             return self.response_handler.handle(data=paginated_data)
         except Exception as exception:
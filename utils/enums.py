@@ -102,6 +102,21 @@ class NotificationType(models.TextChoices):
     EMAIL = 'EMAIL'
     SMS = 'SMS'
 
+class PushOutboxStatus(models.TextChoices):
+    WAITING = 'WAITING'
+    SENT = 'SENT'
+    DEAD = 'DEAD'
+
+class ImportJobType(models.TextChoices):
+    MEMBER = 'MEMBER'
+    TEST = 'TEST'
+
+class ImportJobStatus(models.TextChoices):
+    WAITING = 'WAITING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
 class Professional(models.TextChoices):
     VIEN_CHUC = 'Viên chức / Nhân viên'
     CONG_CHUC = 'Công chức'
@@ -29,6 +29,7 @@ ADDRESS_EMPTY = 'Address must not be empty'
 PHONE_EMPTY = 'Phone must not be empty'
 QUARANTINE_ROOM_EMPTY = 'Quarantine room must not empty'
 FILE_IMPORT_EMPTY = 'File import must not be empty'
+IMPORT_JOB_WORKER_STOPPED = 'Worker stopped before the file is processed, rows that are processed are kept, import the remaining rows again'
 
 CODE_NOT_FOUND = 'Code is not exist'
 USER_NOT_FOUND = 'User is not exist'
@@ -78,6 +79,7 @@ INVALID_ROLE_ID = 'Role ID is invalid'
 NEGATIVE_PAGE = 'Page must be positive integer'
 NEGATIVE_PAGE_SIZE = 'Page size must be positive integer'
 OVER_PAGE_SIZE_MAX = 'Page size must not be greater than '
+INVALID_CURSOR = 'Cursor is invalid'
 
 ISNOTMEMBER = 'This user is not a member'
 ISNOTMANAGER = 'This user is not a manager'
@@ -1,3 +1,24 @@
 from django.db import models
 
 # Create your models here.
+
+class AbstractCounterModel(models.Model):
+    """
+    Model with counter columns (counter_fields) maintained by F() updates in user_account.counters.
+    save() of an existing row without update_fields does not write counter_fields,
+    so it cannot overwrite an update committed after this instance was loaded.
+    """
+
+    counter_fields = []
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred_fields
+            ]
+        super().save(*args, **kwargs)
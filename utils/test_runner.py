@@ -0,0 +1,28 @@
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+def create_extensions(using, **kwargs):
+    """Create extensions of the database (created by migrations utils 0001, user_account 0051) before tables and indexes"""
+
+    with connections[using].cursor() as cursor:
+        for extension in ['unaccent', 'pg_trgm']:
+            cursor.execute(f'CREATE EXTENSION IF NOT EXISTS {extension}')
+
+class TestRunner(DiscoverRunner):
+    """
+    Test databases are created from models, not by running migrations:
+    old migrations cannot run on an empty database (user_account 0024 reads form.Test
+    without depending on form, 0040 uses MemberQuarantinedStatus.REQUARANTINING that was removed),
+    and applied migrations are not changed.
+    """
+
+    def setup_databases(self, **kwargs):
+        for alias in connections:
+            connections[alias].settings_dict['TEST']['MIGRATE'] = False
+
+        pre_migrate.connect(create_extensions, dispatch_uid='utils.test_runner.create_extensions')
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid='utils.test_runner.create_extensions')
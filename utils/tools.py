@@ -1,11 +1,21 @@
 import re
 import datetime
+import unicodedata
 import os
 from random import randint
 import pytz
 import math, random
+from django.contrib.auth.hashers import make_password
 from .enums import MemberLabel
 
+def normalize_name(name):
+    # from 'Nguyễn Văn Đức' to 'nguyen van duc', to search without accent
+    if not name:
+        return ''
+    name = name.lower().replace('đ', 'd')
+    name = unicodedata.normalize('NFD', name)
+    return ''.join(char for char in name if not unicodedata.combining(char))
+
 def split_input_list(str_list):
     """
     Separate out individual student email from the comma, or space separated string.
@@ -127,6 +137,14 @@ def custom_user_code_generator(quarantine_ward_id):
 
     return first_part + second_part + third_part
 
+def get_default_password_hash():
+    """
+    Encoded hash of the default password ('123456') for accounts created from an imported file.
+    Hashing a password costs hundreds of milliseconds, so it is hashed once for each imported file and reused for its rows.
+    """
+
+    return make_password('123456')
+
 def get_key_from_value_in_dict(dict, value):
     return list(dict.keys())[list(dict.values()).index(value)]
 
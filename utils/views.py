@@ -3,13 +3,20 @@ import os
 import functools
 import time
 import json
+import base64
+import csv
+import tempfile
+import pytz
+import openpyxl
 from datetime import datetime
 from django.core.exceptions import (
     ValidationError,
     FieldError,
 )
 from django.db import connection, reset_queries
-from django.http import JsonResponse
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.core.paginator import Paginator
 from rest_framework import viewsets, serializers
@@ -17,13 +24,15 @@ from . import messages, exceptions
 
 # Create your views here.
 
-def paginate_data(request, data):
+def paginate_data(request, data, serializer_class=None):
     """
     Function to handle pagination data.
 
     Params:
 
-    data: array data.
+    data: array data or query set (query set is paginated in database: one COUNT and one LIMIT/OFFSET query).
+
+    serializer_class: if not None, only rows of the page are serialized by this serializer class.
 
     request: request object that contain paginate info
 
@@ -57,7 +66,7 @@ def paginate_data(request, data):
     # Handle page_size = 'all'
     # page_size = 0 for get all
     if page_size == 0:
-        page_size = len(data) + 1
+        page_size = (data.count() if isinstance(data, QuerySet) else len(data)) + 1
     elif page_size < 0:
         raise ValueError(messages.NEGATIVE_PAGE_SIZE)
     elif page_size > PAGE_SIZE_MAX:
@@ -66,6 +75,13 @@ def paginate_data(request, data):
     if page <= 0:
         raise ValueError(messages.NEGATIVE_PAGE)
 
+    if isinstance(data, QuerySet):
+        # pk is always the last key of ordering, so rows with the same values of the other keys
+        # are in the same order for every page (OFFSET of an ambiguous ordering can skip or repeat rows)
+        ordering = list(data.query.order_by or (data.query.default_ordering and data.model._meta.ordering) or [])
+        if not ordering or ordering[-1] not in ['pk', '-pk', 'id', '-id']:
+            data = data.order_by(*ordering, 'pk')
+
     paginator = Paginator(data, page_size)
 
     total_pages = paginator.num_pages
@@ -77,6 +93,8 @@ def paginate_data(request, data):
         current_page = paginator.page(page)
         page_number = current_page.number
         content = current_page.object_list
+        if serializer_class:
+            content = serializer_class(content, many=True).data
 
     total = paginator.count
 
@@ -90,6 +108,159 @@ def paginate_data(request, data):
 
     return response_data
 
+def encode_cursor(key_value, row_id):
+    """
+    Encode (datetime key_value, row_id) of the last row of a page to an opaque string
+    """
+
+    data = {'key': key_value.isoformat(), 'id': row_id}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return datetime.fromisoformat(data['key']), int(data['id'])
+    except Exception as exception:
+        raise ValueError(messages.INVALID_CURSOR)
+
+def paginate_data_by_cursor(request, query_set, serializer_class, key_field='created_at'):
+    """
+    Function to handle keyset (cursor) pagination, for high-volume lists.
+
+    Rows are ordered by (key_field, id) descending (order_by of filter is not used),
+    the next page is got by WHERE (key_field, id) < (values of last row), so every page costs the same
+    (no COUNT, no OFFSET), key_field should not be null and have an index (key_field, id).
+
+    Params:
+
+    query_set: query set to paginate (can be a values() query set, then key_field and id must be selected)
+
+    serializer_class: rows of the page are serialized by this serializer class.
+
+    request: request object that contain paginate info
+
+    cursor: '' for first page, nextCursor of previous page for next page.
+
+    page_size: Defaults is 10 (PAGE_SIZE=10), must be positive.
+
+    Return a JSON data:
+
+    response_data = {
+        "nextCursor": cursor of next page, None if this is the last page,
+        "content": content,
+        "pageSize": page_size,
+    }
+    """
+
+    PAGE_SIZE = int(os.environ.get("PAGE_SIZE"))
+    PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX"))
+
+    try:
+        page_size = int(request.data.get("page_size", PAGE_SIZE))
+    except Exception as exception:
+        raise ValueError(messages.NEGATIVE_PAGE_SIZE)
+
+    if page_size <= 0:
+        raise ValueError(messages.NEGATIVE_PAGE_SIZE)
+    elif page_size > PAGE_SIZE_MAX:
+        raise ValueError(messages.OVER_PAGE_SIZE_MAX + str(PAGE_SIZE_MAX))
+
+    cursor = request.data.get("cursor")
+    if cursor:
+        key_value, row_id = decode_cursor(cursor)
+        # Same as (key_field, id) < (key_value, id), key_field <= key_value can seek on the index
+        query_set = query_set.filter(
+            Q(**{f'{key_field}__lte': key_value}) &
+            (Q(**{f'{key_field}__lt': key_value}) | Q(id__lt=row_id))
+        )
+
+    # Get one more row to know if there is a next page
+    rows = list(query_set.order_by(f'-{key_field}', '-id')[:page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_row = rows[-1]
+        if isinstance(last_row, dict):
+            next_cursor = encode_cursor(last_row[key_field], last_row['id'])
+        else:
+            next_cursor = encode_cursor(getattr(last_row, key_field), last_row.id)
+
+    response_data = {
+        "nextCursor": next_cursor,
+        "content": serializer_class(rows, many=True).data,
+        "pageSize": page_size,
+    }
+
+    return response_data
+
+class EchoBuffer:
+    """File-like object for csv.writer, return the written line instead of keeping it"""
+
+    def write(self, value):
+        return value
+
+def export_data(query_set, columns, file_name, file_type='csv'):
+    """
+    Function to stream rows of a query set as a csv or xlsx file, memory does not grow with number of rows.
+
+    Params:
+
+    query_set: filtered query set, rows are read with a server side cursor, EXPORT_CHUNK_SIZE rows each time.
+
+    columns: list of (header, field), field is a column of query_set.values_list().
+
+    file_type: 'csv' (each row is sent when it is read)
+    or 'xlsx' (write only workbook in a temporary file, file is sent when all rows are written).
+    """
+
+    if file_type not in ['csv', 'xlsx']:
+        raise exceptions.ValidationException({'file_type': messages.INVALID})
+
+    chunk_size = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+    headers = [header for header, field in columns]
+    fields = [field for header, field in columns]
+    vntz = pytz.timezone('Asia/Saigon')
+
+    def get_rows():
+        for row in query_set.values_list(*fields).iterator(chunk_size=chunk_size):
+            # excel does not support timezone
+            yield [
+                value.astimezone(vntz).replace(tzinfo=None) if isinstance(value, datetime) and value.tzinfo else value
+                for value in row
+            ]
+
+    def stream_csv():
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(headers)
+        for row in get_rows():
+            yield writer.writerow(row)
+
+    def stream_xlsx():
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet('Sheet1')
+        ws.append(headers)
+        for row in get_rows():
+            ws.append(row)
+        with tempfile.TemporaryFile() as file:
+            wb.save(file)
+            file.seek(0)
+            while True:
+                data = file.read(64 * 1024)
+                if not data:
+                    break
+                yield data
+
+    if file_type == 'csv':
+        response = StreamingHttpResponse(stream_csv(), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(
+            stream_xlsx(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    response['Content-Disposition'] = f'attachment; filename="{file_name}.{file_type}"'
+    return response
+
 # Calculate query time and number of query statement
 def query_debugger(func):
     @functools.wraps(func)
@@ -104,6 +275,10 @@ def query_debugger(func):
 
         end_queries = len(connection.queries)
 
+        if result.streaming:
+            # exported file, rows are read after this function returns
+            return result
+
         result_dict = json.loads(result.content)
         result_dict['Number of Queries'] = end_queries - start_queries
         result_dict['Finished in'] = end - start
@@ -0,0 +1,13 @@
+#========================================
+# Import Jobs Worker
+#========================================
+
+import os
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "qlkcl.settings")
+
+import django
+django.setup()
+
+from user_account.import_jobs import run_import_worker
+
+run_import_worker()